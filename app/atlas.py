@@ -0,0 +1,133 @@
+'''Asset Atlas Module
+The PNG assets pre-scaled to the widths the app draws them at (1x and 2x), stored as
+raw RGBA in one file, assets/atlas.bin, built at install time by tools/build_atlas.py.
+The app maps the file and wraps each image without decoding or scaling it.
+
+File layout: a header (magic, index length, data offset), a JSON index and the pixel
+data. The index maps "name@width" to [offset, width, height, rowstride, x, y, full width,
+full height, source mtime]. name is the asset path relative to assets/ and width the width
+the image was requested at, so lookups match the arguments of load_scaled_image.
+Transparent borders are cropped, which keeps the mostly empty overlays small; x and y
+place the cropped pixels in the full image. This module does not use GTK.
+'''
+
+import json
+import os
+import struct
+import sys
+import threading
+
+from app.helpers import get_asset_path
+
+ATLAS_PATH = get_asset_path("atlas.bin")
+ASSETS_DIR = os.path.dirname(ATLAS_PATH)
+MAGIC = b"FWATLAS1"
+HEADER = struct.Struct("<8sII")  # magic, index length, data offset
+ALIGN = 16  # Row data starts on a 16 byte boundary
+
+
+def entry_key(name, width):
+    return f"{name}@{int(width)}"
+
+
+def asset_name(path):
+    '''Return path relative to the assets directory, or None if it is outside it.'''
+    rel_path = os.path.relpath(os.path.abspath(path), ASSETS_DIR)
+    if rel_path.startswith(os.pardir):
+        return None
+    return rel_path.replace(os.sep, "/")
+
+
+class AtlasEntry:
+    '''One image in the atlas.'''
+    __slots__ = ("offset", "width", "height", "rowstride", "x", "y", "full_width", "full_height", "mtime_ns")
+
+    def __init__(self, offset, width, height, rowstride, x, y, full_width, full_height, mtime_ns=None):
+        self.offset = offset
+        self.width = width
+        self.height = height
+        self.rowstride = rowstride
+        self.x = x
+        self.y = y
+        self.full_width = full_width
+        self.full_height = full_height
+        self.mtime_ns = mtime_ns
+
+    @property
+    def size(self):
+        return self.rowstride * self.height
+
+
+class AtlasIndex:
+    '''The index of an atlas file. Only the header and index are read, not the pixels.'''
+
+    def __init__(self, path=ATLAS_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, index_length, self.data_offset = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not an asset atlas")
+            index = json.loads(f.read(index_length))
+        self.entries = {key: AtlasEntry(*value) for key, value in index.items()}
+
+    def find(self, name, width):
+        '''Return the AtlasEntry for an asset at a requested width, or None.
+        Entries whose source PNG changed since the atlas was built are ignored.'''
+        entry = self.entries.get(entry_key(name, width))
+        if entry is None or entry.mtime_ns is None:
+            return entry
+        try:
+            if os.stat(os.path.join(ASSETS_DIR, name)).st_mtime_ns != entry.mtime_ns:
+                return None
+        except OSError:
+            pass
+        return entry
+
+    def __contains__(self, name):
+        prefix = f"{name}@"
+        return any(key.startswith(prefix) for key in self.entries)
+
+
+_index = None
+_index_loaded = False
+_lock = threading.Lock()
+
+def get_atlas_index():
+    '''Return the AtlasIndex for ATLAS_PATH, or None if there is no usable atlas.'''
+    global _index, _index_loaded
+    with _lock:
+        if not _index_loaded:
+            _index_loaded = True
+            try:
+                _index = AtlasIndex()
+            except FileNotFoundError:
+                _index = None
+            except (OSError, ValueError, struct.error) as e:
+                print(f"Warning: Ignoring asset atlas: {e}", file=sys.stderr)
+                _index = None
+        return _index
+
+
+def write_atlas(path, images):
+    '''Write an atlas file. images is a list of (name, requested width, (x, y, width, height),
+    (full width, full height), RGBA bytes, source mtime_ns or None). The file is replaced atomically.'''
+    entries = {}
+    offset = 0
+    for name, requested, (x, y, width, height), (full_width, full_height), pixels, mtime_ns in images:
+        rowstride = width * 4
+        if len(pixels) != rowstride * height:
+            raise ValueError(f"{name}: expected {rowstride * height} bytes of RGBA, got {len(pixels)}")
+        entries[entry_key(name, requested)] = [offset, width, height, rowstride, x, y, full_width, full_height, mtime_ns]
+        offset += -(-len(pixels) // ALIGN) * ALIGN
+    index = json.dumps(entries, separators=(",", ":")).encode("utf-8")
+    data_offset = -(-(HEADER.size + len(index)) // ALIGN) * ALIGN
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(index), data_offset))
+        f.write(index)
+        f.write(b"\0" * (data_offset - HEADER.size - len(index)))
+        for *_fields, pixels, _mtime in images:
+            f.write(pixels)
+            f.write(b"\0" * (-len(pixels) % ALIGN))
+    os.replace(tmp_path, path)
+    return len(entries)
@@ -0,0 +1,125 @@
+'''Backlight Module
+Display brightness from /sys/class/backlight, for dimming the screen overlay on the laptop
+image. The kernel notifies actual_brightness with sysfs_notify when the brightness changes,
+from the keys or from a write. BacklightMonitor waits for that with poll(POLLPRI) in a
+thread, so an unchanged backlight costs nothing. The file stays open and is re-read with
+os.pread. Some drivers change the level in firmware without notifying. For those, the level
+is also re-read every FALLBACK_INTERVAL seconds, and listeners only hear about real changes.
+
+ALPHA_RAMP maps each brightness percent to an overlay opacity. It is computed once, so a
+change is a table lookup and one opacity update of the overlay's layer, never a re-tint or
+re-decode of the image. This module does not use GTK.
+'''
+
+import os
+import select
+import sys
+import threading
+
+from app.helpers import get_sysfs_path
+
+BACKLIGHT_ROOT = get_sysfs_path("class", "backlight")
+# Preferred interfaces first, as systemd-backlight picks them
+BACKLIGHT_TYPES = ("firmware", "platform", "raw")
+FALLBACK_INTERVAL = 2.0  # seconds between reads when no notification comes
+READ_SIZE = 32
+
+MIN_OPACITY = 0.2  # The overlay stays visible with the backlight off
+GAMMA = 2.2
+# Brightness percent -> opacity, perceived brightness is roughly the level to the power 1/gamma
+ALPHA_RAMP = tuple(MIN_OPACITY + (1 - MIN_OPACITY) * (percent / 100) ** (1 / GAMMA) for percent in range(101))
+
+
+def opacity_for(fraction):
+    '''Return the overlay opacity for a brightness between 0 and 1.'''
+    return ALPHA_RAMP[min(max(int(fraction * 100 + 0.5), 0), 100)]
+
+
+def find_backlight(root=BACKLIGHT_ROOT):
+    '''Return the path of the preferred backlight device, or None if there is none.'''
+    try:
+        names = sorted(os.listdir(root))
+    except OSError:
+        return None
+    best = None
+    for name in names:
+        path = os.path.join(root, name)
+        try:
+            with open(os.path.join(path, "type"), "r", encoding="utf-8") as f:
+                kind = f.read().strip()
+        except OSError:
+            continue
+        rank = BACKLIGHT_TYPES.index(kind) if kind in BACKLIGHT_TYPES else len(BACKLIGHT_TYPES)
+        if best is None or rank < best[0]:
+            best = (rank, path)
+    return best[1] if best else None
+
+
+class BacklightMonitor:
+    '''Follows one backlight device and calls listener(fraction) from its thread on changes.'''
+
+    def __init__(self, path=None, fallback_interval=FALLBACK_INTERVAL):
+        self.path = path if path is not None else find_backlight()
+        self.fallback_interval = fallback_interval
+        self._listeners = []
+        self._fd = None
+        self._max = None
+        self._level = None
+        self._stop = threading.Event()
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def start(self):
+        '''Open the device and start the thread. Returns False if there is no backlight.'''
+        if self.path is None:
+            return False
+        try:
+            with open(os.path.join(self.path, "max_brightness"), "r", encoding="utf-8") as f:
+                self._max = int(f.read().strip())
+            self._fd = os.open(os.path.join(self.path, "actual_brightness"), os.O_RDONLY | os.O_CLOEXEC)
+        except (OSError, ValueError) as e:
+            print(f"Cannot follow the backlight: {e}", file=sys.stderr)
+            return False
+        if not self._max:
+            return False
+        self._level = self._read_level()
+        threading.Thread(target=self._run, name="backlight-monitor", daemon=True).start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+
+    def fraction(self):
+        '''Return the last brightness between 0 and 1, or None if unknown.'''
+        if self._level is None or not self._max:
+            return None
+        return min(self._level / self._max, 1.0)
+
+    def _read_level(self):
+        # Reading also re-arms the sysfs notification
+        try:
+            return int(os.pread(self._fd, READ_SIZE, 0).decode("ascii").strip())
+        except (OSError, ValueError):
+            return None
+
+    def _run(self):
+        poller = select.poll()
+        poller.register(self._fd, select.POLLPRI | select.POLLERR)
+        while not self._stop.is_set():
+            try:
+                poller.poll(self.fallback_interval * 1000)
+            except OSError as e:
+                print(f"Backlight monitor stopped: {e}", file=sys.stderr)
+                return
+            level = self._read_level()
+            if level is None or level == self._level:
+                continue
+            self._level = level
+            fraction = self.fraction()
+            for listener in list(self._listeners):
+                listener(fraction)
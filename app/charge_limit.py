@@ -0,0 +1,102 @@
+'''Charge Limit Module
+This module reads and sets the battery charge limit.
+It uses the kernel's charge_control_end_threshold when available and falls back to ectool.
+'''
+
+import os
+import re
+import subprocess
+import sys
+
+from app.command_runner import invalidate, run_query
+from app.power_supply import get_battery
+from app.settings import get_settings
+
+MIN_LIMIT = 40
+MAX_LIMIT = 100
+SUSTAIN_WINDOW = 5  # Gap between the lower and upper ectool chargecontrol thresholds
+
+
+def validate_charge_limit(value):
+    '''Return value as an int, raising ValueError if it is not a valid limit.'''
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid charge limit: {value!r}") from None
+    if not MIN_LIMIT <= limit <= MAX_LIMIT:
+        raise ValueError(f"Charge limit must be between {MIN_LIMIT} and {MAX_LIMIT}%, got {limit}")
+    return limit
+
+
+def get_threshold_path():
+    '''Return the sysfs charge_control_end_threshold path, or None if the kernel has none.'''
+    battery = get_battery()
+    if battery and battery.has("charge_control_end_threshold"):
+        return os.path.join(battery.path, "charge_control_end_threshold")
+    return None
+
+
+def get_charge_limit():
+    '''Return the current charge limit in percent, or None if it can't be read.'''
+    if get_threshold_path():
+        value = get_battery().read_number("charge_control_end_threshold")
+        if value is not None:
+            return int(value)
+    # Reading through the EC needs root, so only do this on demand rather than every tick
+    for cmd, pattern in (
+        (["pkexec", "/usr/bin/ectool", "fwchargelimit"], r"(\d+)\s*%?"),
+        (["pkexec", "/usr/bin/ectool", "chargecontrol"], r"~\s*(\d+)\s*%"),
+    ):
+        try:
+            result = run_query(cmd)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            print(f"Error reading charge limit: {e}", file=sys.stderr)
+            return None
+        if result.returncode == 0:
+            match = re.search(pattern, result.stdout)
+            if match:
+                return int(match.group(1))
+    return None
+
+
+def set_charge_limit(value):
+    '''Set the charge limit in percent. Returns True on success.'''
+    limit = validate_charge_limit(value)
+    path = get_threshold_path()
+    if path:
+        cmd = ['pkexec', 'sh', '-c', f'echo {limit} > {path}']
+        result = subprocess.run(cmd, capture_output=True, text=True, check=False)
+        if result.returncode == 0:
+            save_charge_limit(limit)
+            return True
+        print(f"Failed to write {path}: {result.stderr.strip()}", file=sys.stderr)
+    lower = max(limit - SUSTAIN_WINDOW, 0)
+    for cmd in (
+        ["pkexec", "/usr/bin/ectool", "fwchargelimit", str(limit)],
+        ["pkexec", "/usr/bin/ectool", "chargecontrol", "normal", str(lower), str(limit)],
+    ):
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, check=False, timeout=5)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            print(f"Error setting charge limit: {e}", file=sys.stderr)
+            continue
+        if result.returncode == 0:
+            invalidate("ectool", "fwchargelimit")
+            invalidate("ectool", "chargecontrol")
+            save_charge_limit(limit)
+            return True
+    return False
+
+
+def get_saved_charge_limit():
+    '''Return the limit saved by the last successful set_charge_limit(), or None.'''
+    limit = get_settings().get("charge_limit")
+    try:
+        return validate_charge_limit(limit) if limit is not None else None
+    except ValueError:
+        return None
+
+
+def save_charge_limit(limit):
+    '''Remember the limit so it can be restored after a reboot.'''
+    get_settings().set("charge_limit", limit)
@@ -0,0 +1,523 @@
+'''Framework Control command line interface
+Scriptable access to the same data sources as the GTK widgets, without importing GTK.
+Run `framework-ctl --help` for the list of commands, or `framework-ctl serve` to expose
+the same methods as JSON-RPC 2.0 on a local Unix socket. Changes that need root are made
+by the framework service when it is running (see app/service.py), unless --local is given.
+'''
+
+import argparse
+import contextlib
+import json
+import os
+import socketserver
+import sys
+import time
+
+from app.command_runner import get_counters
+from app.charge_limit import get_charge_limit, get_threshold_path, set_charge_limit
+from app.keyboard_backlight import get_brightness, set_brightness, set_mode
+from app.led_control import LED_NAMES, set_led
+from app.power_profiles import PowerProfiles, get_current_sleep_mode, set_sleep_mode
+from app.power_supply import get_battery
+from app.scenes import compile_scene, dry_run as dry_run_scene, list_scenes, load_scene, request_scene
+from app.service_client import ServiceError, get_service_client
+from app.settings import format_step, get_settings, restore_plan, restore_settings
+from app.thermals import FAN_CURVES, ThermalMonitor, get_thermal_monitor, set_auto_fan, set_fan_duty, write_fan_curve
+from app.usb_pd import read_ectool_ports, read_typec_ports
+
+
+class CommandError(Exception):
+    '''A command failed in a way that should be reported to the caller.'''
+
+
+_profiles = None
+
+def _power_profiles():
+    # Backend detection runs systemctl, only do it once per process and only when needed
+    global _profiles
+    if _profiles is None:
+        _profiles = PowerProfiles()
+    return _profiles
+
+
+_hwmon_monitor = None
+
+def _unprivileged_thermal_monitor():
+    # Without a hwmon fan input the shared monitor reads ectool, which needs pkexec unless root
+    global _hwmon_monitor
+    if os.geteuid() == 0:
+        return get_thermal_monitor()
+    if _hwmon_monitor is None:
+        _hwmon_monitor = ThermalMonitor(ectool=False)
+    return _hwmon_monitor
+
+
+def _check(ok, message):
+    if not ok:
+        raise CommandError(message)
+    return True
+
+
+# Methods shared by the CLI and the JSON-RPC server. Each takes keyword params and returns JSON data.
+
+def battery_status():
+    battery = get_battery()
+    if battery is None:
+        raise CommandError("No battery found")
+    stats = battery.stats()
+    stats["name"] = battery.name
+    return stats
+
+
+def thermals_status(privileged=True):
+    monitor = get_thermal_monitor() if privileged else _unprivileged_thermal_monitor()
+    sample = monitor.sample()
+    return {key: sample[key] for key in ("cpu_temp", "board_temp", "fan_rpm", "fans")}
+
+
+def ports_status():
+    ports = read_typec_ports()
+    if ports is None:
+        ports = read_ectool_ports()
+    return {f"port{port.pop('port')}": port for port in ports}
+
+
+def profile_get():
+    profiles = _power_profiles()
+    available, current = profiles.get_profiles()
+    if profiles.error:
+        raise CommandError(profiles.error)
+    return {"backend": profiles.backend, "profiles": available, "current": current}
+
+
+def profile_set(profile):
+    error = _power_profiles().set_profile(profile)
+    if error:
+        raise CommandError(error)
+    return True
+
+
+def charge_limit_get():
+    return get_charge_limit()
+
+
+def status():
+    '''Everything that can be read without prompting for privileges.'''
+    battery = get_battery()
+    profiles = _power_profiles()
+    available, current = profiles.get_profiles()
+    return {
+        "battery": battery.stats() if battery else None,
+        "charge_limit": get_charge_limit() if get_threshold_path() else None,
+        "thermals": thermals_status(privileged=False),
+        "power_profile": current,
+        "power_profiles": available,
+        "sleep_mode": get_current_sleep_mode(),
+    }
+
+
+def led_set(name, value):
+    return _check(set_led(name, value), f"Failed to set {name} LED")
+
+
+def kblight_set(value):
+    return _check(set_brightness(value), "Failed to set keyboard backlight")
+
+
+def kblight_mode(mode):
+    return _check(set_mode(mode), "Failed to set keyboard backlight mode")
+
+
+def sleep_set(mode):
+    return _check(set_sleep_mode(mode), f"Failed to set sleep mode {mode}")
+
+
+def charge_limit_set(value):
+    return _check(set_charge_limit(value), "Failed to set charge limit")
+
+
+def fan_auto():
+    _check(write_fan_curve(None), "Failed to stop the fan curve")
+    return _check(set_auto_fan(), "Failed to enable automatic fan control")
+
+
+def fan_duty(value):
+    _check(write_fan_curve(None), "Failed to stop the fan curve")
+    return _check(set_fan_duty(value), "Failed to set fan duty")
+
+
+def fan_curve(name):
+    if name not in FAN_CURVES:
+        raise ValueError(f"Unknown fan curve: {name}")
+    # Applied by the fan curve daemon in the service, or the one the GUI starts
+    return _check(write_fan_curve(FAN_CURVES[name]), f"Failed to set the {name} fan curve")
+
+
+def scene_list():
+    scenes = {}
+    for scene_id in list_scenes():
+        try:
+            scenes[scene_id] = load_scene(scene_id).get("name", scene_id)
+        except (ValueError, AttributeError) as e:
+            scenes[scene_id] = f"Unreadable: {e}"
+    return scenes
+
+
+def scene_play(name, dry_run=False):
+    data = load_scene(name)
+    if dry_run:
+        # Steps as the fake EC saw them, looping scenes play one pass
+        return [list(step) for step in dry_run_scene(compile_scene(data, name)).log]
+    return _check(request_scene(data), f"Failed to play scene {name}")
+
+
+def scene_stop():
+    return _check(request_scene(None), "Failed to stop the scene")
+
+
+def settings_get():
+    return get_settings().values()
+
+
+def settings_restore(dry_run=False):
+    if dry_run:
+        return [[key, " || ".join(format_step(step) for step in alternatives)]
+                for key, alternatives in restore_plan(get_settings().values())]
+    result = restore_settings()
+    if result["failed"] and not result["applied"]:
+        raise CommandError("; ".join(f"{key}: {error}" for key, error in result["failed"].items()))
+    return result
+
+
+METHODS = {
+    "status": status,
+    "battery": battery_status,
+    "thermals": thermals_status,
+    "ports": ports_status,
+    "commands": get_counters,
+    "led.set": led_set,
+    "kblight.get": get_brightness,
+    "kblight.set": kblight_set,
+    "kblight.mode": kblight_mode,
+    "profile.get": profile_get,
+    "profile.set": profile_set,
+    "sleep.get": get_current_sleep_mode,
+    "sleep.set": sleep_set,
+    "charge_limit.get": charge_limit_get,
+    "charge_limit.set": charge_limit_set,
+    "fan.auto": fan_auto,
+    "fan.duty": fan_duty,
+    "fan.curve": fan_curve,
+    "scene.list": scene_list,
+    "scene.play": scene_play,
+    "scene.stop": scene_stop,
+    "settings.get": settings_get,
+    "settings.restore": settings_restore,
+}
+
+
+# Methods that need root, run by the service when it is running instead of through pkexec
+SERVICE_METHODS = frozenset({
+    "led.set", "kblight.set", "kblight.mode", "profile.set", "sleep.set", "charge_limit.set",
+    "fan.auto", "fan.duty", "fan.curve",
+})
+
+# Read-only methods the service answers as well, everything else it refuses
+SERVICE_READ_METHODS = frozenset({
+    "status", "battery", "thermals", "ports", "kblight.get", "profile.get", "sleep.get", "charge_limit.get",
+})
+
+
+def run_method(method, params=None):
+    '''Call a method by name with a dict of params. Safe to use from several threads.
+    Raises CommandError, ValueError or KeyError.'''
+    func = METHODS.get(method)
+    if func is None:
+        raise KeyError(f"Unknown method: {method}")
+    return func(**(params or {}))
+
+
+def call(method, params=None):
+    '''Like run_method(), with library output sent to stderr. For the command line only:
+    the redirect swaps sys.stdout for the whole process.'''
+    # Library code prints progress to stdout, keep stdout clean for results
+    with contextlib.redirect_stdout(sys.stderr):
+        return run_method(method, params)
+
+
+def call_via_service(method, params=None):
+    '''Like call(), but runs the methods in SERVICE_METHODS in the service when it is running.'''
+    client = get_service_client() if method in SERVICE_METHODS else None
+    if client is None:
+        return call(method, params)
+    try:
+        return client.call(method, params)
+    except ServiceError as e:
+        raise CommandError(str(e)) from None
+
+
+# JSON-RPC server
+
+def default_socket_path():
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or "/tmp"
+    return os.path.join(runtime_dir, "framework-ctl.sock")
+
+
+class JsonRpcHandler(socketserver.StreamRequestHandler):
+    '''Newline-delimited JSON-RPC 2.0 requests, one response line per request.'''
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            response = handle_request(line)
+            if response is not None:
+                self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+                self.wfile.flush()
+
+
+def handle_request(line):
+    '''Handle one JSON-RPC request line, returning the response dict (None for notifications).'''
+    try:
+        request = json.loads(line)
+    except ValueError:
+        return {"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": "Parse error"}}
+    req_id = request.get("id") if isinstance(request, dict) else None
+    if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+        return {"jsonrpc": "2.0", "id": req_id, "error": {"code": -32600, "message": "Invalid Request"}}
+    response = {"jsonrpc": "2.0", "id": req_id}
+    try:
+        # Connections are handled on concurrent threads and stdout is not the response channel
+        response["result"] = run_method(request["method"], request.get("params"))
+    except KeyError as e:
+        response["error"] = {"code": -32601, "message": e.args[0] if e.args else "Method not found"}
+    except (TypeError, ValueError) as e:
+        response["error"] = {"code": -32602, "message": str(e)}
+    except (CommandError, OSError) as e:
+        response["error"] = {"code": -32000, "message": str(e)}
+    # Notifications get no response, not even an error
+    return response if "id" in request else None
+
+
+class JsonRpcServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(socket_path):
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    with JsonRpcServer(socket_path, JsonRpcHandler) as server:
+        os.chmod(socket_path, 0o600)
+        print(f"Listening on {socket_path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(socket_path)
+
+
+# Output
+
+def flatten(data, prefix=""):
+    '''Flatten nested dicts into {"a.b": value} for display and change detection.'''
+    items = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            items.update(flatten(value, f"{name}."))
+        else:
+            items[name] = value
+    return items
+
+
+def print_result(result, as_json):
+    if as_json:
+        print(json.dumps(result))
+    elif isinstance(result, dict):
+        for key, value in flatten(result).items():
+            print(f"{key}: {format_value(value)}")
+    elif isinstance(result, list) and all(isinstance(item, list) for item in result):
+        for item in result:
+            print(format_value(item))
+    elif result is not True:
+        print(format_value(result))
+
+
+def format_value(value):
+    if value is None:
+        return "Unknown"
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    if isinstance(value, list):
+        return ", ".join(format_value(v) for v in value)
+    return str(value)
+
+
+def watch(interval, as_json):
+    '''Print the status whenever it changes.'''
+    previous = {}
+    try:
+        while True:
+            current = call("status")
+            flat = flatten(current)
+            changed = {k: v for k, v in flat.items() if previous.get(k) != v}
+            if changed:
+                if as_json:
+                    print(json.dumps({"time": time.time(), "status": current, "changed": sorted(changed)}), flush=True)
+                else:
+                    stamp = time.strftime("%H:%M:%S")
+                    for key, value in changed.items():
+                        print(f"{stamp} {key}: {format_value(value)}", flush=True)
+            previous = flat
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+
+
+class PrintNotifier:
+    '''Prints notifications instead of sending them, for `monitor --print`.'''
+
+    def send(self, summary, body="", urgency=None):
+        stamp = time.strftime("%H:%M:%S")
+        print(f"{stamp} {summary}" + "".join(f"\n    {line}" for line in body.splitlines() if line), flush=True)
+
+
+def monitor(print_only):
+    '''Send desktop notifications for hardware events until interrupted, without GTK.'''
+    from gi.repository import GLib
+    from app.notifications import NotificationService
+    service = NotificationService(notifier=PrintNotifier() if print_only else None)
+    service.start()
+    try:
+        GLib.MainLoop().run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="framework-ctl", description="Control and monitor Framework Laptop hardware.")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--local", action="store_true", help="do not use the framework service, use pkexec")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("status", help="show battery, thermals, power profile and sleep mode")
+    sub.add_parser("battery", help="show battery status")
+    sub.add_parser("thermals", help="show temperatures and fan speed")
+    sub.add_parser("ports", help="show the USB-C ports' power role and contract")
+    sub.add_parser("commands", help="show command runner counters for this process")
+
+    p = sub.add_parser("led", help="set an LED colour, auto or off")
+    p.add_argument("name", choices=LED_NAMES)
+    p.add_argument("value")
+
+    p = sub.add_parser("kblight", help="get or set the keyboard backlight")
+    kb = p.add_subparsers(dest="action", required=True)
+    kb.add_parser("get")
+    kb.add_parser("set").add_argument("value", type=int)
+    kb.add_parser("mode").add_argument("mode")
+
+    p = sub.add_parser("profile", help="get or set the power profile")
+    p.add_argument("profile", nargs="?")
+
+    p = sub.add_parser("sleep", help="get or set the sleep mode")
+    p.add_argument("mode", nargs="?")
+
+    p = sub.add_parser("charge-limit", help="get or set the battery charge limit")
+    p.add_argument("value", nargs="?", type=int)
+
+    p = sub.add_parser("fan", help="set fan control")
+    fan = p.add_subparsers(dest="action", required=True)
+    fan.add_parser("auto")
+    fan.add_parser("duty").add_argument("value", type=int)
+    fan.add_parser("curve").add_argument("name", choices=list(FAN_CURVES))
+
+    p = sub.add_parser("scene", help="play LED and keyboard lighting scenes")
+    scene = p.add_subparsers(dest="action", required=True)
+    scene.add_parser("list")
+    play = scene.add_parser("play")
+    play.add_argument("name")
+    play.add_argument("--dry-run", action="store_true", help="print the steps instead of playing them")
+    scene.add_parser("stop")
+
+    p = sub.add_parser("settings", help="show or re-apply the saved settings")
+    settings = p.add_subparsers(dest="action")
+    settings.add_parser("show")
+    settings.add_parser("restore").add_argument("--dry-run", action="store_true", help="print the steps instead of running them")
+
+    p = sub.add_parser("watch", help="print status changes as they happen")
+    p.add_argument("--interval", type=float, default=2.0, help="seconds between polls")
+
+    p = sub.add_parser("monitor", help="send desktop notifications for hardware events")
+    p.add_argument("--print", action="store_true", help="print the notifications instead of sending them")
+
+    p = sub.add_parser("serve", help="serve JSON-RPC on a Unix socket")
+    p.add_argument("--socket", default=default_socket_path(), help="socket path")
+    return parser
+
+
+def to_call(args):
+    '''Map parsed arguments to (method, params).'''
+    cmd = args.command
+    if cmd in ("status", "battery", "thermals", "ports", "commands"):
+        return cmd, {}
+    if cmd == "led":
+        return "led.set", {"name": args.name, "value": args.value}
+    if cmd == "kblight":
+        return {
+            "get": ("kblight.get", {}),
+            "set": ("kblight.set", {"value": getattr(args, "value", None)}),
+            "mode": ("kblight.mode", {"mode": getattr(args, "mode", None)}),
+        }[args.action]
+    if cmd == "profile":
+        return ("profile.set", {"profile": args.profile}) if args.profile else ("profile.get", {})
+    if cmd == "sleep":
+        return ("sleep.set", {"mode": args.mode}) if args.mode else ("sleep.get", {})
+    if cmd == "charge-limit":
+        return ("charge_limit.set", {"value": args.value}) if args.value is not None else ("charge_limit.get", {})
+    if cmd == "fan":
+        return {
+            "auto": ("fan.auto", {}),
+            "duty": ("fan.duty", {"value": getattr(args, "value", None)}),
+            "curve": ("fan.curve", {"name": getattr(args, "name", None)}),
+        }[args.action]
+    if cmd == "scene":
+        return {
+            "list": ("scene.list", {}),
+            "play": ("scene.play", {"name": getattr(args, "name", None), "dry_run": getattr(args, "dry_run", False)}),
+            "stop": ("scene.stop", {}),
+        }[args.action]
+    if cmd == "settings":
+        if args.action == "restore":
+            return "settings.restore", {"dry_run": args.dry_run}
+        return "settings.get", {}
+    raise KeyError(cmd)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "watch":
+        watch(args.interval, args.json)
+        return 0
+    if args.command == "serve":
+        serve(args.socket)
+        return 0
+    if args.command == "monitor":
+        monitor(args.print)
+        return 0
+    if args.local:
+        os.environ["FRAMEWORK_NO_SERVICE"] = "1"
+    method, params = to_call(args)
+    try:
+        result = call_via_service(method, params)
+    except (CommandError, ValueError, OSError) as e:
+        print(f"framework-ctl: {e}", file=sys.stderr)
+        return 1
+    print_result(result, args.json)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+'''Command Runner Module
+Shared runner for read-only hardware queries (lsusb, tuned-adm, systemctl, pgrep, ectool reads).
+Identical calls that are already running are joined instead of started again (single-flight),
+and results are cached for a per-command TTL, so several widgets, the history tick and the
+CLI asking the same question within a second cost one fork/exec. Failed results (a non-zero
+exit status, e.g. a cancelled pkexec prompt) are not cached. Each query except pkexec runs in
+its own process group, which is killed when the timeout expires. pkexec keeps the controlling
+terminal so its text authentication prompt still works.
+
+Commands that change state must not go through run_query(). Call invalidate() after them so
+the next query sees the new state.
+'''
+
+import os
+import signal
+import subprocess
+import threading
+import time
+
+from app import tracing
+
+DEFAULT_TIMEOUT = 5
+
+# Seconds a result stays valid, by (program, first argument) or (program,).
+# pkexec is ignored. Commands not listed are coalesced while running but not cached.
+COMMAND_TTLS = {
+    ("lsusb",): 10,
+    ("systemctl", "is-active"): 30,
+    ("tuned-adm", "active"): 2,
+    ("tuned-adm", "list"): 300,
+    ("pgrep",): 2,
+    ("ectool", "pwmgetfanrpm"): 1,
+    ("ectool", "temps"): 1,
+    ("ectool", "pwmgetkblight"): 1,
+    ("ectool", "fwchargelimit"): 5,
+    ("ectool", "chargecontrol"): 5,
+    ("ectool", "usbpdpower"): 2,
+}
+
+_lock = threading.Lock()
+_cache = {}  # key -> (expires, CompletedProcess)
+_inflight = {}  # key -> _Call
+_counters = {"executed": 0, "cache_hits": 0, "coalesced": 0, "timeouts": 0, "errors": 0}
+_executed_by_command = {}
+
+
+class _Call:
+    '''A query in flight that other threads can wait on.'''
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def command_name(args):
+    '''Return (program, first argument) for args, without pkexec and the program's directory.'''
+    args = list(args)
+    if args and os.path.basename(args[0]) == "pkexec":
+        args = args[1:]
+    if not args:
+        return ()
+    program = os.path.basename(args[0])
+    return (program, args[1]) if len(args) > 1 else (program,)
+
+
+def get_ttl(args):
+    name = command_name(args)
+    ttl = COMMAND_TTLS.get(name)
+    if ttl is None and len(name) > 1:
+        ttl = COMMAND_TTLS.get(name[:1])
+    return ttl or 0
+
+
+def run_query(args, timeout=DEFAULT_TIMEOUT, ttl=None, check=False, text=True):
+    '''Run a read-only command and return a subprocess.CompletedProcess with captured output.
+    ttl overrides the COMMAND_TTLS entry. Raises OSError, subprocess.TimeoutExpired and,
+    with check=True, subprocess.CalledProcessError like subprocess.run.'''
+    args = tuple(args)
+    key = (args, text)
+    if ttl is None:
+        ttl = get_ttl(args)
+    with _lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            _counters["cache_hits"] += 1
+            return _checked(cached[1], check)
+        call = _inflight.get(key)
+        leader = call is None
+        if leader:
+            call = _inflight[key] = _Call()
+        else:
+            _counters["coalesced"] += 1
+
+    if not leader:
+        call.event.wait()
+        if call.error is not None:
+            raise call.error
+        return _checked(call.result, check)
+
+    try:
+        call.result = _execute(args, timeout, text)
+    except BaseException as e:
+        call.error = e
+        raise
+    finally:
+        with _lock:
+            del _inflight[key]
+            if call.error is None and call.result.returncode == 0 and ttl > 0:
+                _cache[key] = (time.monotonic() + ttl, call.result)
+        call.event.set()
+    return _checked(call.result, check)
+
+
+def _checked(result, check):
+    if check and result.returncode != 0:
+        raise subprocess.CalledProcessError(result.returncode, result.args, result.stdout, result.stderr)
+    return result
+
+
+def _execute(args, timeout, text):
+    with _lock:
+        _counters["executed"] += 1
+        name = " ".join(command_name(args))
+        _executed_by_command[name] = _executed_by_command.get(name, 0) + 1
+    with tracing.span(tracing.command_span_name(args)):
+        # A new session gives the command its own process group, so a timeout also kills
+        # anything it started (shells). It would detach pkexec from the terminal it prompts on.
+        new_session = os.path.basename(args[0]) != "pkexec"
+        try:
+            proc = subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                    text=text, start_new_session=new_session)
+        except OSError:
+            with _lock:
+                _counters["errors"] += 1
+            raise
+        try:
+            stdout, stderr = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            with _lock:
+                _counters["timeouts"] += 1
+            if new_session:
+                _kill_group(proc)
+            else:
+                proc.kill()
+            try:
+                proc.communicate(timeout=1)
+            except subprocess.TimeoutExpired:
+                # A child we could not kill still holds the pipes, don't wait for it
+                proc.kill()
+                proc.wait()
+            raise
+    return subprocess.CompletedProcess(list(args), proc.returncode, stdout, stderr)
+
+
+def _kill_group(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        # Root-owned children of pkexec can't be signalled by us, kill what we can
+        proc.kill()
+
+
+def invalidate(*prefix):
+    '''Drop cached results for commands starting with prefix, e.g. invalidate("tuned-adm").
+    With no prefix the whole cache is dropped.'''
+    with _lock:
+        for key in [k for k in _cache if command_name(k[0])[:len(prefix)] == prefix]:
+            del _cache[key]
+
+
+def get_counters():
+    '''Return the query counters: executed, cache_hits, coalesced, timeouts, errors and executed per command.'''
+    with _lock:
+        counters = dict(_counters)
+        counters["by_command"] = dict(sorted(_executed_by_command.items(), key=lambda item: -item[1]))
+    return counters
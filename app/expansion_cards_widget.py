@@ -1,40 +1,47 @@
 '''
 ExpansionCardsWidget
 This widget displays the expansion cards and laptop image, updating periodically.
-It is a Gtk.Box and implements the WidgetTemplate interface for integration with the UI.
+It is a Gtk.Box and implements the WidgetTemplate interface for integration with the UI,
+the cards are detected by ExpansionCardsProvider. Each card image carries a badge with its
+USB-C port's power role and contract, and the port charging the laptop is highlighted.
 '''
 
-import subprocess
 from gi.repository import Gtk
 from app.image_utils import load_scaled_image
 from app.helpers import get_asset_path
 from app.widget import WidgetTemplate
+from app.providers import ExpansionCardsProvider
+
+# Four bays, alternating sides from the top left as on the Framework Laptop 13
+DEFAULT_PORT_SIDES = ("left", "right", "left", "right")
 
 class ExpansionCardsWidget(Gtk.Box, WidgetTemplate):
     '''Widget to display expansion cards and laptop image, with periodic update.'''
 
-    def __init__(self, ports=4):
+    def __init__(self, port_sides=None, usb_ports=None, typec_ports=None):
+        """
+        port_sides: "left" or "right" for each expansion bay, from the model registry
+        usb_ports: USB port number -> bay index, see parse_lsusb
+        typec_ports: USB-C port number -> bay index, see ExpansionCardsProvider.read_ports
+        """
         Gtk.Box.__init__(self, orientation=Gtk.Orientation.HORIZONTAL, spacing=20)
-        WidgetTemplate.__init__(self)
+        self.port_sides = tuple(port_sides or DEFAULT_PORT_SIDES)
+        self.ports = len(self.port_sides)
+        WidgetTemplate.__init__(self, ExpansionCardsProvider(self.ports, usb_ports, typec_ports))
         self.set_halign(Gtk.Align.CENTER)
-        self.ports = ports
-        self.expansion_card_map = {
-            "HDMI Expansion Card": "expansion_card_hdmi.png",
-            "USB-A Expansion Card": "expansion_card_usb_a.png",
-            "Storage Expansion Card": "expansion_card_storage.png",
-            "Micro SD Expansion Card": "expansion_card_micro_sd.png",
-            "USB-C Expansion Card": "expansion_card_usb_c.png",
-            "Fingerprint Sensor / Power Button": None,
-            "Wireless Card": None,
-        }
-        self.result = ["expansion_card_usb_c.png"] * self.ports
+        self._shown_cards = None  # Cards currently packed, to skip reloading unchanged images
+        self._badges = [None] * self.ports  # Port power labels over the card images, by bay
         self.left_ports_vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=10)
         self.right_ports_vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=10)
         self.center_space = Gtk.Box()  # Empty space for image
         self.center_space.set_halign(Gtk.Align.CENTER)
         self._build_ui()
-        self.data = None
-        
+        self.connect("notify::scale-factor", self._on_scale_factor_changed)
+
+    def _on_scale_factor_changed(self, _widget, _pspec):
+        # Reload the card images at the new device resolution
+        self._shown_cards = None
+        self.update_visual()
 
     def _build_ui(self):
         self.left_ports_vbox.set_halign(Gtk.Align.CENTER)
@@ -48,87 +55,72 @@ class ExpansionCardsWidget(Gtk.Box, WidgetTemplate):
         Gtk.Box.pack_start(self, self.right_ports_vbox, False, False, 0)
 
 
-    def update(self):
-        '''Update the detected expansion cards and check for laptop camera.'''
-        result = ["expansion_card_usb_c.png"] * self.ports
-        camera_found = False
-        try:
-            lsusb = subprocess.run(["lsusb"], capture_output=True, text=True, check=True)
-            port_map = {
-                "001": 1, # Top right port
-                "002": 2, 
-                "003": 3, # Bottom left/right port
-                "004": 2,
-                "005": 2,
-                "006": 0, # Top left port
-            }
-            dev_to_port = {}
-            for line in lsusb.stdout.splitlines():
-                if "Realtek Semiconductor Corp. Laptop Camera" in line:
-                    camera_found = True
-                parts = line.strip().split()
-                label_line = line.strip()
-                extra_label = None
-                port_idx = None
-                if len(parts) >= 6:
-                    bus = parts[1]
-                    dev = parts[3][:-1]
-                    port = dev_to_port.get((bus, dev))
-                    port_idx = port_map.get(port) if port else None
-                    if "HDMI" in label_line.upper():
-                        extra_label = "HDMI Expansion Card"
-                    elif any(x in label_line.upper() for x in ["USB3.0", "USB2.0", "USB-A"]):
-                        extra_label = "USB-A Expansion Card"
-                    elif "FRAMEWORK" in label_line.upper() and ("0001" in label_line or "0003" in label_line):
-                        extra_label = "USB-A Expansion Card"
-                    elif "FRAMEWORK" in label_line.upper() and "0002" in label_line:
-                        extra_label = "HDMI Expansion Card"
-                    elif "13fe:6500" in label_line or "USB DISK 3.2" in label_line.upper():
-                        extra_label = "Storage Expansion Card"
-                    elif "090c:3350" in label_line or "USB DISK" in label_line.upper():
-                        extra_label = "Micro SD Expansion Card"
-                    if extra_label and port_idx is not None and 0 <= port_idx:
-                        if port_idx >= self.ports:
-                            for i in range(self.ports):
-                                if result[i] == "expansion_card_usb_c.png":
-                                    result[i] = self.expansion_card_map[extra_label]
-                                    break
-                        else:
-                            result[port_idx] = self.expansion_card_map[extra_label]
-        except (subprocess.CalledProcessError, OSError) as e:
-            print(f"Error occurred while getting connected expansion cards: {e}")
-        self.result = result
-        self.data = {"expansion_cards": result}
-        # Add overlays key if camera not found
-        if not camera_found:
-            self.data["overlays"] = [{
-                "name": "camera_off",
-                "path": "overlays/framework-camera-off-{overlay_id}.png",
-                "color": None
-            }]
-
     def update_visual(self):
         '''Update UI'''
-        result = self.result
+        result = self.data['expansion_cards'] if self.data else ("expansion_card_usb_c.png",) * self.ports
+        scale = self.get_scale_factor()
+        if (result, scale) != self._shown_cards:
+            self._show_cards(result, scale)
+        # The contract changes while charging, only the labels are updated for it
+        usb_pd = self.data.get('usb_pd') if self.data else None
+        for bay, badge in enumerate(self._badges):
+            if badge is None:
+                continue
+            port = usb_pd[bay] if usb_pd and bay < len(usb_pd) else None
+            text = format_port_badge(port)
+            badge.set_text(text or "")
+            badge.set_visible(bool(text))
+            style = badge.get_style_context()
+            if port and port['charging']:
+                style.add_class("charging")
+            else:
+                style.remove_class("charging")
+
+    def _show_cards(self, result, scale):
+        self._shown_cards = (result, scale)
+        self._badges = [None] * self.ports
         for child in list(Gtk.Box.get_children(self.left_ports_vbox)):
             self.left_ports_vbox.remove(child)
         for child in list(Gtk.Box.get_children(self.right_ports_vbox)):
             self.right_ports_vbox.remove(child)
         port_img_size = 160 # 640 / self.ports if self.ports > 0 else 80
-        for i, img_name in enumerate(result):
-            if i % 2 == 0:
-                if img_name:
-                    img_path = get_asset_path(img_name)
-                    port_img = load_scaled_image(img_path, port_img_size)
-                    if port_img:
-                        Gtk.Box.pack_start(self.left_ports_vbox, port_img, False, False, 0)
-        for i, img_name in enumerate(result):
-            if i % 2 == 1:
-                if img_name:
-                    img_path = get_asset_path(img_name)
-                    port_img = load_scaled_image(img_path, port_img_size)
-                    if port_img:
-                        Gtk.Box.pack_start(self.right_ports_vbox, port_img, False, False, 0)
+        for bay, (side, img_name) in enumerate(zip(self.port_sides, result)):
+            if img_name:
+                img_path = get_asset_path(img_name)
+                port_img = load_scaled_image(img_path, port_img_size, scale)
+                if port_img:
+                    card = Gtk.Overlay()
+                    card.add(port_img)
+                    badge = Gtk.Label(halign=Gtk.Align.CENTER, valign=Gtk.Align.END, justify=Gtk.Justification.CENTER)
+                    badge.get_style_context().add_class("port-badge")
+                    badge.set_no_show_all(True)
+                    card.add_overlay(badge)
+                    self._badges[bay] = badge
+                    vbox = self.left_ports_vbox if side == "left" else self.right_ports_vbox
+                    Gtk.Box.pack_start(vbox, card, False, False, 0)
         Gtk.Widget.show_all(self.left_ports_vbox)
         Gtk.Widget.show_all(self.right_ports_vbox)
         Gtk.Widget.show_all(self.center_space)
+
+
+def format_port_badge(port):
+    '''Return the badge text for a port reading from usb_pd, or None when nothing is connected.'''
+    if not port or not port['connected']:
+        return None
+    if port['charging']:
+        title = "Charging"
+    elif port['power_role'] == "sink":
+        title = "Power in"
+    elif port['power_role'] == "source":
+        title = "Power out"
+    else:
+        title = "In use"
+    details = []
+    if port['voltage'] is not None and port['current'] is not None:
+        details.append(f"{port['voltage']:.1f} V  {port['current']:.2f} A")
+    if port['power'] is not None:
+        max_power = f" of {port['max_power']:.0f} W" if port['max_power'] else ""
+        details.append(f"{port['power']:.1f} W{max_power}")
+    elif port['max_power']:
+        details.append(f"up to {port['max_power']:.0f} W")
+    return "\n".join([title] + details)
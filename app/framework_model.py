@@ -1,44 +1,134 @@
-'''This file defines the FrameworkModel class 
-and a function to retrieve the model based on the board name.'''
+'''This file defines the FrameworkModel class
+and a function to retrieve the model based on the board name.
+The models come from assets/models.json, which is read once. Each family (13, 16, 12)
+holds the image, overlay ID, expansion bay layout and LEDs shared by its boards, and
+each model is found by its DMI board_name or, on Framework systems, its product_name.'''
 
+import json
 import sys
+from types import MappingProxyType
+
+from app.helpers import get_asset_path, get_sysfs_path
+
+MODELS_PATH = get_asset_path("models.json")
+FRAMEWORK_VENDOR = "Framework"
+
 
 class FrameworkModel:
-    '''Data class for Framework model info'''
+    '''Read-only record of one Framework model, as loaded from the registry.'''
+
+    __slots__ = ("key", "board_name", "name", "family", "image", "overlay_id", "port_sides", "leds", "usb_ports",
+                 "typec_ports", "cpu")
+
+    def __init__(self, board_name, name, image=None, port_sides=(), overlay_id=0, cpu=None,
+                 key=None, family=None, leds=(), usb_ports=None, typec_ports=None):
+        values = {
+            "key": key,
+            "board_name": board_name,
+            "name": name,
+            "family": family,
+            "image": image,
+            "overlay_id": overlay_id,
+            "port_sides": tuple(port_sides),
+            "leds": tuple(leds),
+            "usb_ports": MappingProxyType(dict(usb_ports or {})),
+            # USB-C port number (typec portN, ectool port) -> bay index, as strings like usb_ports
+            "typec_ports": MappingProxyType(dict(typec_ports or {})),
+            "cpu": cpu,
+        }
+        for field, value in values.items():
+            object.__setattr__(self, field, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"FrameworkModel is read-only, cannot set {name!r}")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"FrameworkModel is read-only, cannot delete {name!r}")
+
+    def __repr__(self):
+        return f"FrameworkModel({self.key or self.board_name!r}, {self.name!r})"
+
+    @property
+    def ports(self):
+        '''Number of expansion card bays.'''
+        return len(self.port_sides)
+
+    def with_board_name(self, board_name):
+        '''Return a copy for a board that was matched by product name.'''
+        return FrameworkModel(board_name, self.name, self.image, self.port_sides, self.overlay_id, self.cpu,
+                              self.key, self.family, self.leds, self.usb_ports, self.typec_ports)
+
+
+class ModelRegistry:
+    '''All known models, indexed by board_name and product_name.'''
+
+    def __init__(self, models):
+        self.models = tuple(models)
+        self.by_board_name = {}
+        self.by_product_name = {}
+        for model, board_names, product_names in self.models:
+            for board_name in board_names:
+                self.by_board_name[board_name] = model
+            for product_name in product_names:
+                self.by_product_name[product_name] = model
+
+    @classmethod
+    def load(cls, path=MODELS_PATH):
+        '''Read the registry file. Each model gets the fields of its family, which it may override.'''
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        models = []
+        for entry in data["models"]:
+            fields = {**data["families"][entry["family"]], **entry}
+            board_names = fields.pop("board_names", ())
+            product_names = fields.pop("product_names", ())
+            model = FrameworkModel(board_names[0] if board_names else None, **fields)
+            models.append((model, board_names, product_names))
+        return cls(models)
+
+    def lookup(self, board_name=None, product_name=None):
+        '''Return the model for a board or product name, or None.'''
+        model = self.by_board_name.get(board_name)
+        if model is None and product_name in self.by_product_name:
+            model = self.by_product_name[product_name].with_board_name(board_name)
+        return model
+
+
+_registry = None
+
+def get_model_registry():
+    '''Return the ModelRegistry, read from MODELS_PATH on first use.'''
+    global _registry
+    if _registry is None:
+        _registry = ModelRegistry.load()
+    return _registry
+
+
+def read_dmi(name):
+    '''Return a /sys/class/dmi/id value, or None if it can't be read.'''
+    try:
+        with open(get_sysfs_path("class", "dmi", "id", name), encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
 
-    def __init__(self, board_name, name, image=None, ports=0, overlay_id=0, cpu=None):
-        self.board_name = board_name
-        self.name = name
-        self.image = image
-        self.ports = ports
-        self.overlay_id = overlay_id
-        self.cpu = cpu
 
 def get_framework_model():
     '''Retrieve the Framework model based on the board name from system files'''
 
+    board = read_dmi("board_name")
+    # Product names such as "Laptop 13 (AMD Ryzen 7040Series)" are only meaningful on Framework systems
+    product = read_dmi("product_name") if read_dmi("sys_vendor") == FRAMEWORK_VENDOR else None
     try:
-        with open("/sys/class/dmi/id/board_name", encoding="utf-8") as f:
-            board = f.read().strip()
-    except (FileNotFoundError, OSError):
-        board = None
-
-    models = {
-        "FRANBMCP03": FrameworkModel(
-            board_name="FRANBMCP03",
-            name="Framework Laptop 13 (2021)", #11th gen
-            image="framework-laptop-13.png",
-            ports=4,
-            overlay_id="13",
-            cpu="Intel Core i5-1135G7"
-        ),
-        # Add more mappings as needed
-    }
-    if board in models:
-        return models[board]
+        model = get_model_registry().lookup(board, product)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Warning: Could not read the model registry: {e}", file=sys.stderr)
+        model = None
+    if model is not None:
+        return model
 
     # Return an error
     print(f"Warning: Unknown board name '{board}'", file=sys.stderr)
 
     # Return a default model with the board name
-    return FrameworkModel(board_name=board, name=f"Unknown ({board})", image=None, ports=0)
+    return FrameworkModel(board_name=board, name=f"Unknown ({board})", image=None)
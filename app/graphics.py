@@ -0,0 +1,181 @@
+'''Graphics Module
+This module lists the GPUs from /sys/class/drm without running lspci. Vendor and device
+IDs are named through pci.ids (the system copy from hwdata/pciutils, or a small bundled
+one covering the Framework GPUs). The file is memory-mapped and binary-searched by vendor
+ID, so a lookup reads a few pages instead of parsing the whole 1.5 MB file.
+Both the index and the GPU list are kept for the session.
+'''
+
+import mmap
+import os
+import re
+import threading
+
+from app.helpers import get_asset_path, get_sysfs_path
+
+PCI_IDS_PATHS = (
+    "/usr/share/hwdata/pci.ids",
+    "/usr/share/misc/pci.ids",
+    "/usr/share/pci.ids",
+    get_asset_path("pci.ids"),
+)
+
+# Vendor lines are the only lines starting with a hex ID
+VENDOR_LINE = re.compile(rb"^([0-9a-f]{4})  ", re.MULTILINE)
+# The device class list after the vendors, "C 00  Unclassified device"
+CLASS_SECTION = re.compile(rb"^C [0-9a-f]{2}  ", re.MULTILINE)
+CARD_NAME = re.compile(r"card\d+")
+
+
+class PciIds:
+    '''A memory-mapped pci.ids file.'''
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        match = CLASS_SECTION.search(self._map)
+        self._vendors_end = match.start() if match else len(self._map)
+
+    def close(self):
+        self._map.close()
+
+    def _vendor_at(self, pos):
+        '''Return the first vendor line at or after pos as (start, vendor id), or None.'''
+        match = VENDOR_LINE.search(self._map, pos, self._vendors_end)
+        if match is None:
+            return None
+        return match.start(), int(match.group(1), 16)
+
+    def _find_vendor(self, vendor_id):
+        '''Return the offset of the vendor's line, or None. Vendors are sorted by ID.'''
+        lo, hi = 0, self._vendors_end
+        # Smallest position whose next vendor line has an ID >= vendor_id
+        while lo < hi:
+            mid = (lo + hi) // 2
+            found = self._vendor_at(mid)
+            if found is None or found[1] >= vendor_id:
+                hi = mid
+            else:
+                lo = found[0] + 1
+        found = self._vendor_at(lo)
+        if found is None or found[1] != vendor_id:
+            return None
+        return found[0]
+
+    def _line_text(self, start):
+        end = self._map.find(b"\n", start)
+        if end < 0:
+            end = len(self._map)
+        return self._map[start:end].decode("utf-8", "replace")
+
+    def lookup(self, vendor_id, device_id=None):
+        '''Return (vendor name, device name) for the IDs, with None for unknown names.'''
+        start = self._find_vendor(vendor_id)
+        if start is None:
+            return None, None
+        vendor = self._line_text(start)[6:].strip()
+        if device_id is None:
+            return vendor, None
+        following = self._vendor_at(start + 1)
+        block_end = following[0] if following else self._vendors_end
+        device_pos = self._map.find(b"\n\t%04x  " % device_id, start, block_end)
+        if device_pos < 0:
+            return vendor, None
+        return vendor, self._line_text(device_pos + 1)[7:].strip()
+
+
+_pci_ids = None
+_gpus = None
+_lock = threading.Lock()
+
+
+def get_pci_ids():
+    '''Return the session's PciIds index, or None if no pci.ids file can be read.'''
+    global _pci_ids
+    with _lock:
+        if _pci_ids is None:
+            for path in PCI_IDS_PATHS:
+                try:
+                    _pci_ids = PciIds(path)
+                    break
+                except (OSError, ValueError):
+                    continue
+        return _pci_ids
+
+
+def _read_hex(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return int(f.read().strip(), 16)
+    except (OSError, ValueError):
+        return None
+
+
+def _read_text(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def short_name(vendor, device):
+    '''A display name such as "Intel Iris Xe Graphics" from the pci.ids names.
+    Like lspci's output, the bracketed part is the marketing name where there is one.'''
+    if device:
+        match = re.search(r"\[(.*?)\]", device)
+        device = match.group(1) if match else device
+    if vendor:
+        match = re.search(r"\[(.*?)\]", vendor)
+        # "Advanced Micro Devices, Inc. [AMD/ATI]" -> "AMD", "Intel Corporation" -> "Intel"
+        vendor = match.group(1).split("/")[0] if match else vendor.split()[0]
+    return " ".join(part for part in (vendor, device) if part) or None
+
+
+def get_gpus(refresh=False):
+    '''Return the GPUs as dicts with card, pci_slot, vendor_id, device_id, vendor, device,
+    name, driver and boot_vga. The display GPU (boot_vga) comes first.'''
+    global _gpus
+    if _gpus is not None and not refresh:
+        return _gpus
+    root = get_sysfs_path("class", "drm")
+    try:
+        cards = sorted((name for name in os.listdir(root) if CARD_NAME.fullmatch(name)),
+                       key=lambda name: int(name[4:]))
+    except OSError:
+        cards = []
+    pci_ids = get_pci_ids()
+    gpus, seen = [], set()
+    for card in cards:
+        device_dir = os.path.join(root, card, "device")
+        vendor_id = _read_hex(os.path.join(device_dir, "vendor"))
+        device_id = _read_hex(os.path.join(device_dir, "device"))
+        if vendor_id is None or device_id is None:
+            continue
+        pci_slot = os.path.basename(os.path.realpath(device_dir))
+        # Some drivers register more than one card per device
+        if pci_slot in seen:
+            continue
+        seen.add(pci_slot)
+        vendor, device = pci_ids.lookup(vendor_id, device_id) if pci_ids else (None, None)
+        driver = os.path.join(device_dir, "driver")
+        gpus.append({
+            "card": card,
+            "pci_slot": pci_slot,
+            "vendor_id": f"{vendor_id:04x}",
+            "device_id": f"{device_id:04x}",
+            "vendor": vendor,
+            "device": device,
+            "name": short_name(vendor, device) or f"{vendor_id:04x}:{device_id:04x}",
+            "driver": os.path.basename(os.path.realpath(driver)) if os.path.exists(driver) else None,
+            "boot_vga": _read_text(os.path.join(device_dir, "boot_vga")) == "1",
+        })
+    gpus.sort(key=lambda gpu: not gpu["boot_vga"])
+    _gpus = gpus
+    return gpus
+
+
+def get_graphics_name():
+    '''Return the GPU names joined with " + ", e.g. both GPUs of a Framework Laptop 16.'''
+    return " + ".join(gpu["name"] for gpu in get_gpus()) or "Unknown"
@@ -3,6 +3,50 @@
 
 import os
 
+# Root-owned copy of app/ made by install.sh. Code that runs as root is started from here,
+# never from the checkout, which the user can write to.
+INSTALL_DIR = "/usr/lib/framework-app"
+# Settings and state of code running as root, which never writes into a user's home
+SERVICE_STATE_DIR = "/var/lib/framework-app"
+
 def get_asset_path(filename):
         '''Returns the path to the specified asset image.'''
         return os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", filename)
+
+def get_sysfs_path(*parts):
+        '''Returns a path under /sys, or under $FRAMEWORK_SYSFS_ROOT when set (used for fake hardware).'''
+        return os.path.join(os.environ.get("FRAMEWORK_SYSFS_ROOT") or "/sys", *parts)
+
+def get_procfs_path(*parts):
+        '''Returns a path under /proc, or under $FRAMEWORK_PROCFS_ROOT when set (used for fake hardware).'''
+        return os.path.join(os.environ.get("FRAMEWORK_PROCFS_ROOT") or "/proc", *parts)
+
+def get_devfs_path(*parts):
+        '''Returns a path under /dev, or under $FRAMEWORK_DEVFS_ROOT when set (used for fake hardware).'''
+        return os.path.join(os.environ.get("FRAMEWORK_DEVFS_ROOT") or "/dev", *parts)
+
+def get_data_dir():
+        '''Returns the per-user data directory for the app, creating it if needed.
+        As root it is SERVICE_STATE_DIR.'''
+        if os.geteuid() == 0:
+            os.makedirs(SERVICE_STATE_DIR, mode=0o755, exist_ok=True)
+            return SERVICE_STATE_DIR
+        base = os.environ.get("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share")
+        path = os.path.join(base, "framework-app")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+def get_config_dir():
+        '''Returns the per-user config directory for the app, creating it if needed.
+        As root it is SERVICE_STATE_DIR.'''
+        if os.geteuid() == 0:
+            os.makedirs(SERVICE_STATE_DIR, mode=0o755, exist_ok=True)
+            return SERVICE_STATE_DIR
+        base = os.environ.get("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config")
+        path = os.path.join(base, "framework-app")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+def get_installed_tool(name):
+        '''Returns the path of a script in app/tools of the root-owned install.'''
+        return os.path.join(INSTALL_DIR, "app", "tools", name)
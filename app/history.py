@@ -0,0 +1,247 @@
+'''History Store Module
+This module keeps a bounded time series of battery, power draw and thermal readings.
+Samples live in fixed-size ring buffers in memory and are flushed to an append-only
+binary file at a low rate, so history survives restarts without parsing text logs.
+'''
+
+import array
+import math
+import os
+import struct
+import sys
+import threading
+import time
+
+from app.helpers import get_data_dir
+
+# Columns stored for every sample, in on-disk order. Units are SI (W, A, V, RPM, C).
+FIELDS = (
+    "timestamp",
+    "capacity",
+    "status",
+    "power_now",
+    "current_now",
+    "voltage_now",
+    "fan_rpm",
+    "cpu_temp",
+    "board_temp",
+)
+
+# Battery status strings from sysfs, stored as small numeric codes
+STATUS_CODES = {
+    "unknown": 0,
+    "charging": 1,
+    "discharging": 2,
+    "not charging": 3,
+    "full": 4,
+}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+
+FILE_MAGIC = b"FWHIST1\0"
+# One little-endian double for the timestamp, one float per remaining column
+RECORD = struct.Struct("<d" + "f" * (len(FIELDS) - 1))
+
+DEFAULT_CAPACITY = 24 * 60 * 60 // 5  # One day at the default 5 s update interval
+DEFAULT_FLUSH_INTERVAL = 300  # Seconds between disk writes
+
+
+class HistoryStore:
+    '''Bounded in-memory history with periodic append-only persistence.
+
+    Call set() any number of times during a tick, then commit() once to turn
+    the current values into a sample. Fields not set in a tick are stored as NaN.
+    '''
+
+    def __init__(self, path=None, capacity=DEFAULT_CAPACITY, flush_interval=DEFAULT_FLUSH_INTERVAL, persist=True):
+        self.path = path if path is not None else os.path.join(get_data_dir(), "history.bin")
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        # Without persist the file is only read, for clients of the service which writes it
+        self.persist = persist
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()  # Serialises disk writes
+        self._columns = {name: array.array("d", [math.nan]) * capacity for name in FIELDS}
+        self._head = 0  # Next slot to write
+        self._count = 0
+        self._current = {}
+        self._pending = bytearray()
+        self._last_flush = time.monotonic()
+        self._load()
+
+    def set(self, **values):
+        '''Set values for the sample being built this tick.'''
+        with self._lock:
+            for name, value in values.items():
+                if name not in FIELDS or name == "timestamp":
+                    raise KeyError(f"Unknown history field: {name}")
+                if name == "status" and isinstance(value, str):
+                    value = STATUS_CODES.get(value.lower(), 0)
+                self._current[name] = math.nan if value is None else float(value)
+
+    def commit(self, timestamp=None):
+        '''Append the values set since the last commit as one sample.'''
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            row = [timestamp] + [self._current.get(name, math.nan) for name in FIELDS[1:]]
+            self._current = {}
+            self._append(row)
+            self._pending += RECORD.pack(*row)
+            due = time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def __len__(self):
+        return self._count
+
+    def latest(self):
+        '''Return the newest sample as a dict, or None if empty.'''
+        with self._lock:
+            if not self._count:
+                return None
+            idx = (self._head - 1) % self.capacity
+            return {name: self._columns[name][idx] for name in FIELDS}
+
+    def query(self, start=None, end=None, fields=FIELDS):
+        '''Return {field: list} for samples with start <= timestamp <= end.'''
+        with self._lock:
+            first = self._bisect(start) if start is not None else 0
+            last = self._bisect(end, right=True) if end is not None else self._count
+            return {name: self._slice(self._columns[name], first, last) for name in fields}
+
+    def series(self, field, start=None, end=None):
+        '''Return (timestamps, values) for one field, for graphs.'''
+        data = self.query(start, end, fields=("timestamp", field))
+        return data["timestamp"], data[field]
+
+    def flush(self):
+        '''Append pending samples to the history file.'''
+        with self._file_lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        with self._lock:
+            data, self._pending = bytes(self._pending), bytearray()
+            self._last_flush = time.monotonic()
+        if not data or not self.persist:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            new_file = not os.path.exists(self.path)
+            with open(self.path, "ab") as f:
+                if new_file:
+                    f.write(FILE_MAGIC)
+                f.write(data)
+                size = f.tell()
+            # Keep the file bounded: rewrite the tail once it holds several buffers' worth
+            if size > len(FILE_MAGIC) + 4 * self.capacity * RECORD.size:
+                self._compact()
+        except OSError as e:
+            print(f"Warning: Could not write history file {self.path}: {e}", file=sys.stderr)
+
+    def close(self):
+        '''Flush outstanding samples. Call on shutdown.'''
+        self.flush()
+
+    # Internal helpers
+
+    def _append(self, row):
+        for name, value in zip(FIELDS, row):
+            self._columns[name][self._head] = value
+        self._head = (self._head + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def _index(self, logical):
+        '''Map a logical position (0 = oldest) to a slot in the ring.'''
+        return (self._head - self._count + logical) % self.capacity
+
+    def _slice(self, column, first, last):
+        if first >= last:
+            return []
+        a = self._index(first)
+        b = self._index(last - 1) + 1
+        if a < b:
+            return column[a:b].tolist()
+        return column[a:].tolist() + column[:b].tolist()
+
+    def _bisect(self, value, right=False):
+        timestamps = self._columns["timestamp"]
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            ts = timestamps[self._index(mid)]
+            if ts < value or (right and ts == value):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _load(self):
+        '''Read only the newest `capacity` records from the history file.'''
+        try:
+            with open(self.path, "rb") as f:
+                if f.read(len(FILE_MAGIC)) != FILE_MAGIC:
+                    print(f"Warning: Ignoring unrecognised history file {self.path}", file=sys.stderr)
+                    return
+                size = os.fstat(f.fileno()).st_size - len(FILE_MAGIC)
+                records = size // RECORD.size
+                skip = max(0, records - self.capacity)
+                f.seek(len(FILE_MAGIC) + skip * RECORD.size)
+                data = f.read((records - skip) * RECORD.size)
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            print(f"Warning: Could not read history file {self.path}: {e}", file=sys.stderr)
+            return
+        for row in RECORD.iter_unpack(data):
+            self._append(row)
+
+    def _compact(self):
+        '''Rewrite the history file with just the in-memory samples.'''
+        with self._lock:
+            columns = [self._slice(self._columns[name], 0, self._count) for name in FIELDS]
+            # Everything pending is already part of the in-memory samples
+            self._pending = bytearray()
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(FILE_MAGIC)
+            for row in zip(*columns):
+                f.write(RECORD.pack(*row))
+        os.replace(tmp_path, self.path)
+
+
+def time_remaining_series(store, start=None, end=None, window=600):
+    '''Estimate hours to empty (discharging) or to full (charging) for each sample.
+
+    The rate is the change in capacity over the trailing `window` seconds.
+    Returns (timestamps, hours) with NaN where no estimate is possible.
+    '''
+    lookback = None if start is None else start - window
+    timestamps, capacity = store.series("capacity", lookback, end)
+    out_ts, out_hours = [], []
+    j = 0
+    for i, (ts, cap) in enumerate(zip(timestamps, capacity)):
+        while j < i and timestamps[j] < ts - window:
+            j += 1
+        if start is not None and ts < start:
+            continue
+        hours = math.nan
+        elapsed = ts - timestamps[j]
+        if elapsed > 0 and not math.isnan(cap) and not math.isnan(capacity[j]):
+            rate = (cap - capacity[j]) / elapsed  # Percent per second
+            if rate < 0:
+                hours = cap / -rate / 3600
+            elif rate > 0:
+                hours = (100 - cap) / rate / 3600
+        out_ts.append(ts)
+        out_hours.append(hours)
+    return out_ts, out_hours
+
+
+_store = None
+
+def get_history_store():
+    '''Return the shared HistoryStore, creating it on first use.'''
+    global _store
+    if _store is None:
+        _store = HistoryStore()
+    return _store
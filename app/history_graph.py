@@ -0,0 +1,201 @@
+'''History Graph Module
+This module defines a Cairo line graph that scrolls through samples from the history store.
+New samples only draw the newly exposed columns, the rest of the graph is shifted
+with a single blit from an offscreen surface.
+'''
+
+import math
+import time
+import cairo
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import Gtk
+
+GAP_SECONDS = 60  # Samples further apart than this are not joined up
+PADDING = 4
+
+
+def nice_ceiling(value):
+    '''Round value up to 1, 2 or 5 times a power of ten.'''
+    if value <= 0:
+        return 1
+    exponent = math.floor(math.log10(value))
+    for step in (1, 2, 5, 10):
+        ceiling = step * 10 ** exponent
+        if ceiling >= value:
+            return ceiling
+    return 10 ** (exponent + 1)
+
+
+class HistoryGraph(Gtk.DrawingArea):
+    '''A scrolling graph of one history series.'''
+
+    def __init__(self, source, title, unit, color=(0.2, 0.6, 1.0), window=3600, y_range=None, height=90):
+        """
+        source: callable(start, end) returning (timestamps, values)
+        y_range: fixed (min, max), or None to scale automatically from 0
+        """
+        super().__init__()
+        self.set_size_request(-1, height)
+        self.source = source
+        self.title = title
+        self.unit = unit
+        self.color = color
+        self.window = window
+        self.fixed_range = y_range
+        self.y_min, self.y_max = y_range if y_range else (0, 1)
+        self._surface = None  # Rendered graph, blitted on draw
+        self._spare = None  # Second surface used while scrolling
+        self._right_edge = None  # Timestamp of the rightmost column in _surface
+        self._last_value = None
+        self.marker = None  # Optional value drawn as a dashed line, e.g. the charge limit
+        self.connect("draw", self._on_draw)
+        self.connect("size-allocate", self._on_size_allocate)
+
+    def push(self, now=None):
+        '''Scroll to `now`, drawing only the columns that became visible.'''
+        now = time.time() if now is None else now
+        if self._surface is None:
+            return
+        width = self._surface.get_width()
+        seconds_per_px = self.window / width
+        shift = int((now - self._right_edge) / seconds_per_px)
+        if shift <= 0:
+            return
+        new_edge = self._right_edge + shift * seconds_per_px
+        if shift >= width:
+            self._render(0, width, new_edge)
+        else:
+            # Blit the existing graph left, then draw the new columns
+            cr = cairo.Context(self._spare)
+            cr.set_operator(cairo.OPERATOR_SOURCE)
+            cr.set_source_surface(self._surface, -shift, 0)
+            cr.paint()
+            self._surface, self._spare = self._spare, self._surface
+            if not self._render(width - shift, width, new_edge):
+                # Values went past the top of the scale, redraw everything rescaled
+                self._render(0, width, new_edge)
+        self._right_edge = new_edge
+        self.queue_draw()
+
+    def set_marker(self, value):
+        '''Show a dashed horizontal line at value, or hide it with None.'''
+        if value != self.marker:
+            self.marker = value
+            self.queue_draw()
+
+    def redraw(self):
+        '''Redraw the whole graph, e.g. after the source changed.'''
+        if self._surface is not None:
+            self._right_edge = time.time()
+            self._render(0, self._surface.get_width(), self._right_edge)
+            self.queue_draw()
+
+    def _on_size_allocate(self, _widget, allocation):
+        self._ensure_surface(allocation.width, allocation.height)
+
+    def _ensure_surface(self, width, height):
+        '''(Re)create and render the backing surfaces if their size is not width x height.
+        Returns False while the widget is not realized or has no size yet.'''
+        if self._surface is not None and (self._surface.get_width(), self._surface.get_height()) == (width, height):
+            return True
+        window = self.get_window()
+        if window is None or width <= 0 or height <= 0:
+            return False
+        self._surface = window.create_similar_surface(cairo.CONTENT_COLOR_ALPHA, width, height)
+        self._spare = window.create_similar_surface(cairo.CONTENT_COLOR_ALPHA, width, height)
+        self._right_edge = time.time()
+        self._render(0, width, self._right_edge)
+        return True
+
+    def _render(self, x0, x1, right_edge):
+        '''Draw columns [x0, x1) of the backing surface. Returns False if the scale must grow.'''
+        width, height = self._surface.get_width(), self._surface.get_height()
+        seconds_per_px = self.window / width
+        start = right_edge - (width - x0) * seconds_per_px
+        end = right_edge - (width - x1) * seconds_per_px
+        timestamps, values = self.source(start - GAP_SECONDS, end)
+
+        # Decimate: min/max of the samples falling in each pixel column
+        columns = {}
+        prev = None  # Last sample before the current column, to join columns up
+        i = 0
+        for x in range(x0, x1):
+            col_end = right_edge - (width - x - 1) * seconds_per_px
+            lo = hi = None
+            if prev is not None and col_end - prev[0] <= GAP_SECONDS + seconds_per_px:
+                lo = hi = prev[1]
+            while i < len(timestamps) and timestamps[i] <= col_end:
+                value = values[i]
+                if not math.isnan(value):
+                    lo = value if lo is None else min(lo, value)
+                    hi = value if hi is None else max(hi, value)
+                    prev = (timestamps[i], value)
+                i += 1
+            if lo is not None:
+                columns[x] = (lo, hi)
+        if columns:
+            self._last_value = prev[1] if prev else self._last_value
+
+        if self.fixed_range is None and columns:
+            peak = max(hi for _lo, hi in columns.values())
+            if peak > self.y_max:
+                self.y_max = nice_ceiling(peak)
+                if x0 > 0:
+                    return False
+
+        cr = cairo.Context(self._surface)
+        cr.rectangle(x0, 0, x1 - x0, height)
+        cr.clip()
+        cr.set_operator(cairo.OPERATOR_SOURCE)
+        cr.set_source_rgba(0, 0, 0, 0)
+        cr.paint()
+        cr.set_operator(cairo.OPERATOR_OVER)
+
+        # Horizontal grid lines are the same in every column, so they scroll for free
+        cr.set_source_rgba(0.5, 0.5, 0.5, 0.3)
+        cr.set_line_width(1)
+        for fraction in (0.25, 0.5, 0.75):
+            y = round(self._to_y(self.y_min + fraction * (self.y_max - self.y_min), height)) + 0.5
+            cr.move_to(x0, y)
+            cr.line_to(x1, y)
+        cr.stroke()
+
+        cr.set_source_rgb(*self.color)
+        cr.set_line_width(1.5)
+        for x, (lo, hi) in columns.items():
+            cr.move_to(x + 0.5, self._to_y(hi, height) - 0.75)
+            cr.line_to(x + 0.5, self._to_y(lo, height) + 0.75)
+        cr.stroke()
+        return True
+
+    def _to_y(self, value, height):
+        span = (self.y_max - self.y_min) or 1
+        fraction = min(max((value - self.y_min) / span, 0), 1)
+        return PADDING + (1 - fraction) * (height - 2 * PADDING)
+
+    def _on_draw(self, _widget, cr):
+        # The first allocation usually comes before the widget is realized, so the
+        # surfaces may not exist until the first draw
+        if not self._ensure_surface(self.get_allocated_width(), self.get_allocated_height()):
+            return False
+        cr.set_source_surface(self._surface, 0, 0)
+        cr.paint()
+        if self.marker is not None:
+            y = round(self._to_y(self.marker, self._surface.get_height())) + 0.5
+            cr.set_source_rgba(0.8, 0.2, 0.2, 0.8)
+            cr.set_line_width(1)
+            cr.set_dash([4, 3])
+            cr.move_to(0, y)
+            cr.line_to(self._surface.get_width(), y)
+            cr.stroke()
+            cr.set_dash([])
+        # Labels are drawn on top each frame rather than baked into the scrolling surface
+        cr.set_source_rgb(0.4, 0.4, 0.4)
+        cr.set_font_size(11)
+        current = f"{self._last_value:.1f} {self.unit}" if self._last_value is not None else "--"
+        cr.move_to(PADDING, 12)
+        cr.show_text(f"{self.title}: {current}")
+        cr.move_to(self._surface.get_width() - 40, 12)
+        cr.show_text(f"{self.y_max:g} {self.unit}")
+        return False
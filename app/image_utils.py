@@ -1,89 +1,290 @@
-'''This module provides utility functions for loading and scaling images in a GTK application.'''
+'''This module provides utility functions for loading and scaling images in a GTK application.
+Images in the asset atlas (see app.atlas) are wrapped straight from the mapped file,
+everything else is decoded and scaled from the PNG.
 
+Images are rendered at device resolution: pass the widget's scale factor and a width in
+logical pixels, and the image is made at width * scale device pixels and shown through a
+cairo surface with that scale, so GTK never upsamples it. Rendered surfaces are cached
+per (file, width, scale, color) and reused by every widget showing the same image.
 
+When the image worker is enabled (see app.image_worker), PNGs are decoded and scaled and
+colors applied in a worker process instead, and the result is wrapped from shared memory.
+The main loop does not wait for it: the returned Gtk.Image shows the image cached in
+another color, the untinted atlas image or nothing, and the worker's render is swapped in
+from GLib.idle_add when it is done. If the worker fails the image is rendered in process.
+'''
+
+
+import array
 import os
 import sys
-from gi.repository import Gtk, GdkPixbuf, GLib
+from collections import OrderedDict
+from gi.repository import Gtk, Gdk, GdkPixbuf, GLib
+from app.atlas import asset_name, get_atlas_index
+from app.image_worker import get_image_worker, read_shared, release_shared, shared_path
+from app.tracing import traced
+
+CACHE_SIZE = 64  # Rendered surfaces kept, the laptop image, overlays and cards fit easily
+
+_atlas_bytes = None  # The whole atlas file as GLib.Bytes over a read-only mapping
+_surface_cache = OrderedDict()  # (path, width, scale, color, mtime) -> (surface, margins)
+_pending = {}  # cache key -> Gtk.Images waiting for the image worker's render of it
+
+
+def load_atlas_pixbuf(path, target_width):
+    """Return (pixbuf, entry) for an asset pre-scaled to target_width in the atlas,
+    or (None, None). The pixbuf shares the mapped file's memory."""
+    global _atlas_bytes
+    index = get_atlas_index()
+    name = asset_name(path) if index is not None else None
+    entry = index.find(name, target_width) if name else None
+    if entry is None:
+        return None, None
+    try:
+        if _atlas_bytes is None:
+            _atlas_bytes = GLib.MappedFile.new(index.path, False).get_bytes()
+        data = GLib.Bytes.new_from_bytes(_atlas_bytes, index.data_offset + entry.offset, entry.size)
+        pixbuf = GdkPixbuf.Pixbuf.new_from_bytes(data, GdkPixbuf.Colorspace.RGB, True, 8,
+                                                 entry.width, entry.height, entry.rowstride)
+    except GLib.Error as e:
+        print(f"Warning: Could not read {name} from the asset atlas: {e}", file=sys.stderr)
+        return None, None
+    return pixbuf, entry
+
+
+def clear_image_cache():
+    '''Drop all cached surfaces.'''
+    _surface_cache.clear()
+
+
+def parse_color(color):
+    '''Return (r, g, b, a) from an RGB/RGBA tuple or a "#rrggbb[aa]" string.'''
+    if isinstance(color, str):
+        if color.startswith('#'):
+            color = color.lstrip('#')
+            lv = len(color)
+            color = tuple(int(color[i:i+2], 16) for i in range(0, lv, 2))
+    # Default to opaque if alpha not provided
+    if len(color) == 3:
+        color = (*color, 255)
+    return tuple(int(c) for c in color)
+
+
+def blend_color(pixbuf, color):
+    '''Return a copy of pixbuf multiplied by an (r, g, b, a) color, preserving transparency.'''
+    r, g, b, a = color
+    width, height = pixbuf.get_width(), pixbuf.get_height()
+    has_alpha = pixbuf.get_has_alpha()
+    n_channels = pixbuf.get_n_channels()
+    rowstride = pixbuf.get_rowstride()
+    pixels = pixbuf.read_pixel_bytes().get_data()
+    # Copy pixels to a mutable array
+    arr = array.array('B', pixels)
+    for y in range(height):
+        for x in range(width):
+            i = y * rowstride + x * n_channels
+            orig_r = arr[i]
+            orig_g = arr[i+1]
+            orig_b = arr[i+2]
+            orig_a = arr[i+3] if has_alpha and n_channels == 4 else 255
+            # Blend: multiply color and preserve alpha
+            arr[i]   = int(orig_r * r / 255)
+            arr[i+1] = int(orig_g * g / 255)
+            arr[i+2] = int(orig_b * b / 255)
+            if has_alpha and n_channels == 4:
+                arr[i+3] = int(orig_a * a / 255)
+    # Create new pixbuf from blended data
+    return GdkPixbuf.Pixbuf.new_from_bytes(
+        GLib.Bytes.new(arr.tobytes()),
+        GdkPixbuf.Colorspace.RGB,
+        has_alpha,
+        8,
+        width,
+        height,
+        rowstride
+    )
+
+
+def pixbuf_from_shared(image):
+    """Return a pixbuf over the pixels of a SharedImage from the image worker, and unlink
+    its segment. Where the segment is a file the pixels are mapped, not copied."""
+    path = shared_path(image)
+    try:
+        if path is not None:
+            data = GLib.MappedFile.new(path, False).get_bytes()
+        else:
+            data = GLib.Bytes.new(read_shared(image))
+    finally:
+        release_shared(image)
+    return GdkPixbuf.Pixbuf.new_from_bytes(data, GdkPixbuf.Colorspace.RGB, True, 8,
+                                           image.width, image.height, image.rowstride)
+
+
+def _margins(entry, scale):
+    """Return the logical (start, top, end, bottom) margins that place a cropped atlas image."""
+    if entry is None or (entry.width, entry.height) == (entry.full_width, entry.full_height):
+        return None
+    return (entry.x // scale, entry.y // scale,
+            (entry.full_width - entry.x - entry.width) // scale,
+            (entry.full_height - entry.y - entry.height) // scale)
+
+
+def _render(path, target_width, scale, color):
+    """Return (surface, margins) for the image at target_width * scale device pixels,
+    rendered in process. margins are as returned by _margins."""
+    device_width = target_width * scale
+    pixbuf, entry = load_atlas_pixbuf(path, device_width)
+    if pixbuf is None:
+        pixbuf = GdkPixbuf.Pixbuf.new_from_file(path)
+        if pixbuf.get_width() > device_width:
+            target_height = int(pixbuf.get_height() * device_width / pixbuf.get_width())
+            pixbuf = pixbuf.scale_simple(device_width, target_height, GdkPixbuf.InterpType.BILINEAR)
+    if color is not None:
+        pixbuf = blend_color(pixbuf, color)
+    surface = Gdk.cairo_surface_create_from_pixbuf(pixbuf, scale, None)
+    return surface, _margins(entry, scale)
+
 
+def _store(key, rendered):
+    _surface_cache[key] = rendered
+    if len(_surface_cache) > CACHE_SIZE:
+        _surface_cache.popitem(last=False)
 
-def load_scaled_image(path, target_width):
-    """Load and scale an image to the given width, keeping aspect ratio. 
+
+def _show(img, surface, margins):
+    if surface is not None:
+        img.set_from_surface(surface)
+    if margins:
+        img.set_halign(Gtk.Align.START)
+        img.set_valign(Gtk.Align.START)
+        img.set_margin_start(margins[0])
+        img.set_margin_top(margins[1])
+        img.set_margin_end(margins[2])
+        img.set_margin_bottom(margins[3])
+
+
+def _image_from_surface(surface, margins):
+    img = Gtk.Image()
+    _show(img, surface, margins)
+    return img
+
+
+def _placeholder(key, pixbuf, margins):
+    """Return the Gtk.Image to show until the worker's render of key arrives: the same
+    image cached in another color, e.g. an LED's previous color, the untinted atlas
+    image, or an empty image."""
+    path, target_width, scale = key[:3]
+    for other, rendered in reversed(_surface_cache.items()):
+        if other[:3] == (path, target_width, scale):
+            return _image_from_surface(*rendered)
+    surface = Gdk.cairo_surface_create_from_pixbuf(pixbuf, scale, None) if pixbuf is not None else None
+    return _image_from_surface(surface, margins)
+
+
+def _deliver(key, image, margins):
+    """Main loop: cache the worker's SharedImage for key, or render in process if the
+    worker failed, and show it in the images waiting for it."""
+    waiting = _pending.pop(key, [])
+    path, target_width, scale, color = key[:4]
+    try:
+        if image is not None:
+            surface = Gdk.cairo_surface_create_from_pixbuf(pixbuf_from_shared(image), scale, None)
+            rendered = (surface, margins)
+        else:
+            rendered = _render(path, target_width, scale, color)
+    except GLib.Error as e:
+        print(f"Warning: Could not render {path}: {e}", file=sys.stderr)
+        return False
+    _store(key, rendered)
+    for img in waiting:
+        _show(img, *rendered)
+    return False
+
+
+def _render_async(key, worker, pixbuf, entry):
+    """Start rendering key in the image worker and return a placeholder Gtk.Image that
+    is updated when it is done, or None if the job could not be started. pixbuf and
+    entry are the untinted atlas image, if any."""
+    path, target_width, scale, color = key[:4]
+    device_width = target_width * scale
+    atlas = None
+    if entry is not None:
+        index = get_atlas_index()
+        atlas = (index.path, index.data_offset + entry.offset, entry.width, entry.height, entry.rowstride)
+    margins = _margins(entry, scale)
+    done = lambda image: GLib.idle_add(_deliver, key, image, margins)
+    if not worker.render_image_async(done, path, device_width, color, atlas):
+        return None
+    img = _placeholder(key, pixbuf, margins)
+    _pending[key] = [img]
+    return img
+
+
+def _cached_image(path, target_width, scale, color):
+    """Return a Gtk.Image of the rendered image, from the cache if possible. Work for the
+    image worker does not block the main loop: the image shows a placeholder until the
+    worker's result is swapped in."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime = None  # Only in the atlas, e.g. the pre-rendered OS overlays
+    key = (path, target_width, scale, color, mtime)
+    rendered = _surface_cache.get(key)
+    if rendered is not None:
+        _surface_cache.move_to_end(key)
+        return _image_from_surface(*rendered)
+    if key in _pending:
+        img = _placeholder(key, None, None)
+        _pending[key].append(img)
+        return img
+    worker = get_image_worker()
+    if worker is not None:
+        pixbuf, entry = load_atlas_pixbuf(path, target_width * scale)
+        # Untinted atlas images are ready to show, anything else is work for the image worker
+        if pixbuf is None or color is not None:
+            img = _render_async(key, worker, pixbuf, entry)
+            if img is not None:
+                return img
+    rendered = _render(path, target_width, scale, color)
+    _store(key, rendered)
+    return _image_from_surface(*rendered)
+
+
+def _exists(path):
+    index = get_atlas_index()
+    if os.path.isfile(path) or (index is not None and asset_name(path) in index):
+        return True
+    print(f"Warning: Image not found at {path}", file=sys.stderr)
+    return False
+
+
+@traced()
+def load_scaled_image(path, target_width, scale=1):
+    """Load and scale an image to the given width, keeping aspect ratio.
+    target_width is in logical pixels, scale is the widget's scale factor.
     Returns Gtk.Image or None."""
 
-    if not os.path.isfile(path):
-        print(f"Warning: Image not found at {path}", file=sys.stderr)
+    if not _exists(path):
         return None
     try:
-        pixbuf = GdkPixbuf.Pixbuf.new_from_file(path)
-        if pixbuf.get_width() > target_width:
-            scale = target_width / pixbuf.get_width()
-            target_height = int(pixbuf.get_height() * scale)
-            pixbuf = pixbuf.scale_simple(target_width, target_height, GdkPixbuf.InterpType.BILINEAR)
-        img = Gtk.Image.new_from_pixbuf(pixbuf)
+        img = _cached_image(path, target_width, scale, None)
     except GLib.Error as e:
         print(f"Warning: Could not scale image: {e}", file=sys.stderr)
         img = Gtk.Image.new_from_file(path)
     return img
 
 
-def colorize_image(path, target_width, color):
+@traced()
+def colorize_image(path, target_width, color, scale=1):
     """
     Load and scale an image, then apply a color filter (RGBA tuple or hex string).
     Returns Gtk.Image or None.
     """
 
-    if not os.path.isfile(path):
-        print(f"Warning: Image not found at {path}", file=sys.stderr)
+    if not _exists(path):
         return None
     try:
-        pixbuf = GdkPixbuf.Pixbuf.new_from_file(path)
-        if pixbuf.get_width() > target_width:
-            scale = target_width / pixbuf.get_width()
-            target_height = int(pixbuf.get_height() * scale)
-            pixbuf = pixbuf.scale_simple(target_width, target_height, GdkPixbuf.InterpType.BILINEAR)
-        # Parse color
-        if isinstance(color, str):
-            if color.startswith('#'):
-                color = color.lstrip('#')
-                lv = len(color)
-                color = tuple(int(color[i:i+2], 16) for i in range(0, lv, 2))
-        # Default to opaque if alpha not provided
-        if len(color) == 3:
-            color = (*color, 255)
-        r, g, b, a = (int(c) for c in color)
-        # Blend color filter with original image, preserving transparency
-        width, height = pixbuf.get_width(), pixbuf.get_height()
-        has_alpha = pixbuf.get_has_alpha()
-        n_channels = pixbuf.get_n_channels()
-        rowstride = pixbuf.get_rowstride()
-        pixels = pixbuf.get_pixels()
-        import array
-        # Copy pixels to a mutable array
-        arr = array.array('B', pixels)
-        for y in range(height):
-            for x in range(width):
-                i = y * rowstride + x * n_channels
-                orig_r = arr[i]
-                orig_g = arr[i+1]
-                orig_b = arr[i+2]
-                orig_a = arr[i+3] if has_alpha and n_channels == 4 else 255
-                # Blend: multiply color and preserve alpha
-                arr[i]   = int(orig_r * r / 255)
-                arr[i+1] = int(orig_g * g / 255)
-                arr[i+2] = int(orig_b * b / 255)
-                if has_alpha and n_channels == 4:
-                    arr[i+3] = int(orig_a * a / 255)
-        # Create new pixbuf from blended data
-        blended = GdkPixbuf.Pixbuf.new_from_data(
-            arr.tobytes(),
-            GdkPixbuf.Colorspace.RGB,
-            has_alpha,
-            8,
-            width,
-            height,
-            rowstride
-        )
-        img = Gtk.Image.new_from_pixbuf(blended)
+        img = _cached_image(path, target_width, scale, parse_color(color))
     except GLib.Error as e:
         print(f"Warning: Could not colorize image: {e}", file=sys.stderr)
         img = Gtk.Image.new_from_file(path)
@@ -0,0 +1,222 @@
+'''Image Worker Module
+Pillow rendering in worker processes, so decoding, drawing and tinting images does not hold
+the GIL of the GTK process. The pool is optional: set FRAMEWORK_IMAGE_WORKERS to the number
+of processes to use it. Without it, or when a job fails, callers render in process as before.
+
+render_image loads an asset (from its PNG or from the asset atlas), scales and tints it,
+and returns the pixels in a shared memory segment created by the worker, as a SharedImage
+with the segment name and the RGBA layout. On Linux the segment is a file in /dev/shm, so
+image_utils maps it with GLib.MappedFile and wraps the mapping in a pixbuf without copying
+the pixels. The name is unlinked once mapped, the memory is freed with the pixbuf.
+write_overlay runs a renderer such as providers.render_time_overlay and writes the PNG in
+the worker. This module does not use GTK.
+'''
+
+import concurrent.futures
+import multiprocessing
+import os
+import sys
+import threading
+from collections import namedtuple
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import resource_tracker, shared_memory
+
+WORKERS_ENV = "FRAMEWORK_IMAGE_WORKERS"
+JOB_TIMEOUT = 10  # seconds before a job is given up and rendered in process
+SHM_DIR = "/dev/shm"
+
+# RGBA pixels, rowstride bytes per row, in the shared memory segment called name
+SharedImage = namedtuple("SharedImage", "name width height rowstride")
+
+
+def _untracked_segment(name=None, size=0):
+    '''Return a shared memory segment, new if name is None, that this process will not unlink.'''
+    create = name is None
+    try:
+        return shared_memory.SharedMemory(name, create=create, size=size, track=False)
+    except TypeError:
+        # Before Python 3.13 every segment is tracked and would be unlinked when the process exits
+        segment = shared_memory.SharedMemory(name, create=create, size=size)
+        resource_tracker.unregister(segment._name, "shared_memory")
+        return segment
+
+
+def _open_source(path, device_width, atlas):
+    from PIL import Image
+    if atlas is not None:
+        # (atlas file, offset, width, height, rowstride) of an image pre-scaled in the atlas
+        atlas_path, offset, width, height, rowstride = atlas
+        with open(atlas_path, "rb") as f:
+            f.seek(offset)
+            data = f.read(rowstride * height)
+        return Image.frombuffer("RGBA", (width, height), data, "raw", "RGBA", rowstride, 1)
+    image = Image.open(path).convert("RGBA")
+    if image.width > device_width:
+        height = int(image.height * device_width / image.width)
+        image = image.resize((device_width, height), Image.BILINEAR)
+    return image
+
+
+def tint(image, color):
+    '''Return an RGBA image multiplied by an (r, g, b, a) color, as image_utils.blend_color.'''
+    from PIL import Image
+    bands = [band.point([value * c // 255 for value in range(256)])
+             for band, c in zip(image.split(), color)]
+    return Image.merge("RGBA", bands)
+
+
+def render_image(path, device_width, color=None, atlas=None):
+    '''Worker job: load, scale and tint an image, returning a SharedImage.'''
+    image = _open_source(path, device_width, atlas)
+    if color is not None:
+        image = tint(image, color)
+    pixels = image.tobytes()
+    segment = _untracked_segment(size=max(len(pixels), 1))
+    try:
+        segment.buf[:len(pixels)] = pixels
+        return SharedImage(segment.name, image.width, image.height, image.width * 4)
+    finally:
+        segment.close()
+
+
+def write_overlay(render, args, out_path):
+    '''Worker job: write render(*args), a Pillow image, to out_path.'''
+    render(*args).save(out_path)
+    return True
+
+
+def shared_path(image):
+    '''Return the file backing a SharedImage, or None where segments are not files.'''
+    path = os.path.join(SHM_DIR, image.name.lstrip("/"))
+    return path if os.path.exists(path) else None
+
+
+def read_shared(image):
+    '''Return a copy of the pixels of a SharedImage, for systems without /dev/shm.'''
+    segment = _untracked_segment(image.name)
+    try:
+        return bytes(segment.buf[:image.rowstride * image.height])
+    finally:
+        segment.close()
+
+
+def release_shared(image):
+    '''Unlink the segment of a SharedImage. Mappings of it stay valid until they are freed.'''
+    path = shared_path(image)
+    try:
+        if path is not None:
+            os.unlink(path)
+        else:
+            segment = shared_memory.SharedMemory(image.name)
+            segment.close()
+            segment.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _release_late(future):
+    # The caller gave up waiting, free the segment the job made anyway
+    if not future.cancelled() and future.exception() is None and isinstance(future.result(), SharedImage):
+        release_shared(future.result())
+
+
+class ImageWorker:
+    '''A pool of image worker processes, started with the first job.'''
+
+    def __init__(self, processes, timeout=JOB_TIMEOUT):
+        # Spawned, forking a process running GTK threads is not safe
+        self._pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+        self.timeout = timeout
+
+    def _submit(self, job, *args):
+        '''Return the Future of a job, or None if the pool is gone.'''
+        pool = self._pool
+        if pool is None:
+            return None
+        try:
+            return pool.submit(job, *args)
+        except (BrokenProcessPool, RuntimeError) as e:
+            print(f"Image worker unavailable, rendering in process: {e}", file=sys.stderr)
+            self._pool = None
+            return None
+
+    def _result(self, future, timeout=None):
+        '''Return the result of a submitted job, or None if it failed.'''
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            print(f"Image worker took over {timeout}s, rendering in process", file=sys.stderr)
+            future.add_done_callback(_release_late)
+        except concurrent.futures.CancelledError:
+            pass  # shut down
+        except BrokenProcessPool as e:
+            print(f"Image worker stopped, rendering in process: {e}", file=sys.stderr)
+            self._pool = None
+        except Exception as e:
+            print(f"Image worker job failed: {e}", file=sys.stderr)
+        return None
+
+    def _run(self, job, *args):
+        '''Return the result of a job, waiting at most self.timeout, or None if it failed.'''
+        future = self._submit(job, *args)
+        return self._result(future, self.timeout) if future is not None else None
+
+    def render_image(self, path, device_width, color=None, atlas=None):
+        '''Return a SharedImage of the image at device_width tinted by color, or None.
+        The caller owns the segment and must pass it to release_shared.'''
+        return self._run(render_image, path, device_width, color, atlas)
+
+    def render_image_async(self, callback, path, device_width, color=None, atlas=None):
+        '''Start render_image without waiting for it. callback(SharedImage or None) is
+        called from a pool thread when it is done and owns the segment. Returns False if
+        the job could not be started.'''
+        future = self._submit(render_image, path, device_width, color, atlas)
+        if future is None:
+            return False
+        future.add_done_callback(lambda done: callback(self._result(done)))
+        return True
+
+    def save_overlay(self, render, args, out_path):
+        '''Write render(*args) to out_path in a worker. render must be a module level
+        function returning a Pillow image. Returns False if it was not written.'''
+        return self._run(write_overlay, render, args, out_path) is True
+
+    def shutdown(self):
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _configured_processes():
+    value = os.environ.get(WORKERS_ENV, "").strip()
+    if not value:
+        return 0
+    try:
+        return max(int(value), 0)
+    except ValueError:
+        print(f"Ignoring {WORKERS_ENV}={value!r}, expected a number of processes", file=sys.stderr)
+        return 0
+
+
+_worker = None
+_worker_checked = False
+_worker_lock = threading.Lock()
+
+def get_image_worker():
+    '''Return the shared ImageWorker, or None if FRAMEWORK_IMAGE_WORKERS does not enable it.'''
+    global _worker, _worker_checked
+    with _worker_lock:
+        if not _worker_checked:
+            _worker_checked = True
+            processes = _configured_processes()
+            if processes:
+                _worker = ImageWorker(processes)
+        return _worker
+
+
+def shutdown_image_worker():
+    '''Stop the worker processes if they were started.'''
+    with _worker_lock:
+        if _worker is not None:
+            _worker.shutdown()
@@ -0,0 +1,88 @@
+'''Keyboard Backlight Module
+This module reads and sets the keyboard backlight through ectool and sends modes to the
+keyboard backlight daemon. It has no GTK dependency.
+'''
+
+import subprocess
+
+from app.command_runner import invalidate, run_query
+from app.helpers import get_installed_tool
+from app.settings import get_settings
+
+KB_MODES = ["Manual", "Auto", "Responsive", "Breathe"]
+MODE_FILE = "/tmp/kb_backlight_mode"
+# Runs as root, so it is started from the root-owned install, never from the checkout
+DAEMON_PATH = get_installed_tool("keyboard_backlight_daemon.py")
+
+
+def get_brightness():
+    '''Return the keyboard backlight brightness in percent, or None on error.'''
+    try:
+        cmd = ["pkexec", "/usr/bin/ectool", "pwmgetkblight"]
+        result = run_query(cmd, timeout=2, check=True)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError) as e:
+        print("Error getting backlight value:", e)
+        return None
+    for line in result.stdout.splitlines():
+        if "Current keyboard backlight percent:" in line:
+            return int(line.split(":")[-1].strip())
+    return None
+
+
+def set_brightness(value):
+    '''Set the keyboard backlight brightness in percent. Returns True on success.'''
+    value = int(value)
+    if not 0 <= value <= 100:
+        raise ValueError(f"Brightness must be between 0 and 100, got {value}")
+    try:
+        cmd = ["pkexec", "/usr/bin/ectool", "pwmsetkblight", str(value)]
+        subprocess.run(cmd, check=True, timeout=2)
+        invalidate("ectool", "pwmgetkblight")
+        get_settings().set("keyboard.brightness", value)
+        return True
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError) as e:
+        print("Error setting backlight:", e)
+        return False
+
+
+def is_daemon_running():
+    '''Return True if the keyboard backlight daemon, or the service running it, is running.'''
+    try:
+        result = run_query(["pgrep", "-f", "keyboard_backlight_daemon.py|framework_service.py"])
+        return bool(result.stdout.strip())
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+
+
+def write_mode_file(mode):
+    '''Tell the daemon which mode to run. Returns True on success.'''
+    try:
+        with open(MODE_FILE, "w", encoding="utf-8") as f:
+            f.write(mode.lower())
+        match = [m for m in KB_MODES if m.lower() == mode.lower()]
+        if match:
+            get_settings().set("keyboard.mode", match[0])
+        return True
+    except OSError as e:
+        print("Failed to send mode to daemon:", e)
+        return False
+
+
+def ensure_daemon():
+    '''Start the keyboard backlight daemon if it is not running.'''
+    if is_daemon_running():
+        return
+    try:
+        subprocess.Popen(["pkexec", "/usr/bin/python3", "-I", DAEMON_PATH])
+        invalidate("pgrep")
+    except OSError as e:
+        print("Failed to start daemon:", e)
+
+
+def set_mode(mode):
+    '''Switch the backlight mode, starting the daemon if needed. Returns True on success.'''
+    match = [m for m in KB_MODES if m.lower() == mode.lower()]
+    if not match:
+        raise ValueError(f"Unknown keyboard backlight mode: {mode} (expected one of {', '.join(KB_MODES)})")
+    ensure_daemon()
+    return write_mode_file(match[0])
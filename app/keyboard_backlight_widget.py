@@ -1,21 +1,23 @@
 '''Keyboard Backlight Widget
 This widget provides a UI for controlling the keyboard backlight brightness and mode.
+KeyboardBacklightProvider holds the chosen values so ui.py can poll it off the main thread.
 '''
 
-import subprocess
 import threading
 from gi.repository import Gtk, GLib
 from app.widget import WidgetTemplate
+from app.providers import KeyboardBacklightProvider
+from app.keyboard_backlight import KB_MODES, get_brightness, set_brightness, set_mode, write_mode_file
+from app.service_client import call_hardware
 
 class KeyboardBacklightWidget(Gtk.Box, WidgetTemplate):
     '''Widget to control keyboard backlight brightness and mode.'''
 
     def __init__(self, model=None, image_size=(500, 710)):
         Gtk.Box.__init__(self, orientation=Gtk.Orientation.VERTICAL, spacing=10)
-        WidgetTemplate.__init__(self)
+        WidgetTemplate.__init__(self, KeyboardBacklightProvider(image_size))
         self.model = model
         self.image_size = image_size
-        self.data = None
 
         # Label
         self.label = Gtk.Label(label="Keyboard Backlight")
@@ -33,28 +35,18 @@ class KeyboardBacklightWidget(Gtk.Box, WidgetTemplate):
         self.pack_start(self.value_label, False, False, 0)
 
         # Mode button
-        self.modes = ["Manual", "Auto", "Responsive", "Breathe"]
+        self.modes = KB_MODES
         self.current_mode = 0
         self.mode_button = Gtk.Button(label=f"Mode: {self.modes[self.current_mode]}")
         self.mode_button.connect("clicked", self.on_mode_clicked)
         self.pack_start(self.mode_button, False, False, 0)
 
         self._debounce_id = None
-        self._daemon_proc = None
 
   
     def _update_scale_from_ectool(self):
         def worker():
-            current_value = 0
-            try:
-                cmd = ["pkexec", "/usr/bin/ectool", "pwmgetkblight"]
-                result = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=2)
-                for line in result.stdout.splitlines():
-                    if "Current keyboard backlight percent:" in line:
-                        current_value = int(line.split(":")[-1].strip())
-                        break
-            except Exception as e:
-                print("Error getting backlight value:", e)
+            current_value = get_brightness() or 0
             GLib.idle_add(self.scale.set_value, current_value)
             GLib.idle_add(self.value_label.set_text, f"{current_value}%")
         threading.Thread(target=worker, daemon=True).start()
@@ -63,24 +55,8 @@ class KeyboardBacklightWidget(Gtk.Box, WidgetTemplate):
         self.current_mode = (self.current_mode + 1) % len(self.modes)
         button.set_label(f"Mode: {self.modes[self.current_mode]}")
         mode = self.modes[self.current_mode]
-        daemon_path = "/usr/bin/keyboard_backlight_daemon.py"
-        def is_daemon_running():
-            try:
-                result = subprocess.run(["pgrep", "-f", "keyboard_backlight_daemon.py"], capture_output=True, text=True, check=False)
-                return bool(result.stdout.strip())
-            except Exception:
-                return False
-        if not is_daemon_running():
-            try:
-                cmd = ["pkexec", "python3", daemon_path]
-                self._daemon_proc = subprocess.Popen(cmd)
-            except Exception as e:
-                print("Failed to start daemon:", e)
-        try:
-            with open("/tmp/kb_backlight_mode", "w", encoding="utf-8") as f:
-                f.write(mode.lower())
-        except OSError as e:
-            print("Failed to send mode to daemon:", e)
+        self.provider.mode = mode
+        set_mode(mode)
         self.update()
         self.update_visual()
 
@@ -90,11 +66,9 @@ class KeyboardBacklightWidget(Gtk.Box, WidgetTemplate):
         if self.modes[self.current_mode] != "Manual":
             self.current_mode = 0
             self.mode_button.set_label(f"Mode: {self.modes[self.current_mode]}")
-        try:
-            with open("/tmp/kb_backlight_mode", "w", encoding="utf-8") as f:
-                f.write("manual")
-        except OSError as e:
-            print("Failed to send mode to daemon:", e)
+        self.provider.brightness = value
+        self.provider.mode = self.modes[self.current_mode]
+        write_mode_file("manual")
         if self._debounce_id:
             GLib.source_remove(self._debounce_id)
         self._debounce_id = GLib.timeout_add(100, self._set_brightness, value)
@@ -103,11 +77,7 @@ class KeyboardBacklightWidget(Gtk.Box, WidgetTemplate):
 
     def _set_brightness(self, value):
         def worker():
-            try:
-                cmd = ["pkexec", "/usr/bin/ectool", "pwmsetkblight", str(value)]
-                subprocess.run(cmd, check=True, timeout=2)
-            except Exception as e:
-                print("Error setting backlight:", e)
+            call_hardware("kblight.set", {"value": value}, lambda: set_brightness(value))
             GLib.idle_add(self._clear_debounce)
         threading.Thread(target=worker, daemon=True).start()
         return False
@@ -115,19 +85,6 @@ class KeyboardBacklightWidget(Gtk.Box, WidgetTemplate):
     def _clear_debounce(self):
         self._debounce_id = None
 
-    def update(self):
-        # Set data for UI overlays, including keyboard LED overlay
-        
-        brightness = int(self.scale.get_value())
-        self.data = {
-            "brightness": brightness,
-            "mode": self.modes[self.current_mode],
-            "image_size": self.image_size,
-            "overlays": [
-                {"name": "keyboard_led", "path": "overlays/framework-keyboard-led-{overlay_id}.png", "color": (255, 255, 255, 255/100*brightness)}
-            ]
-        }
-
     def update_visual(self):
         # Update label with current brightness and mode
         
@@ -0,0 +1,234 @@
+'''LED Control Module
+This module sets the left, power and right LEDs through ectool.
+It has no GTK dependency so it can be shared by the widget and the command line tool.
+
+The EC can't report which colour an LED is showing, `ectool led <name> query` only
+lists the colours it supports. So the last value applied from the app or framework-ctl
+is recorded in led_state.json with the kernel boot ID, and read back at startup. After
+a reboot the LEDs are back under EC control and the recorded values are ignored.
+The supported colours are queried once, for all LEDs in one privileged shell, and kept in
+the same file.
+'''
+
+import json
+import os
+import subprocess
+import sys
+import threading
+
+from app.command_runner import run_query
+from app.helpers import get_data_dir, get_procfs_path
+from app.settings import get_settings, read_restored_values
+
+LED_NAMES = ("left", "power", "right")
+
+LED_COLORS = {
+    "red": (255, 0, 0, 255),
+    "amber": (255, 191, 0, 255),
+    "yellow": (255, 255, 0, 255),
+    "white": (255, 255, 255, 255),
+    "green": (0, 255, 0, 255),
+    "blue": (0, 0, 255, 255),
+}
+
+LED_MODES = ("auto", "off")
+
+LED_STATE_FILE = "led_state.json"
+BOOT_ID_PATH = get_procfs_path("sys", "kernel", "random", "boot_id")
+
+# Queries every LED given as an argument, each output preceded by a "== <name>" line
+LED_QUERY_SCRIPT = 'for led; do echo "== $led"; /usr/bin/ectool led "$led" query || exit 1; done'
+
+
+def get_led_colors(led_name):
+    '''Return the colour names supported by the given LED.'''
+    if led_name == "power":
+        return [c for c in LED_COLORS if c != "blue"]
+    return list(LED_COLORS)
+
+
+def validate_led(led_name, value):
+    '''Raise ValueError if led_name or value is not supported.'''
+    if led_name not in LED_NAMES:
+        raise ValueError(f"Unknown LED: {led_name} (expected one of {', '.join(LED_NAMES)})")
+    if value not in LED_MODES and value not in get_led_colors(led_name):
+        raise ValueError(f"Unsupported value for {led_name} LED: {value}")
+
+
+def set_led(led_name, value):
+    '''Set an LED to a colour, "auto" or "off". Returns True on success.'''
+    validate_led(led_name, value)
+    cmd = ["pkexec", "/usr/bin/ectool", "led", led_name, value]
+    if subprocess.run(cmd, check=False).returncode != 0:
+        return False
+    save_led_value(led_name, value)
+    get_settings().set(f"leds.{led_name}", value)
+    return True
+
+
+class LedCommandQueue:
+    '''Applies LED values on worker threads so the caller never waits for pkexec and ectool.
+    Only the latest value per LED is kept: while a command for an LED runs, newer requests
+    replace each other and the last one runs next, so each LED has at most one command in
+    flight. on_result(led_name, value, error) is called from the worker thread after each
+    command, error is None on success.'''
+
+    def __init__(self, on_result=None, apply=None):
+        self.on_result = on_result
+        self._apply = apply or set_led
+        self._lock = threading.Lock()
+        self._pending = {}  # LED name -> latest value not yet applied
+        self._running = set()  # LEDs with a worker thread
+        self._in_flight = {}  # LED name -> value being applied
+
+    def submit(self, led_name, value):
+        '''Queue a value for an LED. Raises ValueError for unsupported values right away.'''
+        validate_led(led_name, value)
+        with self._lock:
+            self._pending[led_name] = value
+            if led_name in self._running:
+                return
+            self._running.add(led_name)
+        threading.Thread(target=self._drain, args=(led_name,), daemon=True).start()
+
+    def is_idle(self, led_name=None):
+        '''True when no command is queued or running, for one LED or for all of them.'''
+        with self._lock:
+            if led_name is None:
+                return not self._running
+            return led_name not in self._pending and led_name not in self._in_flight
+
+    def _drain(self, led_name):
+        while True:
+            with self._lock:
+                if led_name not in self._pending:
+                    self._running.discard(led_name)
+                    return
+                value = self._pending.pop(led_name)
+                self._in_flight[led_name] = value
+            try:
+                error = None if self._apply(led_name, value) else f"Failed to set {led_name} LED to {value}"
+            except (OSError, ValueError) as e:
+                error = f"Failed to set {led_name} LED to {value}: {e}"
+            with self._lock:
+                del self._in_flight[led_name]
+            if self.on_result:
+                self.on_result(led_name, value, error)
+
+
+def get_boot_id():
+    try:
+        with open(BOOT_ID_PATH, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _state_path():
+    return os.path.join(get_data_dir(), LED_STATE_FILE)
+
+
+def _read_state_file():
+    try:
+        with open(_state_path(), "r", encoding="utf-8") as f:
+            state = json.load(f)
+        return state if isinstance(state, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_state_file(state):
+    path = _state_path()
+    try:
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(f"{path}.tmp", path)
+    except OSError as e:
+        print(f"Failed to save LED state: {e}", file=sys.stderr)
+
+
+def get_led_state_mtime():
+    '''Return the state file's modification time, to notice changes made by another process.'''
+    try:
+        return os.stat(_state_path()).st_mtime_ns
+    except OSError:
+        return None
+
+
+def load_led_values():
+    '''Return {led name: value} as last applied during this boot, "auto" for the others.
+    Before anything is set this boot, the values the restore service applied are used.'''
+    values = dict.fromkeys(LED_NAMES, "auto")
+    restored = read_restored_values()
+    for name in LED_NAMES:
+        if isinstance(restored.get(f"leds.{name}"), str):
+            values[name] = restored[f"leds.{name}"]
+    state = _read_state_file()
+    if state.get("boot_id") == get_boot_id() and isinstance(state.get("leds"), dict):
+        for name, value in state["leds"].items():
+            if name in values and isinstance(value, str):
+                values[name] = value
+    return values
+
+
+def save_led_value(led_name, value):
+    '''Record the value just applied to an LED.'''
+    state = _read_state_file()
+    boot_id = get_boot_id()
+    if state.get("boot_id") != boot_id or not isinstance(state.get("leds"), dict):
+        state["boot_id"], state["leds"] = boot_id, {}
+    state["leds"][led_name] = value
+    _write_state_file(state)
+
+
+def parse_led_query(output):
+    '''Return the colours with a non-zero brightness range from `ectool led <name> query`.'''
+    colors = []
+    for line in output.splitlines():
+        # "        red     : 0x64"
+        name, sep, value = line.partition(":")
+        name = name.strip().lower()
+        if not sep or name not in LED_COLORS:
+            continue
+        try:
+            if int(value.strip(), 0) > 0:
+                colors.append(name)
+        except ValueError:
+            continue
+    return colors
+
+
+def split_led_queries(output):
+    '''Return {led name: query output} from the output of LED_QUERY_SCRIPT.'''
+    sections, name = {}, None
+    for line in output.splitlines():
+        if line.startswith("== "):
+            name = line[3:].strip()
+            sections[name] = []
+        elif name is not None:
+            sections[name].append(line)
+    return {name: "\n".join(lines) for name, lines in sections.items()}
+
+
+def get_led_capabilities():
+    '''Return {led name: supported colours}. Read from the state file, or queried from the EC
+    once and saved there. All LEDs are queried in one shell, directly as root and through a
+    single pkexec otherwise. Returns None if the EC could not be queried.'''
+    state = _read_state_file()
+    saved = state.get("colors")
+    if isinstance(saved, dict) and all(isinstance(saved.get(name), list) for name in LED_NAMES):
+        return {name: saved[name] for name in LED_NAMES}
+    prefix = [] if os.geteuid() == 0 else ["pkexec"]
+    try:
+        result = run_query(prefix + ["/bin/sh", "-c", LED_QUERY_SCRIPT, "sh", *LED_NAMES], check=True)
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"Error querying LEDs: {e}", file=sys.stderr)
+        return None
+    outputs = split_led_queries(result.stdout)
+    colors = {name: parse_led_query(outputs.get(name, "")) for name in LED_NAMES}
+    if not all(colors.values()):
+        return None
+    state = _read_state_file()
+    state["colors"] = colors
+    _write_state_file(state)
+    return colors
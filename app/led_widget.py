@@ -1,21 +1,29 @@
 '''LED Control Widget Module
 This module defines a widget for controlling the left, power, and right LEDs on the Framework Laptop.
+The overlays for the laptop image come from LedProvider, which the widget keeps in sync.
+The buttons start from the LED values recorded by LedProvider and follow changes made elsewhere.
 '''
 
-import subprocess
-from gi.repository import Gtk
+from gi.repository import Gtk, GLib
 from app.widget import WidgetTemplate
+from app.led_control import LED_NAMES, LedCommandQueue, get_led_colors, set_led
+from app.providers import LedProvider
+from app.service_client import call_hardware
 
 class LedWidget(Gtk.Box, WidgetTemplate):
     '''A widget for controlling the left, power, and right LEDs.'''
 
     def __init__(self, model=None):
         Gtk.Box.__init__(self, orientation=Gtk.Orientation.VERTICAL, spacing=10)
-        WidgetTemplate.__init__(self)
+        WidgetTemplate.__init__(self, LedProvider())
         self.model = model
+        # ectool runs on worker threads, results come back through GLib.idle_add
+        self.led_queue = LedCommandQueue(on_result=lambda *result: GLib.idle_add(self._on_led_result, *result),
+                                         apply=self._apply_led)
 
         self.leds = {}
-        led_names = ["Left", "Power", "Right"]
+        # The LEDs this model has, from the model registry
+        led_names = [name.capitalize() for name in (getattr(model, 'leds', None) or LED_NAMES)]
         for led_name in led_names:
             led_frame = Gtk.Frame(label=f"{led_name} LED")
             led_vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=5)
@@ -39,8 +47,8 @@ class LedWidget(Gtk.Box, WidgetTemplate):
                 ("Green", "green"),
                 ("Blue", "blue")
             ]
-            if led_name.lower() == "power":
-                color_names = [c for c in color_names if c[1] != "blue"]
+            supported = get_led_colors(led_name.lower())
+            color_names = [c for c in color_names if c[1] in supported]
             color_grid = Gtk.Grid()
             color_grid.set_row_spacing(2)
             color_grid.set_column_spacing(2)
@@ -62,6 +70,14 @@ class LedWidget(Gtk.Box, WidgetTemplate):
             }
             self.add(led_frame)
 
+        self.error_label = Gtk.Label()
+        self.error_label.set_no_show_all(True)
+        self.add(self.error_label)
+
+        # Show the values last applied during this boot instead of assuming Auto
+        self._synced_state = {}
+        self._apply_provider_state(self.provider.get_states())
+
     def _on_mode_btn_clicked(self, btn, led_name):
         mode_labels = btn.mode_labels
         btn.current_mode = (btn.current_mode + 1) % len(mode_labels)
@@ -100,64 +116,60 @@ class LedWidget(Gtk.Box, WidgetTemplate):
                 btn.get_style_context().remove_class("suggested-action")
 
     def _run_led_command(self, led_name, value):
-        # Map mode/color to ectool command
-        cmd = ["pkexec", "/usr/bin/ectool", "led", led_name, value]
-        subprocess.run(cmd, check=False)
-
-    def update(self):
-        '''Update method called by ui.py'''
-
-        # Set self.data with overlays for the UI
-        overlays = self.get_overlays()
-        if overlays:
-            self.data = {
-                "overlays": overlays
-            }
-        else:
-            self.data = None
+        led = self.leds[led_name]
+        self.provider.set_state(led_name, led["current_mode"], led["current_color"])
+        # Map mode/color to ectool command. Rapid clicks only keep the latest value per LED.
+        self.led_queue.submit(led_name, value)
+
+    @staticmethod
+    def _apply_led(led_name, value):
+        # Through the service when it runs, otherwise ectool through pkexec
+        return call_hardware("led.set", {"name": led_name, "value": value}, lambda: set_led(led_name, value))
+
+    def _on_led_result(self, led_name, value, error):
+        if error is None:
+            self.error_label.hide()
+            return False
+        print(error)
+        self.error_label.set_text(error)
+        self.error_label.show()
+        # Go back to what was last applied successfully, unless a newer value is still queued
+        if not self.led_queue.is_idle(led_name):
+            return False
+        self.provider.resync(force=True)
+        states = self.provider.get_states()
+        # The buttons show the failed value even if the provider's state did not change
+        # since the last sync, so show this LED's state unconditionally
+        if led_name in states:
+            self._show_state(led_name, *states[led_name])
+        self._apply_provider_state(states)
+        return False
+
+    def _apply_provider_state(self, state):
+        '''Show the LED states that changed in the provider since the last call.
+        Unchanged entries are skipped, so a snapshot taken just before a click doesn't undo it.'''
+        for led_name, (mode, color) in state.items():
+            if led_name in self.leds and self._synced_state.get(led_name) != (mode, color):
+                self._show_state(led_name, mode, color)
+        self._synced_state = dict(state)
+
+    def _show_state(self, led_name, mode, color):
+        led = self.leds[led_name]
+        mode_btn = led["mode_btn"]
+        mode_btn.current_mode = [label.lower() for label in mode_btn.mode_labels].index(mode)
+        label = mode_btn.mode_labels[mode_btn.current_mode]
+        mode_btn.set_label(label)
+        led["current_mode"] = label
+        led["current_color"] = color
+        self._set_selected_color_btn(led_name, color if mode == "on" else None)
 
     def update_visual(self):
         '''Update the visual representation of the widget called by ui.py'''
-        return
-
-    def get_overlay(self, led_name):
-        '''Return overlay dict for the given LED, or None if off.'''
-
-        # Map led_name to overlay image filename
-        overlay_map = {
-            "left": "overlays/framework-left-led-{overlay_id}.png",
-            "power": "overlays/framework-power-led-{overlay_id}.png",
-            "right": "overlays/framework-right-led-{overlay_id}.png"
-        }
-        color_map = {
-            "red": (255, 0, 0, 255),
-            "amber": (255, 191, 0, 255),
-            "yellow": (255, 255, 0, 255),
-            "white": (255, 255, 255, 255),
-            "green": (0, 255, 0, 255),
-            "blue": (0, 0, 255, 255),
-            "auto": (0, 0, 0, 0),
-            "off": (0, 0, 0, 0)
-        }
-        led = self.leds.get(led_name)
-        if not led:
-            return None
-        color = led["current_color"].lower()
-        state = led["current_mode"].lower()
-        if state in ("off", "auto"):
-            return None
-        img_name = overlay_map.get(led_name)
-        color_rgba = color_map.get(color, (255, 255, 255, 255))
-        if img_name and color != "off":
-            return {"name": led_name, "path": img_name, "color": color_rgba}
-        return None
-
-    def get_overlays(self):
-        '''Return a list of overlays for all LEDs.'''
-
-        overlays = []
-        for led_name in self.leds:
-            overlay = self.get_overlay(led_name)
-            if overlay:
-                overlays.append(overlay)
-        return overlays
\ No newline at end of file
+        if not self.data:
+            return
+        self._apply_provider_state(self.data['state'])
+        # Colours the EC reports as unsupported can't be chosen
+        for led_name, colors in self.data['colors'].items():
+            if led_name in self.leds:
+                for value, btn in self.leds[led_name]["color_btns"].items():
+                    btn.set_sensitive(value in colors)
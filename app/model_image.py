@@ -3,14 +3,16 @@ gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk
 from app.image_utils import load_scaled_image, colorize_image
 from app.helpers import get_asset_path
+from app.tracing import traced
 
 class ModelImage(Gtk.Box):
     '''Widget to display the laptop model image.'''
-    def __init__(self, image_name, image_size=320, overlays=None, overlay_id=13):
+    def __init__(self, image_name, image_size=320, overlays=None, overlay_id=13, overlay_opacity=None):
         """
         overlays: list of dicts, each dict has keys:
             'name': image name (str)
             'color': optional color filter (tuple or str)
+        overlay_opacity: optional {overlay name: opacity}, see set_overlay_opacity
         """
         super().__init__(orientation=Gtk.Orientation.VERTICAL)
         self.set_halign(Gtk.Align.CENTER)
@@ -18,18 +20,29 @@ class ModelImage(Gtk.Box):
         self.image_size = image_size
         self.overlays = overlays or []
         self.overlay_id = overlay_id
+        self.overlay_opacity = dict(overlay_opacity or {})
+        self._overlay_widgets = {}  # overlay name -> image widget
+        self._scale = None  # Scale factor the images were rendered at
+        self.connect("notify::scale-factor", self._on_scale_factor_changed)
         self._build_ui()
 
+    def _on_scale_factor_changed(self, _widget, _pspec):
+        # E.g. the window moved to a monitor with a different scale, render at the new resolution
+        if self.get_scale_factor() != self._scale:
+            self._build_ui()
+
+    @traced("ModelImage._build_ui")
     def _build_ui(self):
         for child in self.get_children():
             self.remove(child)
+        self._scale = scale = self.get_scale_factor()
         overlay = Gtk.Overlay()
         overlay.set_halign(Gtk.Align.CENTER)
         overlay.set_valign(Gtk.Align.CENTER)
         # Add base image
         if self.image_name:
             image_path = get_asset_path(self.image_name)
-            base_img_widget = load_scaled_image(image_path, self.image_size)
+            base_img_widget = load_scaled_image(image_path, self.image_size, scale)
             if base_img_widget:
                 overlay.add(base_img_widget)
             else:
@@ -37,6 +50,7 @@ class ModelImage(Gtk.Box):
         else:
             overlay.add(Gtk.Label(label="[No Image]"))
         # Add overlays with optional color filter
+        self._overlay_widgets = {}
         for overlay_info in self.overlays:
             # "overlays": [{"name": "left-led", "path": "overlays/framework-left-led-{overlay_id}.png", "color": None}]
 
@@ -48,10 +62,22 @@ class ModelImage(Gtk.Box):
                 overlay_path = overlay_path.format(overlay_id=self.overlay_id)
             overlay_path = get_asset_path(overlay_path)
             if color:
-                overlay_img_widget = colorize_image(overlay_path, self.image_size, color)
+                overlay_img_widget = colorize_image(overlay_path, self.image_size, color, scale)
             else:
-                overlay_img_widget = load_scaled_image(overlay_path, self.image_size)
+                overlay_img_widget = load_scaled_image(overlay_path, self.image_size, scale)
             if overlay_img_widget:
+                if overlay_name in self.overlay_opacity:
+                    overlay_img_widget.set_opacity(self.overlay_opacity[overlay_name])
+                self._overlay_widgets[overlay_name] = overlay_img_widget
                 overlay.add_overlay(overlay_img_widget)
         self.add(overlay)
+        overlay.show_all()
         self.show()
+
+    def set_overlay_opacity(self, name, opacity):
+        '''Fade one overlay, e.g. the screen with the display brightness. Only the opacity of
+        its layer changes, the image is not loaded or tinted again.'''
+        self.overlay_opacity[name] = opacity
+        widget = self._overlay_widgets.get(name)
+        if widget is not None:
+            widget.set_opacity(opacity)
@@ -0,0 +1,358 @@
+'''Hardware Notifications Module
+Desktop notifications for hardware events: battery status changes, low battery,
+expansion card and other USB hotplug, and power profile switches.
+
+HardwareEventWatcher polls the same sources as the widgets (sysfs, tuned or
+power-profiles-daemon) and returns the changes since the last poll. NotificationService
+polls only the battery's sysfs files: it follows USB devices through kernel uevents and
+power profile switches through the power-profiles-daemon and tuned D-Bus signals, and
+falls back to polling them when those are unavailable. Events are collected
+for BATCH_WINDOW seconds from the first one, so a burst becomes one notification. Events
+for the same thing are merged, and a device that is unplugged and plugged back in within
+the window (or a charger that flaps) cancels out. Notifications are sent to
+org.freedesktop.Notifications with asynchronous Gio D-Bus calls, so the watcher needs a
+GLib main loop but not GTK: `framework-ctl monitor` runs it without the window.
+'''
+
+import os
+import sys
+import time
+
+from app.helpers import get_sysfs_path
+from app.power_supply import discover_power_supplies, get_battery
+from app.usb_pd import UeventMonitor
+
+APP_NAME = "Framework Control"
+POLL_INTERVAL = 2  # seconds
+PROFILE_POLL_INTERVAL = 30  # seconds, when the profile backends' signals are unavailable
+BATCH_WINDOW = 3  # seconds from the first event to the notification
+LOW_BATTERY_LEVELS = (20, 10, 5)  # percent, notified once each while discharging
+CRITICAL_LEVEL = 5
+USB_DEVICES = get_sysfs_path("bus", "usb", "devices")
+USB_HUB_CLASS = "09"
+
+URGENCY_LOW, URGENCY_NORMAL, URGENCY_CRITICAL = 0, 1, 2
+
+
+class HardwareEvent:
+    '''A change of one thing (key) from previous to state, with the text to show for it.'''
+
+    __slots__ = ("key", "previous", "state", "summary", "body", "urgency")
+
+    def __init__(self, key, previous, state, summary, body="", urgency=URGENCY_NORMAL):
+        self.key = key
+        self.previous = previous
+        self.state = state
+        self.summary = summary
+        self.body = body
+        self.urgency = urgency
+
+    def __repr__(self):
+        return f"HardwareEvent({self.key!r}, {self.previous!r} -> {self.state!r})"
+
+
+class EventBatcher:
+    '''Collects events for one notification window. Only the latest event per key is
+    kept, and keys that end the window in the state they started in are dropped.'''
+
+    def __init__(self):
+        self._pending = {}  # key -> (state before the window, latest event)
+
+    def __bool__(self):
+        return bool(self._pending)
+
+    def add(self, event):
+        start = self._pending[event.key][0] if event.key in self._pending else event.previous
+        self._pending[event.key] = (start, event)
+
+    def take(self):
+        '''Return the events of the window that still change something, and start a new window.'''
+        events = [event for start, event in self._pending.values() if event.state != start]
+        self._pending = {}
+        return events
+
+
+def build_notification(events):
+    '''Return (summary, body, urgency) for one window of events, or None if there are none.'''
+    if not events:
+        return None
+    urgency = max(event.urgency for event in events)
+    if len(events) == 1:
+        return events[0].summary, events[0].body, urgency
+    return f"{len(events)} hardware events", "\n".join(event.summary for event in events), urgency
+
+
+def _read(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def scan_usb_devices(root=USB_DEVICES):
+    '''Return {port path: product name} for the USB devices other than hubs.'''
+    devices = {}
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return devices
+    for name in names:
+        # Devices are "<bus>-<port>[.<port>...]", interfaces contain ":" and root hubs are "usbN"
+        if ":" in name or name.startswith("usb"):
+            continue
+        path = os.path.join(root, name)
+        if _read(os.path.join(path, "bDeviceClass")) == USB_HUB_CLASS:
+            continue
+        vendor = _read(os.path.join(path, "idVendor"))
+        if vendor is None:
+            continue
+        devices[name] = (_read(os.path.join(path, "product"))
+                         or f"USB device {vendor}:{_read(os.path.join(path, 'idProduct'))}")
+    return devices
+
+
+class HardwareEventWatcher:
+    '''Polls battery, USB devices and the power profile and returns what changed.
+    The first poll only records the current state. Set poll_usb or poll_profile to False
+    when usb_changed and profile_changed report those instead.'''
+
+    def __init__(self, profiles=None):
+        self.profiles = profiles  # PowerProfiles, created on first use
+        self.poll_usb = True
+        self.poll_profile = True
+        self._battery = None  # (status, percentage)
+        self._usb = None
+        self._profile = None
+        self._profile_polled = None  # time.monotonic() of the last profile read
+        self._started = False
+
+    def poll(self):
+        '''Return a list of HardwareEvents since the last poll.'''
+        events = []
+        self._poll_battery(events)
+        if self.poll_usb or not self._started:
+            self._poll_usb(events)
+        if self.poll_profile or not self._started:
+            self._poll_profile(events)
+        if not self._started:
+            self._started = True
+            return []
+        return events
+
+    def usb_changed(self):
+        '''Return the HardwareEvents after a USB uevent.'''
+        events = []
+        self._poll_usb(events)
+        return events
+
+    def profile_changed(self, current):
+        '''Return the HardwareEvents for a profile switch reported by the backend.'''
+        events = []
+        self._profile_event(events, current)
+        return events
+
+    def _poll_battery(self, events):
+        battery = get_battery()
+        if battery is None:
+            return
+        stats = battery.stats()
+        status, percentage = stats["status"], stats["percentage"]
+        if self._battery is not None:
+            old_status, old_percentage = self._battery
+            if status != old_status and status is not None:
+                events.append(HardwareEvent("battery.status", old_status, status, f"Battery {status.lower()}",
+                                            f"Battery at {percentage}%" if percentage is not None else "",
+                                            URGENCY_LOW))
+            if status == "Discharging" and percentage is not None and old_percentage is not None:
+                for level in LOW_BATTERY_LEVELS:
+                    if percentage <= level < old_percentage:
+                        urgency = URGENCY_CRITICAL if level <= CRITICAL_LEVEL else URGENCY_NORMAL
+                        events.append(HardwareEvent("battery.low", None, level, f"Battery low: {percentage}%",
+                                                    "Connect the charger", urgency))
+                        break
+        self._battery = (status, percentage)
+
+    def _poll_usb(self, events):
+        devices = scan_usb_devices()
+        if self._usb is not None and devices != self._usb:
+            # Power supplies such as USB-PD chargers come and go with the devices
+            discover_power_supplies(refresh=True)
+            for port in devices.keys() - self._usb.keys():
+                events.append(HardwareEvent(f"usb.{port}", None, devices[port], f"{devices[port]} connected",
+                                            f"Port {port}", URGENCY_LOW))
+            for port in self._usb.keys() - devices.keys():
+                events.append(HardwareEvent(f"usb.{port}", self._usb[port], None, f"{self._usb[port]} disconnected",
+                                            f"Port {port}", URGENCY_LOW))
+        self._usb = devices
+
+    def _poll_profile(self, events):
+        # Reading tuned's profile runs tuned-adm, don't do it on every poll
+        now = time.monotonic()
+        if self._profile_polled is not None and now - self._profile_polled < PROFILE_POLL_INTERVAL:
+            return
+        self._profile_polled = now
+        if self.profiles is None:
+            # Imported here because backend detection talks to systemd
+            from app.power_profiles import PowerProfiles
+            self.profiles = PowerProfiles()
+        _available, current = self.profiles.get_profiles()
+        self._profile_event(events, current)
+
+    def _profile_event(self, events, current):
+        if current is None:
+            return
+        if self._profile is not None and current != self._profile:
+            name = self.profiles.profile_map.get(current, current)
+            events.append(HardwareEvent("power_profile", self._profile, current, f"Power profile: {name}",
+                                        urgency=URGENCY_LOW))
+        self._profile = current
+
+
+class DBusNotifier:
+    '''Sends notifications to org.freedesktop.Notifications without blocking. The session
+    bus is connected asynchronously on first use; notifications sent before it is ready
+    are queued.'''
+
+    def __init__(self, app_name=APP_NAME, icon="battery"):
+        self.app_name = app_name
+        self.icon = icon
+        self._bus = None
+        self._connecting = False
+        self._queue = []
+
+    def send(self, summary, body="", urgency=URGENCY_NORMAL):
+        from gi.repository import Gio
+        if self._bus is None:
+            self._queue.append((summary, body, urgency))
+            if not self._connecting:
+                self._connecting = True
+                Gio.bus_get(Gio.BusType.SESSION, None, self._on_bus)
+            return
+        self._notify(summary, body, urgency)
+
+    def _on_bus(self, _source, result):
+        from gi.repository import Gio, GLib
+        self._connecting = False
+        try:
+            self._bus = Gio.bus_get_finish(result)
+        except GLib.Error as e:
+            print(f"Notifications unavailable: {e.message}", file=sys.stderr)
+            self._queue.clear()
+            return
+        queued, self._queue = self._queue, []
+        for summary, body, urgency in queued:
+            self._notify(summary, body, urgency)
+
+    def _notify(self, summary, body, urgency):
+        from gi.repository import Gio, GLib
+        params = GLib.Variant("(susssasa{sv}i)", (
+            self.app_name, 0, self.icon, summary, body, [],
+            {"urgency": GLib.Variant("y", urgency)}, -1))
+        self._bus.call("org.freedesktop.Notifications", "/org/freedesktop/Notifications",
+                       "org.freedesktop.Notifications", "Notify", params, GLib.VariantType("(u)"),
+                       Gio.DBusCallFlags.NONE, -1, None, self._on_sent)
+
+    def _on_sent(self, bus, result):
+        from gi.repository import GLib
+        try:
+            bus.call_finish(result)
+        except GLib.Error as e:
+            print(f"Failed to send notification: {e.message}", file=sys.stderr)
+
+
+class NotificationService:
+    '''Runs a HardwareEventWatcher on the GLib main loop and sends one notification per
+    batch window. Works with or without a GTK window.'''
+
+    def __init__(self, watcher=None, notifier=None, poll_interval=POLL_INTERVAL, window=BATCH_WINDOW):
+        self.watcher = watcher or HardwareEventWatcher()
+        self.notifier = notifier or DBusNotifier()
+        self.poll_interval = poll_interval
+        self.window = window
+        self.batcher = EventBatcher()
+        self._poll_id = None
+        self._flush_id = None
+        self._bus = None
+        self._subscriptions = []
+        self._usb_monitor = None
+
+    def start(self):
+        from gi.repository import GLib
+        self.watcher.poll()  # Record the starting state
+        self.watcher.poll_profile = not self._subscribe_profiles()
+        monitor = UeventMonitor(subsystems=("usb",))
+        monitor.add_listener(self._on_usb_uevent)
+        if monitor.start():
+            self._usb_monitor = monitor
+            self.watcher.poll_usb = False
+        self._poll_id = GLib.timeout_add_seconds(self.poll_interval, self._on_poll)
+
+    def stop(self):
+        from gi.repository import GLib
+        for source in (self._poll_id, self._flush_id):
+            if source is not None:
+                GLib.source_remove(source)
+        self._poll_id = self._flush_id = None
+        for subscription in self._subscriptions:
+            self._bus.signal_unsubscribe(subscription)
+        self._subscriptions = []
+        if self._usb_monitor is not None:
+            self._usb_monitor.remove_listener(self._on_usb_uevent)
+            self._usb_monitor = None
+
+    def _subscribe_profiles(self):
+        '''Follow profile switches through the power-profiles-daemon and tuned signals.
+        Returns False if the system bus is unavailable.'''
+        from gi.repository import Gio, GLib
+        try:
+            self._bus = Gio.bus_get_sync(Gio.BusType.SYSTEM, None)
+        except GLib.Error as e:
+            print(f"System bus unavailable, polling the power profile: {e.message}", file=sys.stderr)
+            return False
+        self._subscriptions = [
+            self._bus.signal_subscribe("net.hadess.PowerProfiles", "org.freedesktop.DBus.Properties",
+                                       "PropertiesChanged", "/net/hadess/PowerProfiles", None,
+                                       Gio.DBusSignalFlags.NONE, self._on_ppd_changed),
+            self._bus.signal_subscribe("com.redhat.tuned", "com.redhat.tuned.control", "profile_changed",
+                                       "/Tuned", None, Gio.DBusSignalFlags.NONE, self._on_tuned_changed),
+        ]
+        return True
+
+    def _on_ppd_changed(self, _bus, _sender, _path, _interface, _signal, params):
+        _name, changed, _invalidated = params.unpack()
+        if "ActiveProfile" in changed:
+            self._add_events(self.watcher.profile_changed(changed["ActiveProfile"]))
+
+    def _on_tuned_changed(self, _bus, _sender, _path, _interface, _signal, params):
+        from app.power_profiles import tuned_profile_name
+        profile, ok, _message = params.unpack()
+        if ok:
+            self._add_events(self.watcher.profile_changed(tuned_profile_name(profile)))
+
+    def _on_usb_uevent(self):
+        # Called from the monitor's thread
+        from gi.repository import GLib
+        GLib.idle_add(self._on_usb_changed)
+
+    def _on_usb_changed(self):
+        self._add_events(self.watcher.usb_changed())
+        return False
+
+    def _on_poll(self):
+        self._add_events(self.watcher.poll())
+        return True
+
+    def _add_events(self, events):
+        from gi.repository import GLib
+        for event in events:
+            self.batcher.add(event)
+        if self.batcher and self._flush_id is None:
+            self._flush_id = GLib.timeout_add_seconds(self.window, self._on_flush)
+
+    def _on_flush(self):
+        self._flush_id = None
+        notification = build_notification(self.batcher.take())
+        if notification is not None:
+            self.notifier.send(*notification)
+        return False
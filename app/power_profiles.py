@@ -0,0 +1,196 @@
+'''Power Profiles Module
+This module reads and switches power profiles through power-profiles-daemon (D-Bus) or tuned,
+and reads and sets the system sleep mode. It has no GTK dependency.
+'''
+
+import subprocess
+
+from app.command_runner import invalidate, run_query
+from app.helpers import get_sysfs_path
+from app.settings import get_settings
+
+ALLOWED_PROFILES = {
+    "powersave": "Powersave",
+    "balanced-battery": "Balanced",
+    "throughput-performance": "Performance"
+}
+
+SLEEP_MODES = ['s2idle', 'deep']
+
+
+def tuned_profile_name(name):
+    '''Return the app's name for a profile reported by tuned.'''
+    return "balanced-battery" if name == "balanced" else name
+
+
+class PowerProfiles:
+    '''Access to the active power profile backend ('ppd' or 'tuned').'''
+
+    def __init__(self):
+        self.backend = None
+        self.proxy = None
+        self.profile_map = {}  # name -> display string
+        self.error = None  # Message describing the last failure, for display
+        self.detect_backend()
+
+    def detect_backend(self):
+        '''Figures out which backend to use for power profiles.'''
+        print("[PowerProfilesController] Checking for power-profiles-daemon...")
+        # Try power-profiles-daemon first
+        try:
+            # pydbus pulls in GLib, only import it when we may need it
+            from pydbus import SystemBus # type: ignore
+        except ImportError:
+            SystemBus = None
+        if SystemBus is not None:
+            try:
+                result = run_query([
+                    'systemctl', 'is-active', '--quiet', 'power-profiles-daemon.service'
+                ])
+                if result.returncode == 0:
+                    self.backend = 'ppd'
+                    self.proxy = SystemBus().get(
+                        'net.hadess.PowerProfiles',
+                        '/net/hadess/PowerProfiles'
+                    )
+                    return
+            except (subprocess.TimeoutExpired, OSError) as e:
+                print(f"[PowerProfilesController] Could not check power-profiles-daemon status: {e}")
+                self.error = f"Could not check power-profiles-daemon status: {e}"
+                return
+        # Try tuned
+        try:
+            result = run_query([
+                'systemctl', 'is-active', '--quiet', 'tuned.service'
+            ])
+            if result.returncode == 0:
+                self.backend = 'tuned'
+                return
+        except (subprocess.TimeoutExpired, OSError) as e:
+            print(f"[PowerProfilesController] Could not check tuned status: {e}")
+            self.error = f"Could not check tuned status: {e}"
+            return
+        print("[PowerProfilesController] No supported power profile backend found (power-profiles-daemon or tuned)")
+        self.error = "No supported power profile backend found (power-profiles-daemon or tuned)"
+
+    def get_profiles(self):
+        '''Return (profiles, current_profile). On failure self.error is set.'''
+        profiles = []
+        current_profile = None
+        self.error = None
+
+        if self.backend == 'ppd':
+            if not self.proxy:
+                return [], None
+            try:
+                current = self.proxy.Get('net.hadess.PowerProfiles', 'ActiveProfile')
+                available = self.proxy.Get('net.hadess.PowerProfiles', 'Profiles')
+                profiles = [profile[0] for profile in available]
+                self.profile_map = {name: name for name in profiles}
+                current_profile = current
+            except (AttributeError, OSError) as e:
+                print(f"[PowerProfilesController] Failed to get power profile info: {e}")
+                self.error = "PowerProfiles error: Could not read profile info. Is power-profiles-daemon running?"
+        elif self.backend == 'tuned':
+            try:
+                # Get current profile
+                result = run_query(['tuned-adm', 'active'])
+                current = None
+                if result.returncode == 0:
+                    for line in result.stdout.splitlines():
+                        if 'Current active profile:' in line:
+                            current = tuned_profile_name(line.split(':', 1)[1].strip())
+                # Get available profiles
+                result = run_query(['tuned-adm', 'list'])
+                profile_map = {}  # name -> display string
+                current_from_list = None
+                for line in result.stdout.splitlines():
+                    if line.startswith('- ') or line.startswith('* '):
+                        prof_line = line[2:].strip()
+                        # Split on first space or dash for name/desc
+                        if ' - ' in prof_line:
+                            name, _ = prof_line.split(' - ', 1)
+                            name = name.strip()
+                        else:
+                            name = prof_line.split()[0]
+                        if name in ALLOWED_PROFILES:
+                            profiles.append(name)
+                            profile_map[name] = ALLOWED_PROFILES[name]
+                            if line.startswith('* '):
+                                current_from_list = name
+                current_profile = current_from_list if current_from_list else current
+                self.profile_map = profile_map
+            except (subprocess.TimeoutExpired, OSError) as e:
+                print(f"[PowerProfilesController] Failed to get tuned profile info: {e}")
+                self.error = "Tuned error: Could not read profile info."
+        else:
+            self.error = "No supported power profile backend found (power-profiles-daemon or tuned)"
+
+        return profiles, current_profile
+
+    def set_profile(self, profile):
+        '''Switch to profile. Returns None on success or an error message.'''
+        if self.backend == 'ppd':
+            if not self.proxy:
+                return "power-profiles-daemon is not available."
+            try:
+                self.proxy.Set('net.hadess.PowerProfiles', 'ActiveProfile', profile)
+            except (AttributeError, OSError) as e:
+                print(f"[PowerProfilesController] Failed to set power profile: {e}")
+                return "Failed to set profile. Do you have permission?"
+        elif self.backend == 'tuned':
+            try:
+                result = subprocess.run(['tuned-adm', 'profile', profile], capture_output=True, text=True, check=False)
+                invalidate('tuned-adm')
+                if result.returncode != 0:
+                    err = result.stderr.strip() or result.stdout.strip()
+                    if 'does not exist' in err:
+                        return f"Requested profile does not exist: {profile}"
+                    return f"Failed to set tuned profile: {err}"
+            except (subprocess.CalledProcessError, OSError) as e:
+                print(f"[PowerProfilesController] Failed to set tuned profile: {e}")
+                return "Failed to set tuned profile."
+        else:
+            return "No supported power profile backend found (power-profiles-daemon or tuned)"
+        get_settings().set("power_profile", profile)
+        return None
+
+
+def get_available_sleep_modes():
+    '''Get available sleep modes from the system'''
+
+    # Example: return a list of supported sleep modes
+    # This could be customized for your system
+    return list(SLEEP_MODES)
+
+
+def get_current_sleep_mode(sleep_modes=SLEEP_MODES):
+    '''Get the current sleep mode from the system'''
+
+    try:
+        with open(get_sysfs_path('power', 'mem_sleep'), 'r', encoding='utf-8') as f:
+            modes = f.read().strip()
+        # The current mode is wrapped in brackets, e.g. "s2idle [deep]"
+        for mode in sleep_modes:
+            if f'[{mode}]' in modes:
+                return mode
+        return None
+    except OSError:
+        return None
+
+
+def set_sleep_mode(mode, sleep_modes=SLEEP_MODES):
+    '''Set the sleep mode on the system'''
+
+    if mode not in sleep_modes:
+        raise ValueError(f"Invalid sleep mode: {mode}")
+    try:
+        # Use pkexec to echo the mode into the file with root privileges
+        cmd = [
+            'pkexec', 'sh', '-c', f'echo {mode} > /sys/power/mem_sleep'
+        ]
+        subprocess.run(cmd, capture_output=True, text=True, check=True)
+        get_settings().set("sleep_mode", mode)
+        return True
+    except Exception:
+        return False
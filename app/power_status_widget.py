@@ -3,41 +3,49 @@ This module defines a widget for displaying battery status and health.
 It inherits from Gtk.Box and implements the WidgetTemplate interface.
 '''
 
-import os
-from PIL import Image, ImageDraw, ImageFont
+import threading
 from gi.repository import Gtk, GLib
 from app.widget import WidgetTemplate
+from app.charge_limit import MIN_LIMIT, MAX_LIMIT, get_charge_limit, set_charge_limit
+from app.history import time_remaining_series
+from app.history_graph import HistoryGraph
+from app.providers import BatteryProvider
+from app.service_client import call_hardware, query_hardware
 
 class PowerStatusWidget(Gtk.Box, WidgetTemplate):
     '''A widget to display battery status and health.'''
 
-    def __init__(self, battery_name='BAT1'):
+    def __init__(self, battery_name=None, history=None):
+        '''battery_name: a power_supply name such as BAT0, or None for the first battery found.'''
         Gtk.Box.__init__(self, orientation=Gtk.Orientation.VERTICAL, spacing=10)
-        WidgetTemplate.__init__(self)
-        self.battery_name = battery_name
+        WidgetTemplate.__init__(self, BatteryProvider(battery_name, history))
         self.label = Gtk.Label(label="Power Status")
         Gtk.Box.pack_start(self, self.label, True, True, 0)
-        self.data = None
-        
-
-
-    def update(self):
-        '''Update method called by ui.py'''
-        stats = self.get_battery_stats()
-        
-        overlays = []
 
-        # Draw lightning bolt icon if charging
-        status = stats['status'] if stats['status'] is not None else 'Unknown'
-        if status.lower() == 'charging':
-            overlays.append({"name": "charging_icon", "path": "overlays/framework-charging-{overlay_id}.png", "color": (0, 255, 0, 255)})
+        # Graphs of the last hour from the history store
+        self.graphs = []
+        if history is not None:
+            self.graphs = [
+                HistoryGraph(lambda start, end: history.series('power_now', start, end), "Power draw", "W", color=(0.9, 0.4, 0.1)),
+                HistoryGraph(lambda start, end: history.series('capacity', start, end), "Charge", "%", color=(0.2, 0.7, 0.3), y_range=(0, 100)),
+                HistoryGraph(lambda start, end: time_remaining_series(history, start, end), "Time remaining", "h", color=(0.2, 0.5, 0.9), y_range=(0, 12)),
+            ]
+        for graph in self.graphs:
+            Gtk.Box.pack_start(self, graph, False, False, 0)
 
-        self.data = {
-            "percentage": stats['percentage'],
-            "status": stats['status'],
-            "health": stats['health'],
-            "overlays": overlays
-        }
+        # Charge limit control
+        limit_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=10)
+        self.limit_label = Gtk.Label(label="Charge limit: ...")
+        limit_box.pack_start(self.limit_label, False, False, 0)
+        self.limit_spin = Gtk.SpinButton.new_with_range(MIN_LIMIT, MAX_LIMIT, 5)
+        self.limit_spin.set_value(MAX_LIMIT)
+        limit_box.pack_start(self.limit_spin, False, False, 0)
+        self.limit_button = Gtk.Button(label="Set limit")
+        self.limit_button.connect("clicked", self.on_set_limit_clicked)
+        limit_box.pack_start(self.limit_button, False, False, 0)
+        Gtk.Box.pack_start(self, limit_box, False, False, 0)
+        # The saved limit is re-applied at boot by framework-app-restore.service
+        self._run_limit_worker()
 
     def update_visual(self):
         '''Update the visual representation of the widget called by ui.py'''
@@ -50,38 +58,43 @@ class PowerStatusWidget(Gtk.Box, WidgetTemplate):
             self.label.set_text(text)
         else:
             self.label.set_text("Power Status\nNo data yet.")
+        # Without a sysfs threshold the service's snapshot has no limit, keep the one read for the widget
+        limit = self.data['charge_limit'] if self.data else None
+        self._show_charge_limit(limit if limit is not None else self.provider.charge_limit)
+        for graph in self.graphs:
+            graph.push()
 
+    def on_set_limit_clicked(self, _button):
+        '''Apply the limit from the spin button without blocking the UI.'''
+        limit = int(self.limit_spin.get_value())
+        self.limit_button.set_sensitive(False)
+        self.limit_label.set_text("Charge limit: setting...")
 
-    def get_battery_stats(self):
-        '''Returns a dictionary with battery stats: percentage, status, and health.'''
-
-        battery_name = self.battery_name
-
-        percent = read_file(get_power_path('capacity', battery_name))
-        status = read_file(get_power_path('status', battery_name))
-        charge_full = read_file(get_power_path('charge_full', battery_name))
-        charge_full_design = read_file(get_power_path('charge_full_design', battery_name))
-        health = None
-        if charge_full and charge_full_design:
-            try:
-                health = int(charge_full) * 100 // int(charge_full_design)
-            except (ValueError, ZeroDivisionError):
-                health = None
-        return {
-            'percentage': percent,
-            'status': status,
-            'health': health
-        }
+        def apply():
+            if not call_hardware("charge_limit.set", {"value": limit}, lambda: set_charge_limit(limit)):
+                print(f"Failed to set charge limit to {limit}%")
+        self._run_limit_worker(apply)
 
+    def _run_limit_worker(self, func=None):
+        '''Run func, if any, in a thread, then re-read the limit and refresh the controls.'''
+        def worker():
+            if func is not None:
+                func()
+            limit = query_hardware("charge_limit.get", {}, get_charge_limit)
+            GLib.idle_add(self._on_limit_read, limit)
+        threading.Thread(target=worker, daemon=True).start()
 
-def read_file(path):
-    '''Reads the content of a file and returns it as a string.'''
-    try:
-        with open(path, 'r', encoding='utf-8') as f:
-            return f.read().strip()
-    except (OSError, IOError):
-        return None
+    def _on_limit_read(self, limit):
+        # The provider only re-reads the limit itself when sysfs exposes it
+        self.provider.charge_limit = limit
+        self.limit_button.set_sensitive(True)
+        if limit is not None:
+            self.limit_spin.set_value(limit)
+        self._show_charge_limit(limit)
+        return False
 
-def get_power_path(filename, battery_name='BAT1'):
-    '''Returns the path to the specified battery sysfs file.'''
-    return os.path.join(f'/sys/class/power_supply/{battery_name}', filename)
+    def _show_charge_limit(self, limit):
+        self.limit_label.set_text(f"Charge limit: {limit}%" if limit is not None else "Charge limit: Unknown")
+        for graph in self.graphs:
+            if graph.unit == "%":
+                graph.set_marker(limit if limit is not None and limit < MAX_LIMIT else None)
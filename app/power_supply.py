@@ -0,0 +1,190 @@
+'''Power Supply Module
+This module enumerates /sys/class/power_supply once and classifies each entry as a
+battery, mains adapter or USB-PD source. Attribute files are opened once and re-read
+with os.pread at offset 0 on every poll, which avoids an open/close per value.
+A rescan keeps the supplies that are still there, with their open files. Other threads may
+be reading the ones that went away, so their files are closed when they are no longer used.
+'''
+
+import os
+import threading
+
+from app.helpers import get_sysfs_path
+
+POWER_SUPPLY_ROOT = get_sysfs_path("class", "power_supply")
+
+# Values of the sysfs "type" file mapped to the kinds used by the app
+SUPPLY_KINDS = {
+    "battery": "battery",
+    "mains": "mains",
+    "usb": "usb_pd",
+}
+
+READ_SIZE = 256
+
+
+class SysfsAttribute:
+    '''A sysfs attribute file kept open for repeated reads.'''
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            self.fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+        except OSError:
+            self.fd = None
+
+    def read(self):
+        '''Return the stripped file contents, or None if unavailable.'''
+        if self.fd is None:
+            return None
+        try:
+            return os.pread(self.fd, READ_SIZE, 0).decode("utf-8", "replace").strip()
+        except OSError:
+            return None
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __del__(self):
+        self.close()
+
+
+class PowerSupply:
+    '''One entry in /sys/class/power_supply.'''
+
+    def __init__(self, name, path, kind):
+        self.name = name
+        self.path = path
+        self.kind = kind
+        self._attributes = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name!r}, kind={self.kind!r})"
+
+    def has(self, attribute):
+        '''Return True if the attribute file exists for this supply.'''
+        return os.path.exists(os.path.join(self.path, attribute))
+
+    def read(self, attribute):
+        '''Read an attribute as a string, or None. The file stays open for the next read.'''
+        attr = self._attributes.get(attribute)
+        if attr is None:
+            with self._lock:
+                attr = self._attributes.get(attribute)
+                if attr is None:
+                    attr = SysfsAttribute(os.path.join(self.path, attribute))
+                    self._attributes[attribute] = attr
+        return attr.read()
+
+    def read_number(self, attribute, scale=1.0):
+        '''Read an attribute as a float multiplied by scale, or None.'''
+        value = self.read(attribute)
+        if value is None:
+            return None
+        try:
+            return float(value) * scale
+        except ValueError:
+            return None
+
+    def is_online(self):
+        '''For mains and USB supplies, whether it is currently connected.'''
+        return self.read("online") == "1"
+
+    def close(self):
+        '''Close the attribute files. Only when no other thread reads this supply, a closed
+        descriptor number can be reused by another file.'''
+        with self._lock:
+            for attr in self._attributes.values():
+                attr.close()
+            self._attributes = {}
+
+
+class Battery(PowerSupply):
+    '''A battery, reporting either charge_* (uAh) or energy_* (uWh) attributes.'''
+
+    def __init__(self, name, path, kind="battery"):
+        super().__init__(name, path, kind)
+        # Pick the attribute family once, some models only expose energy_*
+        self.prefix = "charge" if self.has("charge_full") else "energy"
+
+    def stats(self):
+        '''Return a dict with percentage, status, health, and power draw in W, A and V.'''
+        percentage = self.read_number("capacity")
+        full = self.read_number(f"{self.prefix}_full")
+        full_design = self.read_number(f"{self.prefix}_full_design")
+        health = None
+        if full and full_design:
+            health = int(full * 100 // full_design)
+
+        # sysfs reports micro-units
+        current_now = self.read_number("current_now", 1e-6)
+        voltage_now = self.read_number("voltage_now", 1e-6)
+        power_now = self.read_number("power_now", 1e-6)
+        if power_now is None and current_now is not None and voltage_now is not None:
+            power_now = current_now * voltage_now
+        return {
+            'percentage': int(percentage) if percentage is not None else None,
+            'status': self.read("status"),
+            'health': health,
+            'power_now': power_now,
+            'current_now': current_now,
+            'voltage_now': voltage_now
+        }
+
+
+_supplies = None
+_supplies_lock = threading.Lock()
+
+def discover_power_supplies(root=POWER_SUPPLY_ROOT, refresh=False):
+    '''Scan the power_supply class once and return the list of supplies.
+    Pass refresh=True to rescan, e.g. after a hotplug event.'''
+    global _supplies
+    with _supplies_lock:
+        if _supplies is not None and not refresh:
+            return _supplies
+        # Supplies that are still there keep their open files
+        previous = {(s.name, s.path, s.kind): s for s in _supplies or ()}
+        supplies = []
+        try:
+            names = sorted(os.listdir(root))
+        except OSError:
+            names = []
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                with open(os.path.join(path, "type"), "r", encoding="utf-8") as f:
+                    kind = SUPPLY_KINDS.get(f.read().strip().lower())
+            except OSError:
+                continue
+            if kind == "battery":
+                # Peripheral batteries (mice, headsets) report scope=Device
+                try:
+                    with open(os.path.join(path, "scope"), "r", encoding="utf-8") as f:
+                        if f.read().strip().lower() == "device":
+                            continue
+                except OSError:
+                    pass
+                supplies.append(previous.get((name, path, kind)) or Battery(name, path))
+            elif kind:
+                supplies.append(previous.get((name, path, kind)) or PowerSupply(name, path, kind))
+        # Supplies that went away are not closed here, other threads may be reading them.
+        # Their files are closed once nothing refers to them.
+        _supplies = supplies
+        return supplies
+
+
+def get_batteries():
+    '''Return the system batteries.'''
+    return [s for s in discover_power_supplies() if s.kind == "battery"]
+
+
+def get_battery(name=None):
+    '''Return the named battery, or the first one found. None if there is no battery.'''
+    batteries = get_batteries()
+    for battery in batteries:
+        if name is None or battery.name == name:
+            return battery
+    return None
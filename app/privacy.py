@@ -0,0 +1,259 @@
+'''Privacy Module
+Whether the camera and the microphone are in use, for the indicators on the laptop image.
+
+The camera is in use while a /dev/video* device is open. The devices are watched with
+inotify, so every open and close is counted as it happens. The processes that already
+have a device open are found once, by scanning /proc/*/fd when the watch starts (and
+again if the inotify queue overflows). The microphone is in use while an ALSA capture
+substream is running, /proc/asound/card*/pcm*c/sub*/status says "state: RUNNING". This
+covers PipeWire and PulseAudio, which capture through ALSA. Those files are tiny and read
+on each poll. Opening or closing a /dev/snd/pcm*c device re-reads them straight away.
+
+Listeners are called from the watch thread, after a short settle time, when the state
+changes. Device probes that open and close a camera within the settle time are ignored.
+Without inotify, the camera falls back to a /proc scan cached for FD_SCAN_INTERVAL seconds.
+This module does not use GTK.
+'''
+
+import ctypes
+import ctypes.util
+import glob
+import os
+import re
+import select
+import struct
+import sys
+import threading
+import time
+
+from app.helpers import get_devfs_path, get_procfs_path
+
+SETTLE_TIME = 0.05  # seconds of quiet before a change is reported
+RECHECK_DELAY = 0.5  # capture streams start running shortly after the device is opened
+FD_SCAN_INTERVAL = 10  # seconds a /proc fd scan is trusted when inotify is unavailable
+
+IN_CLOSE_WRITE = 0x00000008
+IN_CLOSE_NOWRITE = 0x00000010
+IN_OPEN = 0x00000020
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_CLOEXEC = 0o2000000
+IN_CLOSE = IN_CLOSE_WRITE | IN_CLOSE_NOWRITE
+INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+VIDEO_RE = re.compile(r"video\d+$")
+CAPTURE_RE = re.compile(r"pcmC\d+D\d+c$")
+
+
+def capture_running(proc_root=None):
+    '''Return True if an ALSA capture substream is running.'''
+    pattern = os.path.join(proc_root or get_procfs_path(), "asound", "card*", "pcm*c", "sub*", "status")
+    for path in glob.glob(pattern):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                if f.readline().strip() == "state: RUNNING":
+                    return True
+        except OSError:
+            continue
+    return False
+
+
+def scan_open_devices(paths, proc_root=None):
+    '''Return {path: number of open file descriptors} for the given device paths, by
+    scanning /proc/*/fd. Only processes readable by this user are seen.'''
+    counts = dict.fromkeys(paths, 0)
+    proc_root = proc_root or get_procfs_path()
+    try:
+        pids = [name for name in os.listdir(proc_root) if name.isdigit()]
+    except OSError:
+        return counts
+    for pid in pids:
+        fd_dir = os.path.join(proc_root, pid, "fd")
+        try:
+            fds = os.listdir(fd_dir)
+        except OSError:
+            continue
+        for fd in fds:
+            try:
+                target = os.readlink(os.path.join(fd_dir, fd))
+            except OSError:
+                continue
+            if target in counts:
+                counts[target] += 1
+    return counts
+
+
+class Inotify:
+    '''Minimal inotify binding through ctypes.'''
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self.fd = libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path, mask):
+        '''Return the watch descriptor for path. Raises OSError.'''
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        return wd
+
+    def read(self):
+        '''Return the pending (wd, mask, name) events, blocking until there is one.'''
+        data = os.read(self.fd, 64 * 1024)
+        events = []
+        offset = 0
+        while offset + INOTIFY_EVENT.size <= len(data):
+            wd, mask, _cookie, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0").decode("utf-8", "replace")
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+
+class PrivacyMonitor:
+    '''Tracks camera and microphone use, see the module docstring.'''
+
+    def __init__(self, dev_root=None, proc_root=None, settle=SETTLE_TIME):
+        self.dev_root = dev_root or get_devfs_path()
+        self.proc_root = proc_root or get_procfs_path()
+        self.settle = settle
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._inotify = None
+        self._watches = {}  # wd -> device path, or None for the directories
+        self._open = {}  # video device path -> open count
+        self._scanned_at = None
+        self._state = None
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def start(self):
+        '''Start watching the devices. Returns False if inotify is unavailable, the state
+        is then polled.'''
+        try:
+            self._inotify = Inotify()
+            for directory in (self.dev_root, os.path.join(self.dev_root, "snd")):
+                if os.path.isdir(directory):
+                    self._watches[self._inotify.add_watch(directory, IN_CREATE)] = None
+            self._watch_devices()
+        except (OSError, AttributeError) as e:
+            print(f"Camera and microphone watch unavailable, polling instead: {e}", file=sys.stderr)
+            self._inotify = None
+            return False
+        self._rescan()
+        self._state = self._read_state()
+        threading.Thread(target=self._run, name="privacy-monitor", daemon=True).start()
+        return True
+
+    def state(self):
+        '''Return {"camera": bool, "microphone": bool}.'''
+        if self._inotify is None:
+            if self._scanned_at is None or time.monotonic() - self._scanned_at > FD_SCAN_INTERVAL:
+                self._rescan()
+        return self._read_state()
+
+    def _read_state(self):
+        with self._lock:
+            camera = any(count > 0 for count in self._open.values())
+        return {"camera": camera, "microphone": capture_running(self.proc_root)}
+
+    def _devices(self):
+        video = [os.path.join(self.dev_root, name) for name in _listdir(self.dev_root) if VIDEO_RE.match(name)]
+        snd = os.path.join(self.dev_root, "snd")
+        capture = [os.path.join(snd, name) for name in _listdir(snd) if CAPTURE_RE.match(name)]
+        return video, capture
+
+    def _watch_devices(self):
+        '''Watch the devices that are not watched yet.'''
+        video, capture = self._devices()
+        watched = set(self._watches.values())
+        for path in video + capture:
+            if path in watched:
+                continue
+            try:
+                self._watches[self._inotify.add_watch(path, IN_OPEN | IN_CLOSE)] = path
+            except OSError as e:
+                print(f"Cannot watch {path}: {e}", file=sys.stderr)
+        with self._lock:
+            for path in video:
+                self._open.setdefault(path, 0)
+
+    def _rescan(self):
+        video, _capture = self._devices()
+        counts = scan_open_devices(video, self.proc_root)
+        with self._lock:
+            self._open = counts
+        self._scanned_at = time.monotonic()
+
+    def _handle(self, events):
+        for wd, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                self._rescan()
+                continue
+            path = self._watches.get(wd)
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                with self._lock:
+                    self._open.pop(path, None)
+            elif path is None and mask & IN_CREATE and (VIDEO_RE.match(name) or CAPTURE_RE.match(name)):
+                self._watch_devices()
+            elif path in self._open:
+                with self._lock:
+                    delta = 1 if mask & IN_OPEN else -1 if mask & IN_CLOSE else 0
+                    self._open[path] = max(self._open[path] + delta, 0)
+
+    def _run(self):
+        recheck_at = None
+        while True:
+            timeout = None if recheck_at is None else max(recheck_at - time.monotonic(), 0)
+            try:
+                ready, _, _ = select.select([self._inotify.fd], [], [], timeout)
+                if ready:
+                    self._handle(self._inotify.read())
+                    # Let a burst of opens and closes settle before looking at the state
+                    while select.select([self._inotify.fd], [], [], self.settle)[0]:
+                        self._handle(self._inotify.read())
+                    recheck_at = time.monotonic() + RECHECK_DELAY
+                else:
+                    recheck_at = None
+            except OSError as e:
+                print(f"Camera and microphone watch stopped: {e}", file=sys.stderr)
+                self._inotify = None
+                return
+            state = self._read_state()
+            if state != self._state:
+                self._state = state
+                for listener in list(self._listeners):
+                    listener()
+
+
+def _listdir(path):
+    try:
+        return sorted(os.listdir(path))
+    except OSError:
+        return []
+
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+def get_privacy_monitor():
+    '''Return the shared PrivacyMonitor, started on first use.'''
+    global _monitor
+    with _monitor_lock:
+        if _monitor is None:
+            _monitor = PrivacyMonitor()
+            _monitor.start()
+        return _monitor
@@ -0,0 +1,599 @@
+'''Data Providers
+One DataProvider per widget. Providers read hardware state and return immutable snapshots.
+They never import GTK, so ui.py can poll them from worker threads and they can be used
+without a display.
+'''
+
+import datetime
+import os
+import platform
+import subprocess
+import threading
+import time
+
+import psutil
+from PIL import Image, ImageDraw, ImageFont
+
+from app.widget import DataProvider, freeze
+from app.atlas import get_atlas_index
+from app.command_runner import invalidate, run_query
+from app.charge_limit import MAX_LIMIT, get_charge_limit, get_threshold_path
+from app.graphics import get_graphics_name
+from app.image_worker import get_image_worker
+from app.keyboard_backlight import KB_MODES
+from app.led_control import (LED_COLORS, LED_NAMES, get_led_capabilities, get_led_colors,
+                             get_led_state_mtime, load_led_values)
+from app.power_profiles import PowerProfiles, get_available_sleep_modes, get_current_sleep_mode
+from app.power_supply import get_battery
+from app.privacy import get_privacy_monitor
+from app.system_monitor import SERIES, get_system_monitor
+from app.thermals import get_thermal_monitor
+from app.usb_pd import UsbPdReader
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+
+
+class SystemStatsProvider(DataProvider):
+    '''Memory, storage, graphics and the OS logo overlay, which don't change while running,
+    plus live CPU, frequency, memory and pressure readings with their recent history.'''
+
+    def __init__(self, model=None, image_size=(500, 710), monitor=None):
+        self.model = model
+        self.image_size = image_size
+        self.monitor = monitor or get_system_monitor()
+        self._static = None
+
+    def poll(self):
+        if self._static is None:
+            self._static = {
+                "stats": self.get_system_stats(),
+                "cpu": getattr(self.model, 'cpu', None) or 'Unknown',
+                "image_size": self.image_size,
+                "overlays": [
+                    {"name": "os", "path": self.get_os_overlay_path(), "color": None}
+                ]
+            }
+        return freeze({
+            **self._static,
+            "live": self.monitor.sample(),
+            "history": {name: self.monitor.series(name) for name in SERIES},
+        })
+
+    def get_os_overlay_path(self):
+        '''Return the path to a distro/OS-specific overlay image, generating a 500x710 PNG with the logo at 50%x25%.'''
+        system = platform.system().lower()
+        overlay_dir = os.path.join(ASSETS_DIR, 'overlays')
+        if system == 'linux':
+            distro = self.get_linux_distro()
+            distro_map = {
+                'fedora': 'os-fedora.png',
+                'arch': 'os-arch.png',
+                'ubuntu': 'os-ubuntu.png',
+                'debian': 'os-debian.png',
+                'manjaro': 'os-manjaro.png',
+                'pop': 'os-pop.png',
+                'opensuse': 'os-opensuse.png',
+                'elementary': 'os-elementary.png',
+                'mint': 'os-mint.png',
+            }
+            filename = None
+            for key, fname in distro_map.items():
+                if key in distro:
+                    filename = fname
+                    break
+            if not filename:
+                filename = 'os-linux.png'
+        elif system == 'windows':
+            filename = 'os-windows.png'
+        elif system == 'darwin':
+            filename = 'os-macos.png'
+        else:
+            filename = 'os-unknown.png'
+        logo_path = os.path.abspath(os.path.join(overlay_dir, filename))
+        out_path = os.path.abspath(os.path.join(overlay_dir, f'os-overlay-{filename}'))
+        # Generate overlay if not present, the asset atlas has them pre-rendered
+        atlas = get_atlas_index()
+        in_atlas = atlas is not None and f"overlays/{os.path.basename(out_path)}" in atlas
+        if not in_atlas and not os.path.exists(out_path):
+            self.generate_logo_overlay(logo_path, out_path, (500, 710))
+        return f"overlays/{os.path.basename(out_path)}"
+
+    def generate_logo_overlay(self, logo_path, out_path, size):
+        '''Create a transparent PNG of given size with the logo centered at 50%x25%.'''
+        worker = get_image_worker()
+        if worker is not None and worker.save_overlay(render_logo_overlay, (logo_path, size), out_path):
+            return
+        try:
+            render_logo_overlay(logo_path, size).save(out_path)
+        except Exception as e:
+            print(f"Failed to generate overlay: {e}")
+
+    def get_linux_distro(self):
+        '''Detect Linux distribution name (lowercase, no spaces).'''
+        try:
+            # Try /etc/os-release (most modern distros)
+            with open('/etc/os-release', 'r') as f:
+                for line in f:
+                    if line.startswith('ID='):
+                        return line.strip().split('=', 1)[1].replace('"', '').lower()
+                    if line.startswith('NAME='):
+                        return line.strip().split('=', 1)[1].replace('"', '').lower()
+        except Exception:
+            pass
+        return 'linux'
+
+    def get_system_stats(self):
+        '''Gather memory, storage, and graphics stats.'''
+        # Memory amount (total)
+        mem = psutil.virtual_memory()
+        mem_total_mb = mem.total / (1000**2)
+        memory_gb = mem_total_mb / 1000
+        memory = f"{memory_gb:.1f}GB"
+        disk = psutil.disk_usage('/')
+        total_gb = disk.total / (1000**3)
+        if total_gb >= 1000:
+            storage = f"{total_gb / 1000:.1f}TB"
+        else:
+            storage = f"{total_gb:.1f}GB"
+        return {
+            'memory': memory,
+            'storage': storage,
+            # All GPUs from /sys/class/drm, e.g. the iGPU and dGPU of a Framework 16
+            'graphics': get_graphics_name()
+        }
+
+
+def render_logo_overlay(logo_path, size):
+    '''Return a transparent RGBA image of the given size with the logo centered at 50%x25%.
+    Also used by tools/build_atlas.py to pre-render the overlays.'''
+    width, height = size
+    base = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    if os.path.exists(logo_path):
+        logo = Image.open(logo_path).convert('RGBA')
+        # Resize logo to fit nicely (e.g., 128x128 or 20% of width)
+        max_logo_w = int(width * 0.2)
+        max_logo_h = int(height * 0.2)
+        logo.thumbnail((max_logo_w, max_logo_h), Image.LANCZOS)
+        logo_w, logo_h = logo.size
+        x = int(width * 0.5 - logo_w / 2)
+        y = int(height * 0.25 - logo_h / 2)
+        base.paste(logo, (x, y), logo)
+    return base
+
+
+def render_time_overlay(time_str, size):
+    '''Return a transparent RGBA image of the given size with time_str in white, centered
+    horizontally in the top quarter.'''
+    # Create a transparent image (size should match overlay requirements)
+    width, height = size
+    img = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+
+    # Try to use a font from the assets/fonts directory, fallback to default
+    font_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..', 'fonts', 'GraphikBold.otf'))
+    try:
+        font = ImageFont.truetype(font_path, 36)
+    except (OSError, IOError):
+        font = ImageFont.load_default()
+
+    # Draw the time string in white, centered
+    try:
+        text_w, text_h = font.getsize(time_str)
+    except AttributeError:
+        # For newer Pillow versions, use getbbox
+        bbox = font.getbbox(time_str)
+        text_w, text_h = bbox[2] - bbox[0], bbox[3] - bbox[1]
+    x = (img.width - text_w) // 2
+    y = int(img.height * .25 - text_h) / 2
+    draw.text((x, y), time_str, font=font, fill=(255, 255, 255, 255))
+    return img
+
+
+class PowerProfilesProvider(DataProvider):
+    '''Available and active power profiles, and the sleep mode.'''
+
+    def __init__(self):
+        print("[PowerProfilesController] Initializing backend...")
+        self.profiles = PowerProfiles()
+        self.sleep_modes = get_available_sleep_modes()
+
+    @property
+    def backend(self):
+        return self.profiles.backend
+
+    def poll(self):
+        profiles, current_profile = self.profiles.get_profiles()
+        return freeze({
+            "backend": self.profiles.backend,
+            "power_profiles": profiles,
+            "profile_map": self.profiles.profile_map,
+            "current_power_profile": current_profile,
+            "error": self.profiles.error,
+            'current_sleep_mode': get_current_sleep_mode(self.sleep_modes),
+            'available_sleep_modes': self.sleep_modes
+        })
+
+
+class BatteryProvider(DataProvider):
+    '''Battery status, power draw and the charge limit. Also records readings to the history store.'''
+
+    def __init__(self, battery_name=None, history=None):
+        self.battery_name = battery_name
+        self.history = history
+        # Set by the view after reading or changing the limit through ectool
+        self.charge_limit = None
+
+    def get_battery_stats(self):
+        '''Returns a dictionary with battery stats: percentage, status, health and power draw.
+        Power draw values are in W, A and V.'''
+
+        battery = get_battery(self.battery_name)
+        if battery is None:
+            return {key: None for key in ('percentage', 'status', 'health', 'power_now', 'current_now', 'voltage_now')}
+        return battery.stats()
+
+    def poll(self):
+        stats = self.get_battery_stats()
+
+        overlays = []
+
+        # Draw lightning bolt icon if charging
+        status = stats['status'] if stats['status'] is not None else 'Unknown'
+        if status.lower() == 'charging':
+            overlays.append({"name": "charging_icon", "path": "overlays/framework-charging-{overlay_id}.png", "color": (0, 255, 0, 255)})
+
+        # Reading sysfs is cheap, the ectool fallback is only read after a change
+        if get_threshold_path():
+            self.charge_limit = get_charge_limit()
+        charge_limit = self.charge_limit
+        if charge_limit is not None and charge_limit < MAX_LIMIT:
+            overlays.append({"name": "charge_limit", "path": generate_limit_overlay(charge_limit), "color": None})
+
+        # Record this tick's readings, the UI commits the sample once all providers have run
+        if self.history is not None:
+            record_battery_history(self.history, stats)
+
+        return freeze({
+            "percentage": stats['percentage'],
+            "status": stats['status'],
+            "health": stats['health'],
+            "power_now": stats['power_now'],
+            "current_now": stats['current_now'],
+            "voltage_now": stats['voltage_now'],
+            "charge_limit": charge_limit,
+            "overlays": overlays
+        })
+
+
+def record_battery_history(history, stats):
+    '''Set this tick's battery readings, from battery stats or a BatteryProvider snapshot.'''
+    history.set(
+        capacity=stats['percentage'],
+        status=stats['status'],
+        power_now=stats['power_now'],
+        current_now=stats['current_now'],
+        voltage_now=stats['voltage_now'],
+    )
+
+
+def record_thermal_history(history, sample):
+    '''Set this tick's thermal readings, from a ThermalsProvider sample or snapshot.'''
+    history.set(fan_rpm=sample['fan_rpm'], cpu_temp=sample['cpu_temp'], board_temp=sample['board_temp'])
+
+
+def generate_limit_overlay(limit, size=(500, 710)):
+    '''Return the overlay path for a charge limit marker, drawing it on first use.
+    The marker is a small battery gauge near the bottom of the image with a tick at the limit.'''
+    rel_path = f"overlays/framework-charge-limit-{limit}.png"
+    out_path = os.path.join(ASSETS_DIR, rel_path)
+    if os.path.exists(out_path):
+        return rel_path
+    width, height = size
+    img = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    gauge_w, gauge_h = int(width * 0.3), 14
+    x0 = (width - gauge_w) // 2
+    y0 = int(height * 0.9)
+    draw.rectangle((x0, y0, x0 + gauge_w, y0 + gauge_h), outline=(255, 255, 255, 200), width=2)
+    tick_x = x0 + gauge_w * limit // 100
+    draw.rectangle((x0 + 2, y0 + 2, tick_x, y0 + gauge_h - 2), fill=(0, 200, 0, 160))
+    draw.line((tick_x, y0 - 4, tick_x, y0 + gauge_h + 4), fill=(255, 60, 60, 255), width=3)
+    font = ImageFont.load_default()
+    draw.text((x0 + gauge_w + 8, y0), f"{limit}%", font=font, fill=(255, 255, 255, 255))
+    try:
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        img.save(out_path)
+    except OSError as e:
+        print(f"Failed to save charge limit overlay: {e}")
+    return rel_path
+
+
+PRIVACY_COLORS = {"camera": (0, 220, 90, 255), "microphone": (255, 150, 0, 255)}
+
+
+def generate_privacy_overlay(kind, size=(500, 710)):
+    '''Return the overlay path for the camera or microphone in-use indicator, drawing it on
+    first use. It is a dot next to the webcam on the top bezel, green for the camera on the
+    left and orange for the microphone on the right.'''
+    rel_path = f"overlays/framework-{kind}-in-use.png"
+    out_path = os.path.join(ASSETS_DIR, rel_path)
+    if os.path.exists(out_path):
+        return rel_path
+    width, height = size
+    img = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    x = width // 2 + (-16 if kind == "camera" else 16)
+    y = int(height * 0.035)
+    draw.ellipse((x - 9, y - 9, x + 9, y + 9), fill=PRIVACY_COLORS[kind][:3] + (70,))
+    draw.ellipse((x - 5, y - 5, x + 5, y + 5), fill=PRIVACY_COLORS[kind])
+    try:
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        img.save(out_path)
+    except OSError as e:
+        print(f"Failed to save {kind} overlay: {e}")
+    return rel_path
+
+
+def draw_service_overlays(snapshots):
+    '''Draw the generated overlays that snapshots from the service refer to. Their paths
+    are relative to the assets directory, and the service draws them in its own install.'''
+    limit = (snapshots.get("battery") or {}).get("charge_limit")
+    if limit is not None and limit < MAX_LIMIT:
+        generate_limit_overlay(limit)
+    cards = snapshots.get("expansion_cards") or {}
+    for kind in ("camera", "microphone"):
+        if cards.get(f"{kind}_in_use"):
+            generate_privacy_overlay(kind)
+
+
+class ThermalsProvider(DataProvider):
+    '''Temperatures and fan speed, shared with the history store.'''
+
+    def __init__(self, history=None):
+        self.history = history
+        self.monitor = get_thermal_monitor()
+
+    def poll(self):
+        sample = self.monitor.sample()
+        if self.history is not None:
+            record_thermal_history(self.history, sample)
+        return freeze(sample)
+
+
+EXPANSION_CARD_MAP = {
+    "HDMI Expansion Card": "expansion_card_hdmi.png",
+    "USB-A Expansion Card": "expansion_card_usb_a.png",
+    "Storage Expansion Card": "expansion_card_storage.png",
+    "Micro SD Expansion Card": "expansion_card_micro_sd.png",
+    "USB-C Expansion Card": "expansion_card_usb_c.png",
+    "Fingerprint Sensor / Power Button": None,
+    "Wireless Card": None,
+}
+
+
+class ExpansionCardsProvider(DataProvider):
+    '''Expansion cards detected from lsusb, whether the laptop camera is present, the
+    USB-PD role and power of each bay's USB-C port, and whether the camera and microphone
+    are in use.'''
+
+    def __init__(self, ports=4, usb_ports=None, typec_ports=None):
+        self.ports = ports
+        self.usb_ports = usb_ports
+        self.typec_ports = typec_ports or {}
+        self.usb_pd = UsbPdReader()
+        self.privacy = get_privacy_monitor()
+        if self.usb_pd.monitor is not None:
+            # A card was plugged or unplugged, don't wait for the cached lsusb to expire
+            self.usb_pd.monitor.add_listener(lambda: invalidate("lsusb"))
+
+    def read_ports(self):
+        '''Return the USB-PD reading of each bay's port, None for bays without one.'''
+        bays = [None] * self.ports
+        for port in self.usb_pd.read():
+            bay = self.typec_ports.get(str(port["port"]), port["port"])
+            if 0 <= bay < self.ports:
+                bays[bay] = port
+        return bays
+
+    def poll(self):
+        '''Update the detected expansion cards and check for laptop camera.'''
+        result = ["expansion_card_usb_c.png"] * self.ports
+        camera_found = False
+        try:
+            lsusb = run_query(["lsusb"], check=True)
+            camera_found, result = parse_lsusb(lsusb.stdout, self.ports, self.usb_ports)
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError) as e:
+            print(f"Error occurred while getting connected expansion cards: {e}")
+        in_use = self.privacy.state()
+        data = {
+            "expansion_cards": result,
+            "usb_pd": self.read_ports(),
+            "camera_in_use": in_use["camera"],
+            "microphone_in_use": in_use["microphone"],
+        }
+        overlays = []
+        if not camera_found:
+            overlays.append({"name": "camera_off", "path": "overlays/framework-camera-off-{overlay_id}.png", "color": None})
+        for kind in ("camera", "microphone"):
+            if in_use[kind]:
+                overlays.append({"name": f"{kind}_in_use", "path": generate_privacy_overlay(kind), "color": None})
+        if overlays:
+            data["overlays"] = overlays
+        return freeze(data)
+
+
+def parse_lsusb(output, ports, port_map=None):
+    '''Return (camera_found, card images per port) from lsusb output.
+    port_map maps USB port numbers to bay indexes, it is the model's usb_ports.'''
+    result = ["expansion_card_usb_c.png"] * ports
+    camera_found = False
+    port_map = port_map or {}
+    dev_to_port = {}
+    for line in output.splitlines():
+        if "Realtek Semiconductor Corp. Laptop Camera" in line:
+            camera_found = True
+        parts = line.strip().split()
+        label_line = line.strip()
+        extra_label = None
+        port_idx = None
+        if len(parts) >= 6:
+            bus = parts[1]
+            dev = parts[3][:-1]
+            port = dev_to_port.get((bus, dev))
+            port_idx = port_map.get(port) if port else None
+            if "HDMI" in label_line.upper():
+                extra_label = "HDMI Expansion Card"
+            elif any(x in label_line.upper() for x in ["USB3.0", "USB2.0", "USB-A"]):
+                extra_label = "USB-A Expansion Card"
+            elif "FRAMEWORK" in label_line.upper() and ("0001" in label_line or "0003" in label_line):
+                extra_label = "USB-A Expansion Card"
+            elif "FRAMEWORK" in label_line.upper() and "0002" in label_line:
+                extra_label = "HDMI Expansion Card"
+            elif "13fe:6500" in label_line or "USB DISK 3.2" in label_line.upper():
+                extra_label = "Storage Expansion Card"
+            elif "090c:3350" in label_line or "USB DISK" in label_line.upper():
+                extra_label = "Micro SD Expansion Card"
+            if extra_label and port_idx is not None and 0 <= port_idx:
+                if port_idx >= ports:
+                    for i in range(ports):
+                        if result[i] == "expansion_card_usb_c.png":
+                            result[i] = EXPANSION_CARD_MAP[extra_label]
+                            break
+                else:
+                    result[port_idx] = EXPANSION_CARD_MAP[extra_label]
+    return camera_found, result
+
+
+class LedProvider(DataProvider):
+    '''LED state and overlays. Starts from the values last applied during this boot,
+    follows the view, and re-reads the state file every RESYNC_INTERVAL seconds to pick up
+    changes made with framework-ctl.'''
+
+    RESYNC_INTERVAL = 60
+
+    OVERLAY_MAP = {
+        "left": "overlays/framework-left-led-{overlay_id}.png",
+        "power": "overlays/framework-power-led-{overlay_id}.png",
+        "right": "overlays/framework-right-led-{overlay_id}.png"
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = {}  # name -> (mode, color)
+        self._state_mtime = None
+        self._synced = 0
+        self._colors = None  # name -> supported colours, queried once
+        self.resync()
+
+    def resync(self, force=False):
+        '''Load the recorded LED values if the state file changed since the last load, or always with force.'''
+        self._synced = time.monotonic()
+        mtime = get_led_state_mtime()
+        if self._state and mtime == self._state_mtime and not force:
+            return
+        values = load_led_values()
+        with self._lock:
+            self._state_mtime = mtime
+            self._state = {name: led_state_from_value(value) for name, value in values.items()}
+
+    def set_state(self, led_name, mode, color):
+        '''Record the mode ("on", "auto", "off") and colour of an LED. Called from the main thread.'''
+        with self._lock:
+            self._state[led_name] = (mode.lower(), color.lower())
+
+    def get_state(self, led_name):
+        with self._lock:
+            return self._state.get(led_name)
+
+    def get_states(self):
+        '''Return {led name: (mode, color)} without querying the EC.'''
+        with self._lock:
+            return dict(self._state)
+
+    def get_overlay(self, led_name):
+        '''Return overlay dict for the given LED, or None if off.'''
+        state = self.get_state(led_name)
+        if not state:
+            return None
+        mode, color = state
+        if mode in ("off", "auto") or color in ("off", "auto"):
+            return None
+        img_name = self.OVERLAY_MAP.get(led_name)
+        color_rgba = LED_COLORS.get(color, (255, 255, 255, 255))
+        if img_name:
+            return {"name": led_name, "path": img_name, "color": color_rgba}
+        return None
+
+    def poll(self):
+        if time.monotonic() - self._synced >= self.RESYNC_INTERVAL:
+            self.resync()
+        if self._colors is None:
+            # One EC query for all LEDs on the first run, then read from the state file.
+            # If ectool fails, fall back to the known colours for this session.
+            self._colors = get_led_capabilities() or {name: get_led_colors(name) for name in LED_NAMES}
+        overlays = [o for o in (self.get_overlay(name) for name in LED_NAMES) if o]
+        return freeze({"state": self.get_states(), "colors": self._colors, "overlays": overlays})
+
+
+def led_state_from_value(value):
+    '''Return the (mode, color) of an LED value as recorded by led_control ("auto", "off" or a colour).'''
+    if value in ("auto", "off"):
+        return (value, value)
+    return ("on", value)
+
+
+class KeyboardBacklightProvider(DataProvider):
+    '''Keyboard backlight brightness and mode, from the values chosen in the view.'''
+
+    def __init__(self, image_size=(500, 710)):
+        self.image_size = image_size
+        # Plain attributes written by the main thread, read here
+        self.brightness = 0
+        self.mode = KB_MODES[0]
+
+    def poll(self):
+        brightness = self.brightness
+        return freeze({
+            "brightness": brightness,
+            "mode": self.mode,
+            "image_size": self.image_size,
+            "overlays": [
+                {"name": "keyboard_led", "path": "overlays/framework-keyboard-led-{overlay_id}.png", "color": (255, 255, 255, 255/100*brightness)}
+            ]
+        })
+
+
+class SampleProvider(DataProvider):
+    '''The current time, rendered into an overlay image.'''
+
+    def __init__(self, image_size=(500, 710)):
+        self.image_size = image_size
+
+    def poll(self):
+        time = self.generate_time_image()
+
+        # Set data with overlays key for the UI
+        return freeze({
+            "time": time.isoformat(),
+            "image_size": self.image_size,
+            "overlays": [{"name": "time", "path": "overlays/framework-time.png", "color": None}]
+        })
+
+    def generate_time_image(self):
+        '''Generate a time image overlay'''
+
+        # Generate current time string
+        now = datetime.datetime.now()
+        # H:mm am/pm
+        time_str = now.strftime("%I:%M %p")
+
+        # Generate overlay image with the current time
+        overlay_path = os.path.join(ASSETS_DIR, 'overlays', 'framework-time.png')
+        os.makedirs(os.path.dirname(overlay_path), exist_ok=True)
+
+        # Drawn and saved in the image worker when it runs, keeping Pillow off this process
+        worker = get_image_worker()
+        if worker is None or not worker.save_overlay(render_time_overlay, (time_str, self.image_size), overlay_path):
+            render_time_overlay(time_str, self.image_size).save(overlay_path)
+
+        return now
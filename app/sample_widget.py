@@ -1,13 +1,12 @@
 '''Sample Widget Module
 This module defines a sample widget for demonstration purposes.
-It inherits from Gtk.Box and implements the WidgetTemplate interface.
+It inherits from Gtk.Box and implements the WidgetTemplate interface, with SampleProvider
+generating the data.
 '''
 
-import os
-import datetime
 from gi.repository import Gtk
-from PIL import Image, ImageDraw, ImageFont
 from app.widget import WidgetTemplate
+from app.providers import SampleProvider
 
 
 class SampleWidget(Gtk.Box, WidgetTemplate):
@@ -15,26 +14,12 @@ class SampleWidget(Gtk.Box, WidgetTemplate):
 
     def __init__(self, model=None, image_size=(500, 710)):
         Gtk.Box.__init__(self, orientation=Gtk.Orientation.VERTICAL, spacing=10)
-        WidgetTemplate.__init__(self)
+        WidgetTemplate.__init__(self, SampleProvider(image_size))
         self.label = Gtk.Label(label="Sample Widget")
         Gtk.Box.pack_start(self, self.label, True, True, 0)
-        self.data = None
         self.model = model
         self.image_size = image_size
 
-
-    def update(self):
-        '''Update method called by ui.py'''
-
-        time = self.generate_time_image()
-
-        # Set data with overlays key for the UI
-        self.data = {
-            "time": time.isoformat(),
-            "image_size": self.image_size,
-            "overlays": [{"name": "time", "path": "overlays/framework-time.png", "color": None}]
-        }
-
     def update_visual(self):
         '''Update the visual representation of the widget called by ui.py'''
 
@@ -43,46 +28,3 @@ class SampleWidget(Gtk.Box, WidgetTemplate):
             self.label.set_text(f"Sample Widget\nTime: {self.data['time']}")
         else:
             self.label.set_text("Sample Widget\nNo data yet.")
-
-    def generate_time_image(self):
-        '''Generate a time image overlay'''
-
-        # Generate current time string
-        now = datetime.datetime.now()
-        # H:mm am/pm
-        time_str = now.strftime("%I:%M %p")
-
-        # Use passed image size
-        width, height = self.image_size
-
-        # Generate overlay image with the current time
-        overlay_dir = os.path.join(os.path.dirname(__file__), './assets/overlays')
-        overlay_path = os.path.abspath(os.path.join(overlay_dir, 'framework-time.png'))
-
-        # Create a transparent image (size should match overlay requirements)
-        img = Image.new('RGBA', (width, height), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(img)
-
-        # Try to use a font from the assets/fonts directory, fallback to default
-        font_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..', 'fonts', 'GraphikBold.otf'))
-        try:
-            font = ImageFont.truetype(font_path, 36)
-        except (OSError, IOError):
-            font = ImageFont.load_default()
-
-        # Draw the time string in white, centered
-        try:
-            text_w, text_h = font.getsize(time_str)
-        except AttributeError:
-            # For newer Pillow versions, use getbbox
-            bbox = font.getbbox(time_str)
-            text_w, text_h = bbox[2] - bbox[0], bbox[3] - bbox[1]
-        x = (img.width - text_w) // 2
-        y = int(img.height * .25 - text_h) / 2
-        draw.text((x, y), time_str, font=font, fill=(255, 255, 255, 255))
-
-        # Save the overlay image
-        os.makedirs(os.path.dirname(overlay_path), exist_ok=True)
-        img.save(overlay_path)
-
-        return now
\ No newline at end of file
@@ -0,0 +1,309 @@
+'''Lighting Scenes Module
+Timed sequences across the left, power and right LEDs and the keyboard backlight, such as
+notification flashes, a battery-low pulse or build status colours. Scenes are JSON files
+in assets/scenes/ and ~/.config/framework-app/scenes/ (which override the built-in ones):
+
+    {
+        "name": "Notification flash",
+        "repeat": 3,
+        "duration": 0.6,
+        "tracks": {
+            "left": [[0, "white"], [0.3, "off"]],
+            "keyboard": [[0, 0], [0.3, 100, 0.3]]
+        },
+        "finally": {"left": "auto"}
+    }
+
+Each track lists [seconds, value] steps. LED values are a colour, "auto" or "off", the
+keyboard takes a percentage, and [seconds, percent, fade seconds] fades from the previous
+value. "duration" is the length of one pass (the last step by default) and "repeat" the
+number of passes, 0 to play until stopped. "finally" sets values once when the scene
+ends or is stopped, usually to hand the LEDs back to the EC.
+
+compile_scene turns a scene into flat arrays of (time, target, value) steps with the fades
+expanded, and the commands are built before playback starts, so play_scene only waits for
+the next deadline and runs a prepared command. request_scene sends scenes over D-Bus to the
+framework service, whose keyboard backlight daemon plays them; without the service they play
+in the calling process. FakeEC records the steps instead, for dry runs.
+This module does not use GTK.
+'''
+
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from array import array
+
+from app.helpers import get_asset_path, get_config_dir
+from app.led_control import LED_COLORS, LED_MODES, LED_NAMES, validate_led
+from app.service_client import ServiceError, get_service_client
+
+TARGETS = LED_NAMES + ("keyboard",)
+KEYBOARD = TARGETS.index("keyboard")
+LED_VALUES = LED_MODES + tuple(LED_COLORS)  # LED value codes are indexes into this
+FADE_STEP = 0.1  # seconds between keyboard brightness steps in a fade
+MAX_STEPS = 10000
+SCENE_DIRS = (get_asset_path("scenes"),)
+
+
+class CompiledScene:
+    '''A scene as flat arrays, ready to play. Step i sets targets[i] to values[i] at times[i]
+    seconds into each pass. skip_to[i] is the next step for the same target, or -1, so a
+    player running late can drop steps that are already overridden. The final steps
+    (time 0) run once at the end.'''
+
+    __slots__ = ("name", "times", "targets", "values", "skip_to", "duration", "repeat", "final")
+
+    def __init__(self, name, steps, duration, repeat, final=()):
+        steps = sorted(steps, key=lambda step: step[0])
+        self.name = name
+        self.times = array("d", (t for t, _target, _value in steps))
+        self.targets = array("B", (target for _t, target, _value in steps))
+        self.values = array("B", (value for _t, _target, value in steps))
+        self.skip_to = array("l", [-1] * len(steps))
+        last = {}
+        for i in range(len(steps) - 1, -1, -1):
+            self.skip_to[i] = last.get(self.targets[i], -1)
+            last[self.targets[i]] = i
+        self.duration = duration
+        self.repeat = repeat
+        self.final = CompiledScene(name, final, 0, 1) if final else None
+
+    def __len__(self):
+        return len(self.times)
+
+    def uses(self, target):
+        index = TARGETS.index(target)
+        return index in self.targets or (self.final is not None and self.final.uses(target))
+
+    def step(self, i):
+        '''Return step i as (time, target name, value).'''
+        target = self.targets[i]
+        value = self.values[i] if target == KEYBOARD else LED_VALUES[self.values[i]]
+        return self.times[i], TARGETS[target], value
+
+
+def _number(value, what):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        raise ValueError(f"{what} must be a number of seconds, got {value!r}")
+    return float(value)
+
+
+def _keyboard_steps(track):
+    steps = []
+    previous = None
+    for entry in track:
+        if not isinstance(entry, list) or len(entry) not in (2, 3):
+            raise ValueError(f"Keyboard steps are [seconds, percent] or [seconds, percent, fade], got {entry!r}")
+        at = _number(entry[0], "Step time")
+        _target, percent = _step("keyboard", entry[1])
+        fade = _number(entry[2], "Fade time") if len(entry) == 3 else 0
+        count = int(fade / FADE_STEP)
+        if previous is not None and count > 1:
+            for n in range(1, count):
+                steps.append((at + n * FADE_STEP, round(previous + (percent - previous) * n / count)))
+            steps.append((at + fade, percent))
+        else:
+            steps.append((at + fade if previous is not None else at, percent))
+        previous = percent
+    return steps
+
+
+def _step(target, value):
+    '''Return (target code, value code) for one value.'''
+    if target not in TARGETS:
+        raise ValueError(f"Unknown scene target: {target} (expected one of {', '.join(TARGETS)})")
+    if target == "keyboard":
+        if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= 100:
+            raise ValueError(f"Keyboard brightness must be 0-100, got {value!r}")
+        return KEYBOARD, value
+    validate_led(target, value)
+    return TARGETS.index(target), LED_VALUES.index(value)
+
+
+def compile_scene(data, name=None):
+    '''Compile a scene dict into a CompiledScene. Raises ValueError if it is invalid.'''
+    if not isinstance(data, dict) or not isinstance(data.get("tracks"), dict):
+        raise ValueError("A scene needs a \"tracks\" object")
+    final = data.get("finally", {})
+    if not isinstance(final, dict):
+        raise ValueError("\"finally\" must map targets to values")
+    steps = []
+    for target, track in data["tracks"].items():
+        if target not in TARGETS:
+            raise ValueError(f"Unknown scene target: {target} (expected one of {', '.join(TARGETS)})")
+        if not isinstance(track, list):
+            raise ValueError(f"The {target} track must be a list of steps")
+        if target == "keyboard":
+            steps.extend((at, KEYBOARD, percent) for at, percent in _keyboard_steps(track))
+            continue
+        for entry in track:
+            if not isinstance(entry, list) or len(entry) != 2:
+                raise ValueError(f"LED steps are [seconds, value], got {entry!r}")
+            steps.append((_number(entry[0], "Step time"), *_step(target, entry[1])))
+    if not steps:
+        raise ValueError("The scene has no steps")
+    last = max(at for at, _target, _value in steps)
+    duration = _number(data.get("duration", last), "Scene duration")
+    if duration < last:
+        raise ValueError(f"The scene duration {duration}s is shorter than its last step at {last}s")
+    repeat = data.get("repeat", 1)
+    if isinstance(repeat, bool) or not isinstance(repeat, int) or repeat < 0:
+        raise ValueError(f"repeat must be a whole number, got {repeat!r}")
+    if repeat == 0 and duration == 0:
+        raise ValueError("A scene that repeats until stopped needs a duration")
+    if len(steps) > MAX_STEPS:
+        raise ValueError(f"The scene has {len(steps)} steps, the limit is {MAX_STEPS}")
+    final_steps = [(0.0, *_step(target, value)) for target, value in final.items()]
+    return CompiledScene(name or data.get("name") or "scene", steps, duration, repeat, final_steps)
+
+
+def _scene_dirs():
+    return SCENE_DIRS + (os.path.join(get_config_dir(), "scenes"),)
+
+
+def list_scenes():
+    '''Return {scene id: path} for the built-in and user scenes, user scenes taking precedence.'''
+    scenes = {}
+    for directory in _scene_dirs():
+        try:
+            filenames = sorted(os.listdir(directory))
+        except OSError:
+            continue
+        for filename in filenames:
+            if filename.endswith(".json"):
+                scenes[filename[:-len(".json")]] = os.path.join(directory, filename)
+    return scenes
+
+
+def load_scene(scene_id):
+    '''Return the scene dict for a scene id. Raises ValueError if it is unknown or unreadable.'''
+    path = list_scenes().get(scene_id)
+    if path is None:
+        raise ValueError(f"Unknown scene: {scene_id}")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        raise ValueError(f"Could not read scene {scene_id}: {e}") from e
+
+
+def play_scene(scene, output, stop=None, max_passes=None):
+    '''Play a CompiledScene on an output (EcOutput or FakeEC) until it ends or stop is set,
+    then apply its final steps. Scenes that repeat until stopped play at most max_passes
+    times when it is given. Returns the number of steps applied.'''
+    stop = stop or threading.Event()
+    prepared = output.prepare(scene)
+    final = output.prepare(scene.final) if scene.final is not None else ()
+    applied = 0
+    try:
+        applied = _play_passes(scene, output, prepared, stop, scene.repeat or max_passes or 0)
+    finally:
+        # Also when interrupted, e.g. Ctrl-C on a scene played in the foreground
+        for step in final:
+            output.apply(step)
+    return applied + len(final)
+
+
+def _play_passes(scene, output, prepared, stop, passes):
+    clock = getattr(output, "clock", time.monotonic)
+    wait = getattr(output, "wait", stop.wait)
+    times, skip_to, count = scene.times, scene.skip_to, len(scene)
+    applied = 0
+    start = clock()
+    n = 0
+    while not passes or n < passes:
+        offset = start + n * scene.duration
+        for i in range(count):
+            delay = offset + times[i] - clock()
+            if delay > 0 and wait(delay) or stop.is_set():
+                return applied
+            # Running late: the next step for this target is due already
+            if skip_to[i] >= 0 and offset + times[skip_to[i]] <= clock():
+                continue
+            output.apply(prepared[i])
+            applied += 1
+        n += 1
+        delay = start + n * scene.duration - clock()
+        if delay > 0 and wait(delay) or stop.is_set():
+            return applied
+    return applied
+
+
+class EcOutput:
+    '''Applies scene steps with ectool. The command for each step is built by prepare.
+    The keyboard backlight daemon runs as root, so ectool is run directly, one process per
+    step; pkexec is only added for a caller that is not root.
+    Scene values are transient, so they are not recorded as the LEDs' values.'''
+
+    def prepare(self, scene):
+        prefix = [] if os.geteuid() == 0 else ["pkexec"]
+        commands = []
+        for i in range(len(scene)):
+            _at, target, value = scene.step(i)
+            if target == "keyboard":
+                commands.append(prefix + ["/usr/bin/ectool", "pwmsetkblight", str(value)])
+            else:
+                commands.append(prefix + ["/usr/bin/ectool", "led", target, value])
+        return commands
+
+    def apply(self, command):
+        try:
+            subprocess.run(command, check=False, stdout=subprocess.DEVNULL, timeout=2)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            print(f"Scene step failed: {e}", file=sys.stderr)
+
+
+class FakeEC:
+    '''Records scene steps against a virtual clock instead of touching the hardware.
+    log holds (seconds from start, target, value) and state the last value per target.'''
+
+    def __init__(self):
+        self.now = 0.0
+        self.log = []
+        self.state = {}
+
+    def clock(self):
+        return self.now
+
+    def wait(self, timeout):
+        self.now += timeout
+        return False
+
+    def prepare(self, scene):
+        return [scene.step(i)[1:] for i in range(len(scene))]
+
+    def apply(self, step):
+        target, value = step
+        self.log.append((round(self.now, 6), target, value))
+        self.state[target] = value
+
+
+def dry_run(scene, max_passes=1):
+    '''Play a CompiledScene on a FakeEC and return it. Scenes that repeat until stopped
+    play max_passes times.'''
+    fake = FakeEC()
+    play_scene(scene, fake, max_passes=max_passes)
+    return fake
+
+
+def request_scene(data):
+    '''Play a scene dict in the framework service, replacing the scene playing there, or
+    stop it with None. The scene is compiled first so errors are reported here. Without the
+    service the scene plays in this process until it ends. Returns True on success.'''
+    scene = compile_scene(data) if data is not None else None
+    client = get_service_client()
+    if client is None:
+        if scene is None:
+            print("No scene to stop, scenes only keep playing in framework-app.service", file=sys.stderr)
+            return False
+        play_scene(scene, EcOutput())
+        return True
+    try:
+        client.call("scene.request", {"scene": data})
+        return True
+    except ServiceError as e:
+        print(f"Failed to send the scene to the service: {e}", file=sys.stderr)
+        return False
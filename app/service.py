@@ -0,0 +1,209 @@
+'''Framework Service Module
+The resident root daemon behind the app and framework-ctl, started by systemd as
+framework-app.service through tools/framework_service.py. It owns the hardware: it polls
+the hardware providers once for every client, records the history, runs the keyboard
+backlight patterns and the fan curve (previously two daemons started with pkexec), and
+applies changes requested by clients without asking for a password each time.
+Its settings, history and LED state are kept in /var/lib/framework-app, see
+helpers.SERVICE_STATE_DIR, never in a user's home.
+
+State and control are published on the system bus (see app.service_client for the
+interface). The snapshots are compared as JSON after each poll and only the ones that
+changed are sent, so idle clients cost nothing. Callers are limited to the ectool group
+by the bus policy installed by install.sh.
+'''
+
+import concurrent.futures
+import json
+import os
+import signal
+import sys
+import threading
+
+from app import cli
+from app.framework_model import get_framework_model
+from app.history import get_history_store
+from app.keyboard_backlight import KB_MODES
+from app.providers import (BatteryProvider, ExpansionCardsProvider, LedProvider, PowerProfilesProvider,
+                           ThermalsProvider)
+from app.scenes import compile_scene
+from app.settings import get_settings
+from app.service_client import BUS_NAME, ERROR_NAME, INTERFACE, INTERFACE_XML, OBJECT_PATH, thaw
+from app.privacy import get_privacy_monitor
+from app.usb_pd import get_uevent_monitor
+
+POLL_INTERVAL = 5  # seconds, the app's old update interval
+# framework-ctl methods clients may run as root through Call
+ALLOWED_METHODS = cli.SERVICE_METHODS | cli.SERVICE_READ_METHODS
+
+
+class FrameworkService:
+    '''Polls the providers and serves their snapshots and the framework-ctl methods on D-Bus.
+    Must be created and run on the thread running the GLib main loop.'''
+
+    def __init__(self, bus, model=None, interval=POLL_INTERVAL):
+        from app.tools.fan_curve_daemon import FanCurveDaemon
+        from app.tools.keyboard_backlight_daemon import KeyboardBacklightDaemon
+
+        # Clients in this process, such as the setters called by Call, use the hardware directly
+        os.environ["FRAMEWORK_NO_SERVICE"] = "1"
+        self.bus = bus
+        self.interval = interval
+        model = model or get_framework_model()
+        self.history = get_history_store()
+        self.providers = {
+            "power_profiles": PowerProfilesProvider(),
+            "battery": BatteryProvider(history=self.history),
+            "thermals": ThermalsProvider(history=self.history),
+            "expansion_cards": ExpansionCardsProvider(model.ports or 4, model.usb_ports, model.typec_ports),
+            "leds": LedProvider(),
+        }
+        self.snapshots = {}  # key -> JSON text of the last snapshot
+        self._lock = threading.Lock()
+        self._poller = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._workers = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        self._timer_id = None
+        self._registration_id = None
+
+        self.keyboard = KeyboardBacklightDaemon(handle_signals=False)
+        # Calls answered by the service itself rather than a framework-ctl method
+        self.methods = {"scene.request": self._request_scene}
+        # Start in the saved keyboard mode, the restore service leaves it to this daemon
+        mode = get_settings().get("keyboard.mode")
+        if mode in KB_MODES:
+            self.keyboard.mode = mode.lower()
+        self.fan = FanCurveDaemon(handle_signals=False)
+
+    def start(self):
+        from gi.repository import Gio, GLib
+        node = Gio.DBusNodeInfo.new_for_xml(INTERFACE_XML)
+        self._registration_id = self.bus.register_object(OBJECT_PATH, node.interfaces[0], self._on_method_call)
+        threading.Thread(target=self.keyboard.run, name="keyboard-backlight", daemon=True).start()
+        threading.Thread(target=self.fan.run, name="fan-curve", daemon=True).start()
+        self._poller.submit(self._poll)
+        self._timer_id = GLib.timeout_add_seconds(self.interval, self._on_timer)
+        # USB-C plugs and the camera and microphone turning on are sent right away
+        if get_uevent_monitor() is not None:
+            get_uevent_monitor().add_listener(self._on_hardware_event)
+        get_privacy_monitor().add_listener(self._on_hardware_event)
+
+    def stop(self):
+        from gi.repository import GLib
+        if self._timer_id is not None:
+            GLib.source_remove(self._timer_id)
+            self._timer_id = None
+        if self._registration_id is not None:
+            self.bus.unregister_object(self._registration_id)
+            self._registration_id = None
+        if get_uevent_monitor() is not None:
+            get_uevent_monitor().remove_listener(self._on_hardware_event)
+        get_privacy_monitor().remove_listener(self._on_hardware_event)
+        self.keyboard.stop()
+        self.fan.stop()
+        self._poller.shutdown(wait=True)
+        self._workers.shutdown(wait=True)
+        self.history.close()
+
+    def _on_timer(self):
+        self._poller.submit(self._poll)
+        return True
+
+    def _on_hardware_event(self):
+        # Called from the monitor threads, only the expansion cards need polling
+        self._poller.submit(self._poll, ("expansion_cards",))
+
+    def _poll(self, keys=None):
+        '''Poll the providers, or only those in keys, on the poller thread and emit the
+        snapshots that changed.'''
+        changed = {}
+        for key, provider in self.providers.items():
+            if keys is not None and key not in keys:
+                continue
+            try:
+                snapshot = json.dumps(thaw(provider.poll()))
+            except (NotImplementedError, AttributeError, RuntimeError, TypeError, ValueError) as e:
+                print(f"Error polling {key}: {e}", file=sys.stderr)
+                continue
+            with self._lock:
+                if self.snapshots.get(key) != snapshot:
+                    self.snapshots[key] = snapshot
+                    changed[key] = snapshot
+        if keys is None:
+            self.history.commit()
+        if changed:
+            from gi.repository import GLib
+            GLib.idle_add(self._emit_changed, changed)
+
+    def _emit_changed(self, changed):
+        from gi.repository import GLib
+        payload = "{" + ",".join(f"{json.dumps(key)}:{snapshot}" for key, snapshot in changed.items()) + "}"
+        self.bus.emit_signal(None, OBJECT_PATH, INTERFACE, "SnapshotsChanged", GLib.Variant("(s)", (payload,)))
+        return False
+
+    def get_snapshots(self):
+        with self._lock:
+            return "{" + ",".join(f"{json.dumps(key)}:{snapshot}" for key, snapshot in self.snapshots.items()) + "}"
+
+    def _on_method_call(self, _bus, _sender, _path, _interface, method, params, invocation):
+        from gi.repository import GLib
+        if method == "GetSnapshots":
+            invocation.return_value(GLib.Variant("(s)", (self.get_snapshots(),)))
+        elif method == "Call":
+            name, params_json = params.unpack()
+            # Setters block on ectool, answer from a worker so polling and signals keep going
+            self._workers.submit(self._run_call, name, params_json, invocation)
+        else:
+            invocation.return_dbus_error(ERROR_NAME, f"Unknown method: {method}")
+
+    def _run_call(self, name, params_json, invocation):
+        from gi.repository import GLib
+        try:
+            if name not in ALLOWED_METHODS and name not in self.methods:
+                raise KeyError(f"Method not allowed through the service: {name}")
+            params = json.loads(params_json)
+            if not isinstance(params, dict):
+                raise ValueError("params must be a JSON object")
+            # Not cli.call, its stdout redirect is global and the workers run calls concurrently
+            result = (self.methods.get(name) or cli.METHODS[name])(**params)
+        except (KeyError, TypeError, ValueError, cli.CommandError, OSError) as e:
+            invocation.return_dbus_error(ERROR_NAME, str(e.args[0] if isinstance(e, KeyError) and e.args else e))
+            return
+        invocation.return_value(GLib.Variant("(s)", (json.dumps(result),)))
+        if name == "led.set":
+            # The LED provider only re-reads the state file set_led wrote every RESYNC_INTERVAL
+            self.providers["leds"].resync(force=True)
+        # Show the change to every client right away instead of at the next poll
+        self._poller.submit(self._poll)
+
+
+    def _request_scene(self, scene=None):
+        '''Play a scene dict in the keyboard backlight daemon, or stop the one playing with None.'''
+        self.keyboard.request_scene(compile_scene(scene) if scene is not None else None)
+        return True
+
+
+def run():
+    '''Own BUS_NAME on the system bus and serve until SIGTERM or SIGINT.'''
+    from gi.repository import Gio, GLib
+    loop = GLib.MainLoop()
+    state = {}
+
+    def on_bus_acquired(bus, _name):
+        state["service"] = FrameworkService(bus)
+        state["service"].start()
+
+    def on_name_lost(_bus, _name):
+        print(f"Could not own {BUS_NAME}, is another instance running?", file=sys.stderr)
+        loop.quit()
+
+    owner_id = Gio.bus_own_name(Gio.BusType.SYSTEM, BUS_NAME, Gio.BusNameOwnerFlags.NONE,
+                                on_bus_acquired, None, on_name_lost)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signum, loop.quit)
+    try:
+        loop.run()
+    finally:
+        Gio.bus_unown_name(owner_id)
+        if "service" in state:
+            state["service"].stop()
+    return 0
@@ -0,0 +1,151 @@
+'''Service Client Module
+Client side of the framework-app service (app/service.py), the resident root daemon that
+polls the hardware for every UI and applies changes. It is reached on the system bus as
+BUS_NAME. The app and framework-ctl use it when it is running and fall back to reading
+and setting the hardware themselves when it is not.
+
+The service publishes the providers' snapshots as JSON: GetSnapshots() returns all of
+them and the SnapshotsChanged signal carries the ones that changed after each poll. Call()
+runs a framework-ctl method (see app.cli.METHODS) as root, or "scene.request", which plays
+a scene in the service's keyboard backlight daemon. Set FRAMEWORK_NO_SERVICE=1 to
+ignore the service. GLib is only imported when the service is used, this module does not
+use GTK.
+'''
+
+import json
+import os
+import sys
+import threading
+
+BUS_NAME = "org.frameworkapp.Control1"
+OBJECT_PATH = "/org/frameworkapp/Control1"
+INTERFACE = BUS_NAME
+ERROR_NAME = f"{INTERFACE}.Error"
+CALL_TIMEOUT_MS = 30000  # pkexec-free, but ectool and tuned-adm can take a few seconds
+
+INTERFACE_XML = f'''
+<node>
+  <interface name="{INTERFACE}">
+    <method name="GetSnapshots">
+      <arg type="s" name="snapshots" direction="out"/>
+    </method>
+    <method name="Call">
+      <arg type="s" name="method" direction="in"/>
+      <arg type="s" name="params" direction="in"/>
+      <arg type="s" name="result" direction="out"/>
+    </method>
+    <signal name="SnapshotsChanged">
+      <arg type="s" name="snapshots"/>
+    </signal>
+  </interface>
+</node>
+'''
+
+
+class ServiceError(Exception):
+    '''The service could not be reached or the call failed there.'''
+
+
+def thaw(value):
+    '''Return a JSON-serialisable copy of a frozen snapshot, the reverse of widget.freeze.'''
+    if hasattr(value, "items"):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(v) for v in value]
+    return value
+
+
+class ServiceClient:
+    '''Connection to the running service.'''
+
+    def __init__(self, bus):
+        self.bus = bus
+
+    @classmethod
+    def connect(cls):
+        '''Return a ServiceClient, or None if the service is not running.'''
+        from gi.repository import Gio, GLib
+        try:
+            bus = Gio.bus_get_sync(Gio.BusType.SYSTEM, None)
+            reply = bus.call_sync("org.freedesktop.DBus", "/org/freedesktop/DBus", "org.freedesktop.DBus",
+                                  "NameHasOwner", GLib.Variant("(s)", (BUS_NAME,)), GLib.VariantType("(b)"),
+                                  Gio.DBusCallFlags.NONE, 1000, None)
+        except GLib.Error:
+            return None
+        return cls(bus) if reply.unpack()[0] else None
+
+    def _call(self, member, args, signature):
+        from gi.repository import Gio, GLib
+        try:
+            reply = self.bus.call_sync(BUS_NAME, OBJECT_PATH, INTERFACE, member, GLib.Variant(signature, args),
+                                       GLib.VariantType("(s)"), Gio.DBusCallFlags.NONE, CALL_TIMEOUT_MS, None)
+        except GLib.Error as e:
+            raise ServiceError(Gio.DBusError.strip_remote_error(e) or e.message) from None
+        return json.loads(reply.unpack()[0])
+
+    def get_snapshots(self):
+        '''Return {provider key: snapshot} as last polled by the service.'''
+        return self._call("GetSnapshots", (), "()")
+
+    def call(self, method, params=None):
+        '''Run a framework-ctl method in the service and return its result. Raises ServiceError.'''
+        return self._call("Call", (method, json.dumps(params or {})), "(ss)")
+
+    def subscribe(self, callback):
+        '''Call callback({provider key: snapshot}) from the main context whenever snapshots
+        change. Returns the subscription ID.'''
+        from gi.repository import Gio
+
+        def on_signal(_bus, _sender, _path, _interface, _signal, params):
+            try:
+                callback(json.loads(params.unpack()[0]))
+            except ValueError as e:
+                print(f"Ignoring malformed snapshots from the service: {e}", file=sys.stderr)
+
+        return self.bus.signal_subscribe(BUS_NAME, INTERFACE, "SnapshotsChanged", OBJECT_PATH, None,
+                                         Gio.DBusSignalFlags.NONE, on_signal)
+
+
+_client = None
+_client_checked = False
+_client_lock = threading.Lock()
+
+def get_service_client():
+    '''Return the shared ServiceClient, or None if the service is not running or is disabled.'''
+    global _client, _client_checked
+    with _client_lock:
+        if not _client_checked:
+            _client_checked = True
+            if not os.environ.get("FRAMEWORK_NO_SERVICE"):
+                try:
+                    _client = ServiceClient.connect()
+                except ImportError:
+                    _client = None
+        return _client
+
+
+def call_hardware(method, params, local):
+    '''Apply a change through the service when it runs, otherwise by calling local().
+    params are the framework-ctl method's. Returns True on success, like the library setters.'''
+    client = get_service_client()
+    if client is None:
+        return bool(local())
+    try:
+        client.call(method, params)
+        return True
+    except ServiceError as e:
+        print(f"{method} failed: {e}", file=sys.stderr)
+        return False
+
+
+def query_hardware(method, params, local):
+    '''Return the result of a framework-ctl read method from the service when it runs,
+    otherwise local(). Returns None if the service call fails.'''
+    client = get_service_client()
+    if client is None:
+        return local()
+    try:
+        return client.call(method, params)
+    except ServiceError as e:
+        print(f"{method} failed: {e}", file=sys.stderr)
+        return None
@@ -0,0 +1,274 @@
+'''Settings Store Module
+The values chosen in the app or framework-ctl that should survive a reboot: LED colours,
+keyboard brightness and mode, power profile, sleep mode and charge limit. They are kept in
+~/.config/framework-app/settings.json as flat keys such as "leds.left" and
+"keyboard.brightness", and replaced the earlier charge_limit.json. Changes made by the root
+service are kept in SERVICE_SETTINGS_FILE instead, root never writes into a user's home.
+Users read both files, values from the most recently written one win.
+
+set() only marks the store dirty when a value actually changes, and the file is written
+DEBOUNCE seconds after the last change (write-temp-then-rename), so dragging a slider
+writes once. Pending changes are flushed at exit.
+
+restore_plan() turns the settings into the commands and sysfs writes that re-apply them,
+and tools/restore_settings.py runs the plan as root, from the framework-app-restore
+oneshot service at boot or once through pkexec, instead of one pkexec per setting.
+This module does not use GTK.
+'''
+
+import atexit
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+
+from app.helpers import SERVICE_STATE_DIR, get_config_dir, get_installed_tool, get_sysfs_path
+
+SETTINGS_FILE = "settings.json"
+LEGACY_CHARGE_LIMIT_FILE = "charge_limit.json"
+SERVICE_SETTINGS_FILE = os.path.join(SERVICE_STATE_DIR, SETTINGS_FILE)  # Written by the service
+DEBOUNCE = 1.0  # seconds after the last change before writing
+RESTORED_FILE = "/run/framework-app/restored.json"  # Values applied at boot, readable by the app
+RESTORE_TOOL = get_installed_tool("restore_settings.py")
+ECTOOL = "/usr/bin/ectool"
+
+
+class SettingsStore:
+    '''Flat key/value settings saved as JSON, written atomically and only after changes.'''
+
+    def __init__(self, path=None, debounce=DEBOUNCE, service_path=None):
+        '''service_path: the service's settings file, whose values win when it was written
+        more recently than path. Only path is written.'''
+        self.path = path if path is not None else os.path.join(get_config_dir(), SETTINGS_FILE)
+        self.service_path = service_path
+        self.debounce = debounce
+        self._lock = threading.Lock()
+        self._values = {}
+        self._dirty = False
+        self._timer = None
+        self._load()
+
+    def _load(self):
+        paths = [self.path] if self.service_path is None else [self.path, self.service_path]
+        self._values = read_settings_files(paths)
+        self._import_legacy()
+
+    def _import_legacy(self):
+        # The charge limit used to have a file of its own next to settings.json
+        legacy = os.path.join(os.path.dirname(self.path), LEGACY_CHARGE_LIMIT_FILE)
+        try:
+            with open(legacy, "r", encoding="utf-8") as f:
+                limit = json.load(f).get("limit")
+        except (OSError, ValueError, AttributeError):
+            return
+        if "charge_limit" not in self._values and isinstance(limit, int):
+            self._values["charge_limit"] = limit
+            self._dirty = True
+            self.flush()
+        if not self._dirty:
+            try:
+                os.remove(legacy)
+            except OSError:
+                pass
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._values.get(key, default)
+
+    def values(self):
+        '''Return a copy of all settings.'''
+        with self._lock:
+            return dict(self._values)
+
+    def set(self, key, value):
+        '''Set a value, scheduling a write if it changed. None removes the key.'''
+        with self._lock:
+            if self._values.get(key) == value and (value is not None or key not in self._values):
+                return
+            if value is None:
+                del self._values[key]
+            else:
+                self._values[key] = value
+            self._dirty = True
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.debounce, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        '''Write the settings now if they changed since the last write.'''
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+            data = json.dumps(self._values, indent=2, sort_keys=True)
+            self._dirty = False
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Failed to save settings: {e}", file=sys.stderr)
+            with self._lock:
+                self._dirty = True
+
+
+def read_settings_file(path):
+    '''Return the settings dict saved in path, {} if there is none.'''
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            values = json.load(f)
+        if isinstance(values, dict):
+            return values
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        print(f"Warning: Ignoring unreadable settings file: {e}", file=sys.stderr)
+    return {}
+
+
+def read_settings_files(paths):
+    '''Return the settings saved in several files merged, values from the most recently
+    written file win.'''
+    def written(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return 0
+    values = {}
+    for path in sorted(paths, key=written):
+        values.update(read_settings_file(path))
+    return values
+
+
+_settings = None
+_settings_lock = threading.Lock()
+
+def get_settings():
+    '''Return the shared SettingsStore, flushed at exit.'''
+    global _settings
+    with _settings_lock:
+        if _settings is None:
+            # The service's own store is SERVICE_SETTINGS_FILE, see get_config_dir
+            _settings = SettingsStore(service_path=None if os.geteuid() == 0 else SERVICE_SETTINGS_FILE)
+            atexit.register(_settings.flush)
+        return _settings
+
+
+def read_restored_values():
+    '''Return the settings applied by the restore service during this boot, or {}.'''
+    try:
+        with open(RESTORED_FILE, "r", encoding="utf-8") as f:
+            values = json.load(f)
+        return values if isinstance(values, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+# Restore
+
+def restore_plan(values):
+    '''Return the steps that re-apply settings as root, in order. Each step is
+    (key, alternatives), and each alternative either ("write", path, text) or
+    ("run", argv); the first alternative that succeeds is used. Invalid values are skipped,
+    the settings file is writable by the user but the plan runs as root.'''
+    # Imported here so the restore tool only loads what it needs
+    from app.charge_limit import SUSTAIN_WINDOW, get_threshold_path, validate_charge_limit
+    from app.keyboard_backlight import KB_MODES
+    from app.led_control import LED_NAMES, validate_led
+    from app.power_profiles import SLEEP_MODES
+
+    plan = []
+    limit = values.get("charge_limit")
+    try:
+        limit = validate_charge_limit(limit) if limit is not None else None
+    except ValueError:
+        limit = None
+    if limit is not None:
+        alternatives = []
+        threshold = get_threshold_path()
+        if threshold:
+            alternatives.append(("write", threshold, str(limit)))
+        alternatives.append(("run", [ECTOOL, "fwchargelimit", str(limit)]))
+        alternatives.append(("run", [ECTOOL, "chargecontrol", "normal", str(max(limit - SUSTAIN_WINDOW, 0)), str(limit)]))
+        plan.append(("charge_limit", alternatives))
+
+    if values.get("sleep_mode") in SLEEP_MODES:
+        plan.append(("sleep_mode", [("write", get_sysfs_path("power", "mem_sleep"), values["sleep_mode"])]))
+
+    profile = values.get("power_profile")
+    if isinstance(profile, str) and re.fullmatch(r"[A-Za-z0-9_.-]+", profile):
+        plan.append(("power_profile", [("run", ["powerprofilesctl", "set", profile]),
+                                       ("run", ["tuned-adm", "profile", profile])]))
+
+    for name in LED_NAMES:
+        value = values.get(f"leds.{name}")
+        try:
+            validate_led(name, value)
+        except ValueError:
+            continue
+        if value != "auto":  # The EC starts in auto
+            plan.append((f"leds.{name}", [("run", [ECTOOL, "led", name, value])]))
+
+    # The other keyboard modes run a pattern, restored by the framework service when it starts
+    # it. Root does not write the user's mode file.
+    manual = values.get("keyboard.mode") not in KB_MODES or values.get("keyboard.mode") == "Manual"
+    brightness = values.get("keyboard.brightness")
+    if manual and isinstance(brightness, int) and not isinstance(brightness, bool) and 0 <= brightness <= 100:
+        plan.append(("keyboard.brightness", [("run", [ECTOOL, "pwmsetkblight", str(brightness)])]))
+    return plan
+
+
+def _apply_step(step):
+    if step[0] == "write":
+        _kind, path, text = step
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return
+    subprocess.run(step[1], check=True, capture_output=True, timeout=10)
+
+
+def apply_plan(plan):
+    '''Run a restore plan. Returns (applied keys, {failed key: error}).'''
+    applied, failed = [], {}
+    for key, alternatives in plan:
+        for step in alternatives:
+            try:
+                _apply_step(step)
+            except (OSError, subprocess.SubprocessError) as e:
+                failed[key] = str(e)
+                continue
+            applied.append(key)
+            failed.pop(key, None)
+            break
+    return applied, failed
+
+
+def format_step(step):
+    if step[0] == "write":
+        return f"write {step[2]} > {step[1]}"
+    return " ".join(step[1])
+
+
+def restore_settings():
+    '''Re-apply the saved settings in one privileged session. Returns {"applied": keys,
+    "failed": {key: error}}. Runs the plan directly as root, otherwise through a single
+    pkexec of the restore tool.'''
+    store = get_settings()
+    store.flush()
+    if os.geteuid() == 0:
+        applied, failed = apply_plan(restore_plan(store.values()))
+        return {"applied": applied, "failed": failed}
+    result = subprocess.run(["pkexec", "/usr/bin/python3", "-I", RESTORE_TOOL, "--settings", store.path,
+                             "--settings", SERVICE_SETTINGS_FILE, "--json"],
+                            capture_output=True, text=True, check=False)
+    try:
+        return json.loads(result.stdout)
+    except ValueError:
+        raise OSError(f"Restoring settings failed: {result.stderr.strip() or result.returncode}") from None
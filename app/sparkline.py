@@ -0,0 +1,54 @@
+'''Sparkline Module
+A small Cairo line of recent values, drawn from a tuple of samples (oldest first).
+Unlike HistoryGraph it has no axes or time scale, one point per sample.
+'''
+
+import math
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import Gtk
+
+
+class Sparkline(Gtk.DrawingArea):
+    '''A line of the last `size` values, scaled to y_range or to the largest value.'''
+
+    def __init__(self, size, color=(0.2, 0.6, 1.0), y_range=None, width=120, height=24):
+        super().__init__()
+        self.set_size_request(width, height)
+        self.size = size
+        self.color = color
+        self.y_range = y_range
+        self.values = ()
+        self.connect("draw", self._on_draw)
+
+    def set_values(self, values):
+        if values != self.values:
+            self.values = values
+            self.queue_draw()
+
+    def _on_draw(self, _widget, cr):
+        width, height = self.get_allocated_width(), self.get_allocated_height()
+        finite = [v for v in self.values if not math.isnan(v)]
+        if len(finite) < 2:
+            return False
+        low, high = self.y_range if self.y_range else (0, max(finite) or 1)
+        step = (width - 2) / (self.size - 1)
+        # Right-align so the newest sample is always at the right edge
+        x = width - 1 - (len(self.values) - 1) * step
+        scale = (height - 2) / (high - low)
+        started = False
+        cr.set_line_width(1.5)
+        cr.set_source_rgb(*self.color)
+        for value in self.values:
+            if math.isnan(value):
+                started = False
+            else:
+                y = height - 1 - (min(max(value, low), high) - low) * scale
+                if started:
+                    cr.line_to(x, y)
+                else:
+                    cr.move_to(x, y)
+                    started = True
+            x += step
+        cr.stroke()
+        return False
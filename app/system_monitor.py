@@ -0,0 +1,204 @@
+'''System Monitor Module
+Live CPU load, per-core frequency, memory use and pressure stall (PSI) readings.
+Counters from /proc/stat and /proc/pressure are turned into rates from the difference
+between two samples. Every file is kept open and read with pread into a buffer allocated
+once, and parsed with bytes operations instead of regex, so a sample takes well under
+a millisecond and can run every second on battery.
+Recent samples are kept in fixed-size arrays for the sparklines in the Stats tab.
+'''
+
+import array
+import math
+import os
+import threading
+import time
+
+from app.helpers import get_procfs_path, get_sysfs_path
+
+HISTORY_SIZE = 60  # Samples kept for the sparklines, one per second
+PSI_RESOURCES = ("cpu", "memory", "io")
+SERIES = ("cpu", "freq", "mem", "psi_cpu", "psi_memory", "psi_io")
+# First 8 /proc/stat columns: user nice system idle iowait irq softirq steal.
+# guest and guest_nice are already counted in user and nice.
+STAT_FIELDS = 8
+
+
+class ProcFile:
+    '''A /proc or /sys file kept open and read into a preallocated buffer.'''
+
+    def __init__(self, path, size=4096):
+        self.path = path
+        self._buffer = bytearray(size)
+        self._view = memoryview(self._buffer)
+        try:
+            self.fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+        except OSError:
+            self.fd = None
+
+    def read(self):
+        '''Return the contents as a memoryview of the buffer, valid until the next read, or None.'''
+        if self.fd is None:
+            return None
+        try:
+            length = os.preadv(self.fd, [self._buffer], 0)
+            while length == len(self._buffer):
+                # Too small, e.g. /proc/stat with many cores. Grow once and keep the new size.
+                self._buffer = bytearray(len(self._buffer) * 2)
+                self._view = memoryview(self._buffer)
+                length = os.preadv(self.fd, [self._buffer], 0)
+        except OSError:
+            return None
+        return self._view[:length]
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def parse_cpu_times(data):
+    '''Return (busy, total) jiffies from the aggregate "cpu" line of /proc/stat, or None.'''
+    if data is None:
+        return None
+    # The line is short, copy only its start out of the buffer
+    line = bytes(data[:256]).split(b"\n", 1)[0]
+    if not line.startswith(b"cpu "):
+        return None
+    times = [int(field) for field in line.split()[1:STAT_FIELDS + 1]]
+    total = sum(times)
+    # idle + iowait
+    return total - times[3] - (times[4] if len(times) > 4 else 0), total
+
+
+def parse_psi_total(data):
+    '''Return the "some" stall total in microseconds from a /proc/pressure file, or None.'''
+    if data is None:
+        return None
+    line = bytes(data).split(b"\n", 1)[0]
+    start = line.rfind(b"total=")
+    if not line.startswith(b"some") or start < 0:
+        return None
+    return int(line[start + 6:])
+
+
+def parse_meminfo(data):
+    '''Return (total, available) in kB from /proc/meminfo, or None.'''
+    if data is None:
+        return None
+    text = bytes(data)
+    values = []
+    for key in (b"MemTotal:", b"MemAvailable:"):
+        start = text.find(key)
+        if start < 0:
+            return None
+        end = text.find(b"kB", start)
+        values.append(int(text[start + len(key):end]))
+    return values[0], values[1]
+
+
+def discover_cpufreq(root=None):
+    '''Return a ProcFile for each core's scaling_cur_freq, in CPU order.'''
+    root = root or get_sysfs_path("devices", "system", "cpu")
+    try:
+        names = [name for name in os.listdir(root) if name.startswith("cpu") and name[3:].isdigit()]
+    except OSError:
+        return []
+    files = []
+    for name in sorted(names, key=lambda name: int(name[3:])):
+        path = os.path.join(root, name, "cpufreq", "scaling_cur_freq")
+        if os.path.exists(path):
+            files.append(ProcFile(path, 32))
+    return files
+
+
+class SystemMonitor:
+    '''Samples CPU, frequency, memory and PSI at most once per max_age and keeps the recent history.'''
+
+    def __init__(self, max_age=0.9, size=HISTORY_SIZE):
+        self.max_age = max_age
+        self.size = size
+        self._stat = ProcFile(get_procfs_path("stat"))
+        self._meminfo = ProcFile(get_procfs_path("meminfo"))
+        self._pressure = {name: ProcFile(get_procfs_path("pressure", name), 256) for name in PSI_RESOURCES}
+        self._cpufreq = discover_cpufreq()
+        self._series = {name: array.array("d", [math.nan]) * size for name in SERIES}
+        self._next = 0  # Ring index of the next sample
+        self._count = 0
+        self._lock = threading.Lock()
+        self._previous = None  # (time, cpu times, psi totals) of the last sample
+        self._snapshot = None
+        self._snapshot_time = 0
+
+    def sample(self):
+        '''Return the current readings as a dict, taking a new sample if the last is older than max_age.
+        Rates (cpu_percent and psi) are None until there are two samples.'''
+        with self._lock:
+            now = time.monotonic()
+            if self._snapshot is not None and now - self._snapshot_time < self.max_age:
+                return self._snapshot
+            cpu_times = parse_cpu_times(self._stat.read())
+            psi_totals = {name: parse_psi_total(f.read()) for name, f in self._pressure.items()}
+            core_freqs = []
+            for f in self._cpufreq:
+                data = f.read()
+                if data:
+                    core_freqs.append(int(bytes(data)) // 1000)
+            meminfo = parse_meminfo(self._meminfo.read())
+
+            cpu_percent = None
+            psi = dict.fromkeys(PSI_RESOURCES)
+            if self._previous is not None:
+                elapsed = now - self._previous[0]
+                last_cpu, last_psi = self._previous[1], self._previous[2]
+                if cpu_times and last_cpu and cpu_times[1] > last_cpu[1]:
+                    cpu_percent = 100 * (cpu_times[0] - last_cpu[0]) / (cpu_times[1] - last_cpu[1])
+                for name, total in psi_totals.items():
+                    if total is not None and last_psi[name] is not None and elapsed > 0:
+                        # Microseconds stalled per second elapsed, as a percentage
+                        psi[name] = min(100.0, (total - last_psi[name]) / (elapsed * 1e4))
+            self._previous = (now, cpu_times, psi_totals)
+
+            snapshot = {
+                "cpu_percent": cpu_percent,
+                "core_freqs": core_freqs,
+                "freq_mhz": sum(core_freqs) // len(core_freqs) if core_freqs else None,
+                "freq_max_mhz": max(core_freqs) if core_freqs else None,
+                "mem_total_kb": meminfo[0] if meminfo else None,
+                "mem_percent": 100 * (1 - meminfo[1] / meminfo[0]) if meminfo else None,
+                "psi": psi,
+            }
+            self._append(cpu_percent, snapshot["freq_mhz"], snapshot["mem_percent"],
+                         psi["cpu"], psi["memory"], psi["io"])
+            self._snapshot = snapshot
+            self._snapshot_time = now
+            return snapshot
+
+    def _append(self, *values):
+        index = self._next
+        for name, value in zip(SERIES, values):
+            self._series[name][index] = math.nan if value is None else value
+        self._next = (index + 1) % self.size
+        self._count = min(self._count + 1, self.size)
+
+    def series(self, name):
+        '''Return the recent values of one series, oldest first. Missing readings are NaN.'''
+        with self._lock:
+            column = self._series[name]
+            start = (self._next - self._count) % self.size
+            if start + self._count <= self.size:
+                return tuple(column[start:start + self._count])
+            return tuple(column[start:]) + tuple(column[:self._next])
+
+    def close(self):
+        for f in [self._stat, self._meminfo, *self._pressure.values(), *self._cpufreq]:
+            f.close()
+
+
+_monitor = None
+
+def get_system_monitor():
+    '''Return the shared SystemMonitor.'''
+    global _monitor
+    if _monitor is None:
+        _monitor = SystemMonitor()
+    return _monitor
@@ -1,159 +1,103 @@
 '''System Stats Widget Module
 This module defines a widget for displaying CPU, memory, storage, and graphics stats.
-It inherits from Gtk.Box and implements the WidgetTemplate interface.
+It inherits from Gtk.Box and implements the WidgetTemplate interface, the stats are
+gathered by SystemStatsProvider. While the tab is shown, live readings are sampled
+every second and drawn as sparklines.
 '''
 
-import os
-import re
-import psutil
-import platform
-from gi.repository import Gtk
-from PIL import Image, ImageDraw, ImageFont
+from gi.repository import Gtk, GLib
 from app.widget import WidgetTemplate
+from app.providers import SystemStatsProvider
+from app.sparkline import Sparkline
+from app.system_monitor import HISTORY_SIZE
+
+SAMPLE_INTERVAL_MS = 1000
+
+# (series, title, color, y range or None to scale to the largest value)
+LIVE_ROWS = (
+    ("cpu", "CPU load", (0.2, 0.6, 1.0), (0, 100)),
+    ("freq", "Frequency", (0.6, 0.4, 0.9), None),
+    ("mem", "Memory used", (0.2, 0.7, 0.3), (0, 100)),
+    ("psi_cpu", "CPU pressure", (0.9, 0.4, 0.1), (0, 100)),
+    ("psi_memory", "Memory pressure", (0.9, 0.6, 0.1), (0, 100)),
+    ("psi_io", "IO pressure", (0.8, 0.2, 0.2), (0, 100)),
+)
 
 class SystemStatsWidget(Gtk.Box, WidgetTemplate):
     '''A widget to display CPU, memory, storage, and graphics stats.'''
 
     def __init__(self, model=None, image_size=(500, 710)):
         Gtk.Box.__init__(self, orientation=Gtk.Orientation.VERTICAL, spacing=10)
-        WidgetTemplate.__init__(self)
+        WidgetTemplate.__init__(self, SystemStatsProvider(model, image_size))
         self.label = Gtk.Label(label="System Stats")
-        Gtk.Box.pack_start(self, self.label, True, True, 0)
-        self.data = None
-        self.model = model
-        self.image_size = image_size
-
-
-        stats = self.get_system_stats()
-        overlay_path = self.get_os_overlay_path()
-        self.data = {
-            "stats": stats,
-            "image_size": self.image_size,
-            "overlays": [
-                {"name": "os", "path": overlay_path, "color": None}
-            ]
-        }
+        Gtk.Box.pack_start(self, self.label, False, False, 0)
 
-        if self.data:
-            stats = self.data['stats']
-            cpu = getattr(self.model, 'cpu', 'Unknown') if self.model else 'Unknown'
-            text = (f"CPU: {cpu}\n"
-                    f"Graphics: {stats['graphics']}\n"
-                    f"Memory: {stats['memory']}\n"
-                    f"Storage: {stats['storage']}\n")
-            self.label.set_text(text)
-        else:
-            self.label.set_text("System Stats\nNo data yet.")
+        grid = Gtk.Grid(column_spacing=10, row_spacing=4, halign=Gtk.Align.CENTER)
+        self.sparklines = {}
+        self.value_labels = {}
+        for row, (series, title, color, y_range) in enumerate(LIVE_ROWS):
+            grid.attach(Gtk.Label(label=title, xalign=0), 0, row, 1, 1)
+            self.sparklines[series] = Sparkline(HISTORY_SIZE, color=color, y_range=y_range)
+            grid.attach(self.sparklines[series], 1, row, 1, 1)
+            self.value_labels[series] = Gtk.Label(label="–", xalign=1, width_chars=12)
+            grid.attach(self.value_labels[series], 2, row, 1, 1)
+        Gtk.Box.pack_start(self, grid, False, False, 0)
+
+        # Sample at 1 Hz only while the tab is on screen, the update loop covers the rest
+        self._timer_id = None
+        self.connect("map", self._on_map)
+        self.connect("unmap", self._on_unmap)
+
+        # The static stats are read once up front
+        self.update()
+        self.update_visual()
 
-        
-    def update(self):
-        '''Update method called by ui.py'''
-
-    def get_os_overlay_path(self):
-        '''Return the path to a distro/OS-specific overlay image, generating a 500x710 PNG with the logo at 50%x25%.'''
-        system = platform.system().lower()
-        overlay_dir = os.path.join(os.path.dirname(__file__), './assets/overlays')
-        if system == 'linux':
-            distro = self.get_linux_distro()
-            distro_map = {
-                'fedora': 'os-fedora.png',
-                'arch': 'os-arch.png',
-                'ubuntu': 'os-ubuntu.png',
-                'debian': 'os-debian.png',
-                'manjaro': 'os-manjaro.png',
-                'pop': 'os-pop.png',
-                'opensuse': 'os-opensuse.png',
-                'elementary': 'os-elementary.png',
-                'mint': 'os-mint.png',
-            }
-            filename = None
-            for key, fname in distro_map.items():
-                if key in distro:
-                    filename = fname
-                    break
-            if not filename:
-                filename = 'os-linux.png'
-        elif system == 'windows':
-            filename = 'os-windows.png'
-        elif system == 'darwin':
-            filename = 'os-macos.png'
-        else:
-            filename = 'os-unknown.png'
-        logo_path = os.path.abspath(os.path.join(overlay_dir, filename))
-        out_path = os.path.abspath(os.path.join(overlay_dir, f'os-overlay-{filename}'))
-        # Generate overlay if not present
-        if not os.path.exists(out_path):
-            self.generate_logo_overlay(logo_path, out_path, (500, 710))
-        return f"overlays/{os.path.basename(out_path)}"
-
-    def generate_logo_overlay(self, logo_path, out_path, size):
-        '''Create a transparent PNG of given size with the logo centered at 50%x25%.'''
-        width, height = size
-        try:
-            base = Image.new('RGBA', (width, height), (0, 0, 0, 0))
-            if os.path.exists(logo_path):
-                logo = Image.open(logo_path).convert('RGBA')
-                # Resize logo to fit nicely (e.g., 128x128 or 20% of width)
-                max_logo_w = int(width * 0.2)
-                max_logo_h = int(height * 0.2)
-                logo.thumbnail((max_logo_w, max_logo_h), Image.LANCZOS)
-                logo_w, logo_h = logo.size
-                x = int(width * 0.5 - logo_w / 2)
-                y = int(height * 0.25 - logo_h / 2)
-                base.paste(logo, (x, y), logo)
-            base.save(out_path)
-        except Exception as e:
-            print(f"Failed to generate overlay: {e}")
-
-    def get_linux_distro(self):
-        '''Detect Linux distribution name (lowercase, no spaces).'''
-        try:
-            # Try /etc/os-release (most modern distros)
-            with open('/etc/os-release', 'r') as f:
-                for line in f:
-                    if line.startswith('ID='):
-                        return line.strip().split('=', 1)[1].replace('"', '').lower()
-                    if line.startswith('NAME='):
-                        return line.strip().split('=', 1)[1].replace('"', '').lower()
-        except Exception:
-            pass
-        return 'linux'
+    def _on_map(self, _widget):
+        if self._timer_id is None:
+            self._timer_id = GLib.timeout_add(SAMPLE_INTERVAL_MS, self._on_sample)
+
+    def _on_unmap(self, _widget):
+        if self._timer_id is not None:
+            GLib.source_remove(self._timer_id)
+            self._timer_id = None
+
+    def _on_sample(self):
+        # A sample reads a few small files in well under a millisecond, fine on the main thread
+        self.update()
+        self.update_visual()
+        return True
 
     def update_visual(self):
         '''Update the visual representation of the widget called by ui.py'''
-        
-    def get_system_stats(self):
-        '''Gather memory, storage, and graphics stats.'''
-        # Memory amount (total)
-        mem = psutil.virtual_memory()
-        mem_total_mb = mem.total / (1000**2)
-        memory_gb = mem_total_mb / 1000
-        memory = f"{memory_gb:.1f}GB"
-        disk = psutil.disk_usage('/')
-        total_gb = disk.total / (1000**3)
-        if total_gb >= 1000:
-            storage = f"{total_gb / 1000:.1f}TB"
-        else:
-            storage = f"{total_gb:.1f}GB"
-        # Try to get graphics info from lspci (Linux)
-        graphics = 'Unknown'
-        try:
-            with os.popen(r"lspci | grep -i 'vga\|3d\|display'") as f:
-                out = f.read().strip()
-                if out:
-                    # Extract only the text inside brackets []
-                    match = re.search(r'\[(.*?)\]', out)
-                    if match:
-                        graphics = match.group(1).strip()
-                    else:
-                        graphics = 'Unknown'
-        except Exception:
-            pass
-        return {
-            'memory': memory,
-            'storage': storage,
-            'graphics': graphics
-        }
 
+        if not self.data:
+            self.label.set_text("System Stats\nNo data yet.")
+            return
+        stats = self.data['stats']
+        text = (f"CPU: {self.data['cpu']}\n"
+                f"Graphics: {stats['graphics']}\n"
+                f"Memory: {stats['memory']}\n"
+                f"Storage: {stats['storage']}\n")
+        self.label.set_text(text)
+
+        live = self.data['live']
+        psi = live['psi']
+        values = {
+            "cpu": format_percent(live['cpu_percent']),
+            "freq": f"{live['freq_mhz']} MHz" if live['freq_mhz'] is not None else "–",
+            "mem": format_percent(live['mem_percent']),
+            "psi_cpu": format_percent(psi['cpu']),
+            "psi_memory": format_percent(psi['memory']),
+            "psi_io": format_percent(psi['io']),
+        }
+        for series, sparkline in self.sparklines.items():
+            sparkline.set_values(self.data['history'][series])
+            self.value_labels[series].set_text(values[series])
+        if live['core_freqs']:
+            self.value_labels["freq"].set_tooltip_text(
+                "\n".join(f"Core {i}: {mhz} MHz" for i, mhz in enumerate(live['core_freqs'])))
 
 
+def format_percent(value):
+    '''Format a percentage for display, or a dash while there is no reading yet.'''
+    return "–" if value is None else f"{value:.1f}%"
@@ -0,0 +1,280 @@
+'''Thermals Module
+This module reads CPU and board temperatures and fan speeds, and controls the fan.
+Readings come from /sys/class/hwmon (cros_ec driver where present) and fall back to
+ectool. A single ThermalMonitor caches each reading for the current tick so the
+Thermals tab and the history store share one set of reads.
+'''
+
+import json
+import math
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+from app.command_runner import run_query
+from app.helpers import get_installed_tool, get_sysfs_path
+from app.power_supply import SysfsAttribute
+
+HWMON_ROOT = get_sysfs_path("class", "hwmon")
+CPU_HWMON_NAMES = ("coretemp", "k10temp", "zenpower")
+EC_HWMON_NAMES = ("cros_ec", "framework_laptop")
+CPU_LABELS = ("package id 0", "tctl", "tdie")
+ECTOOL_MAX_AGE = 10  # seconds an ectool reading is reused when it needs pkexec
+
+# Curve followed by the fan curve daemon. Only root writes it, the daemon runs as root and
+# must not take curves from other users
+FAN_CURVE_FILE = "/run/framework-app/fan_curve.json"
+FAN_CURVE_DAEMON = get_installed_tool("fan_curve_daemon.py")
+
+# (temperature C, fan duty %) points, interpolated linearly in between
+FAN_CURVES = {
+    "quiet": [(45, 0), (60, 20), (75, 50), (85, 100)],
+    "balanced": [(40, 0), (55, 30), (70, 60), (80, 100)],
+    "performance": [(35, 20), (50, 50), (65, 80), (75, 100)],
+}
+
+
+def validate_curve(curve):
+    '''Return a curve as a list of (temp, duty) tuples. Raises ValueError unless it is a
+    non-empty list of number pairs with ascending temperatures and duties from 0 to 100.'''
+    if not isinstance(curve, (list, tuple)) or not curve:
+        raise ValueError("A fan curve is a non-empty list of [temperature, duty] points")
+    points = []
+    for point in curve:
+        if (not isinstance(point, (list, tuple)) or len(point) != 2 or not all(
+                isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+                for value in point)):
+            raise ValueError(f"Fan curve points are [temperature, duty] numbers, got {point!r}")
+        temp, duty = point
+        if not 0 <= duty <= 100:
+            raise ValueError(f"Fan duty must be between 0 and 100%, got {duty}")
+        if points and temp <= points[-1][0]:
+            raise ValueError("Fan curve temperatures must be ascending")
+        points.append((temp, round(duty)))
+    return points
+
+
+def evaluate_curve(curve, temp):
+    '''Return the fan duty in percent for temp on a list of (temp, duty) points.'''
+    if temp is None:
+        return 100
+    if temp <= curve[0][0]:
+        return curve[0][1]
+    for (t0, d0), (t1, d1) in zip(curve, curve[1:]):
+        if temp <= t1:
+            return round(d0 + (d1 - d0) * (temp - t0) / (t1 - t0))
+    return curve[-1][1]
+
+
+class HwmonChannel:
+    '''One temperature or fan input of a hwmon device.'''
+
+    def __init__(self, device, label, path, scale):
+        self.device = device
+        self.label = label
+        self.scale = scale
+        self.attribute = SysfsAttribute(path)
+
+    def read(self):
+        value = self.attribute.read()
+        try:
+            return int(value) * self.scale
+        except (TypeError, ValueError):
+            return None
+
+
+def discover_hwmon(root=HWMON_ROOT):
+    '''Return (cpu_temps, board_temps, fans) lists of HwmonChannel.'''
+    cpu_temps, board_temps, fans = [], [], []
+    try:
+        entries = sorted(os.listdir(root))
+    except OSError:
+        entries = []
+    for entry in entries:
+        path = os.path.join(root, entry)
+        try:
+            with open(os.path.join(path, "name"), "r", encoding="utf-8") as f:
+                name = f.read().strip()
+        except OSError:
+            continue
+        if name not in CPU_HWMON_NAMES + EC_HWMON_NAMES + ("acpitz",):
+            continue
+        for filename in sorted(os.listdir(path)):
+            match = re.fullmatch(r"(temp|fan)(\d+)_input", filename)
+            if not match:
+                continue
+            kind, index = match.groups()
+            try:
+                with open(os.path.join(path, f"{kind}{index}_label"), "r", encoding="utf-8") as f:
+                    label = f.read().strip()
+            except OSError:
+                label = f"{name} {kind}{index}"
+            input_path = os.path.join(path, filename)
+            if kind == "fan":
+                fans.append(HwmonChannel(name, label, input_path, 1))
+            elif name in CPU_HWMON_NAMES:
+                cpu_temps.append(HwmonChannel(name, label, input_path, 0.001))
+            else:
+                board_temps.append(HwmonChannel(name, label, input_path, 0.001))
+    # Prefer the package/control temperature over per-core readings
+    cpu_temps.sort(key=lambda c: c.label.lower() not in CPU_LABELS)
+    # Prefer EC sensors over ACPI thermal zones for the board temperature
+    board_temps.sort(key=lambda c: c.device not in EC_HWMON_NAMES)
+    return cpu_temps, board_temps, fans
+
+
+def read_ectool_thermals(ttl=None):
+    '''Read fan speeds and temperatures through ectool in one pass, directly as root and
+    through pkexec otherwise. ttl overrides how long the command runner reuses a reading.
+    Returns (fans, temps) where temps maps sensor name to degrees C.'''
+    fans, temps = [], {}
+    prefix = [] if os.geteuid() == 0 else ["pkexec"]
+    try:
+        result = run_query(prefix + ["/usr/bin/ectool", "pwmgetfanrpm", "all"], ttl=ttl)
+        for line in result.stdout.splitlines():
+            # Fan 0 RPM: 2341
+            match = re.search(r"Fan\s+\d+\s+RPM:\s*(\d+)", line)
+            if match:
+                fans.append(int(match.group(1)))
+        result = run_query(prefix + ["/usr/bin/ectool", "temps", "all"], ttl=ttl)
+        for line in result.stdout.splitlines():
+            # local_f75303@4d  313 K (= 40 C)
+            match = re.match(r"\s*(\S.*?)\s+(\d+)\s*K", line)
+            if match:
+                temps[match.group(1)] = int(match.group(2)) - 273
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"Error reading thermals with ectool: {e}", file=sys.stderr)
+    return fans, temps
+
+
+class ThermalMonitor:
+    '''Reads thermals at most once per tick and shares the result.'''
+
+    def __init__(self, max_age=1.0, ectool=True):
+        '''ectool: False to read hwmon only, so sampling never prompts for privileges.'''
+        self.max_age = max_age
+        self.ectool = ectool
+        self._cpu_temps, self._board_temps, self._fans = discover_hwmon()
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._snapshot_time = 0
+
+    @property
+    def uses_ectool(self):
+        '''True if hwmon has no fan input and ectool is used instead.'''
+        return self.ectool and not self._fans
+
+    def sample(self):
+        '''Return a dict with cpu_temp, board_temp, fan_rpm and sensors, reusing this tick's reading.'''
+        with self._lock:
+            now = time.monotonic()
+            if self._snapshot is None or now - self._snapshot_time >= self.max_age:
+                self._snapshot = self._read()
+                self._snapshot_time = now
+            return self._snapshot
+
+    def _read(self):
+        sensors = {}
+        for channel in self._cpu_temps + self._board_temps:
+            value = channel.read()
+            if value is not None:
+                sensors[channel.label] = value
+        fans = [rpm for rpm in (channel.read() for channel in self._fans) if rpm is not None]
+        cpu_temp = next((sensors[c.label] for c in self._cpu_temps if c.label in sensors), None)
+        board_temp = next((sensors[c.label] for c in self._board_temps if c.label in sensors), None)
+        if self.uses_ectool:
+            # Without root each reading is two pkexec processes, reuse it for longer
+            fans, ec_temps = read_ectool_thermals(None if os.geteuid() == 0 else ECTOOL_MAX_AGE)
+            sensors.update(ec_temps)
+            if board_temp is None and ec_temps:
+                board_temp = next(iter(ec_temps.values()))
+        return {
+            "cpu_temp": cpu_temp,
+            "board_temp": board_temp,
+            "fan_rpm": fans[0] if fans else None,
+            "fans": fans,
+            "sensors": sensors,
+        }
+
+
+_monitor = None
+
+def get_thermal_monitor():
+    '''Return the shared ThermalMonitor.'''
+    global _monitor
+    if _monitor is None:
+        _monitor = ThermalMonitor()
+    return _monitor
+
+
+def set_fan_duty(percent):
+    '''Run the fan at a fixed duty cycle. Returns True on success.'''
+    percent = int(percent)
+    if not 0 <= percent <= 100:
+        raise ValueError(f"Fan duty must be between 0 and 100%, got {percent}")
+    result = subprocess.run(["pkexec", "/usr/bin/ectool", "fanduty", str(percent)], check=False)
+    return result.returncode == 0
+
+
+def set_auto_fan():
+    '''Hand fan control back to the EC. Returns True on success.'''
+    result = subprocess.run(["pkexec", "/usr/bin/ectool", "autofanctrl"], check=False)
+    return result.returncode == 0
+
+
+def read_fan_curve():
+    '''Return the validated curve the daemon should follow, or None. Raises ValueError
+    for a malformed curve file.'''
+    try:
+        with open(FAN_CURVE_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        raise ValueError(f"Cannot read {FAN_CURVE_FILE}: {e}") from None
+    if not isinstance(data, dict):
+        raise ValueError(f"{FAN_CURVE_FILE} does not hold a curve")
+    return validate_curve(data["curve"]) if data.get("curve") is not None else None
+
+
+def get_fan_curve_name():
+    '''Return the name of the curve in FAN_CURVES the daemon follows, None without a curve.
+    A fixed duty can't be read back from the EC and also gives None.'''
+    try:
+        curve = read_fan_curve()
+    except ValueError as e:
+        print(f"Failed to read the fan curve: {e}", file=sys.stderr)
+        return None
+    for name, points in FAN_CURVES.items():
+        if curve == validate_curve(points):
+            return name
+    return None
+
+
+def write_fan_curve(curve):
+    '''Send a curve to the fan curve daemon, or None to stop following a curve. As root the
+    file is written here, otherwise through pkexec of the installed daemon. Returns True on success.'''
+    curve = validate_curve(curve) if curve is not None else None
+    if os.geteuid() != 0:
+        if curve is None and not os.path.exists(FAN_CURVE_FILE):
+            return True  # No curve is being followed, nothing to stop
+        result = subprocess.run(["pkexec", "/usr/bin/python3", "-I", FAN_CURVE_DAEMON,
+                                 "--write-curve", json.dumps(curve)], check=False)
+        return result.returncode == 0
+    try:
+        os.makedirs(os.path.dirname(FAN_CURVE_FILE), mode=0o755, exist_ok=True)
+        if curve is None:
+            if os.path.exists(FAN_CURVE_FILE):
+                os.remove(FAN_CURVE_FILE)
+            return True
+        with open(f"{FAN_CURVE_FILE}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"curve": curve}, f)
+        os.chmod(f"{FAN_CURVE_FILE}.tmp", 0o644)
+        os.replace(f"{FAN_CURVE_FILE}.tmp", FAN_CURVE_FILE)
+    except OSError as e:
+        print(f"Failed to write the fan curve: {e}", file=sys.stderr)
+        return False
+    return True
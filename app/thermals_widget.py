@@ -0,0 +1,118 @@
+'''Thermals Widget Module
+This module defines a widget for monitoring temperatures and fan speed and controlling the fan.
+It inherits from Gtk.Box and implements the WidgetTemplate interface, readings come from ThermalsProvider.
+'''
+
+import subprocess
+import threading
+from gi.repository import Gtk, GLib
+from app.widget import WidgetTemplate
+from app.command_runner import invalidate, run_query
+from app.thermals import (FAN_CURVE_DAEMON, FAN_CURVES, get_fan_curve_name, set_auto_fan, set_fan_duty,
+                          write_fan_curve)
+from app.providers import ThermalsProvider
+from app.service_client import call_hardware
+
+
+class ThermalsWidget(Gtk.Box, WidgetTemplate):
+    '''A widget to display temperatures and fan speed, with fan control.'''
+
+    def __init__(self, history=None):
+        Gtk.Box.__init__(self, orientation=Gtk.Orientation.VERTICAL, spacing=10)
+        WidgetTemplate.__init__(self, ThermalsProvider(history))
+
+        self.label = Gtk.Label(label="Thermals")
+        Gtk.Box.pack_start(self, self.label, False, False, 0)
+
+        # Fan mode: EC automatic, one of the curves, or a fixed duty
+        mode_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=10)
+        mode_box.pack_start(Gtk.Label(label="Fan mode"), False, False, 0)
+        self.mode_combo = Gtk.ComboBoxText()
+        self.mode_combo.append("auto", "Auto (EC)")
+        for name in FAN_CURVES:
+            self.mode_combo.append(name, f"{name.capitalize()} curve")
+        self.mode_combo.append("fixed", "Fixed")
+        # Start on the curve being followed, before connecting so it isn't applied again
+        self.mode_combo.set_active_id(get_fan_curve_name() or "auto")
+        self.mode_combo.connect("changed", self.on_mode_changed)
+        mode_box.pack_start(self.mode_combo, False, False, 0)
+        Gtk.Box.pack_start(self, mode_box, False, False, 0)
+
+        self.duty_scale = Gtk.Scale.new_with_range(Gtk.Orientation.HORIZONTAL, 0, 100, 5)
+        self.duty_scale.set_digits(0)
+        self.duty_scale.set_value(50)
+        self.duty_scale.set_sensitive(False)
+        self.duty_scale.connect("value-changed", self.on_duty_changed)
+        Gtk.Box.pack_start(self, self.duty_scale, False, False, 0)
+        self._debounce_id = None
+
+    def update_visual(self):
+        '''Update the visual representation of the widget called by ui.py'''
+        if not self.data:
+            self.label.set_text("Thermals\nNo data yet.")
+            return
+        lines = [
+            f"CPU: {format_temp(self.data['cpu_temp'])}",
+            f"Board: {format_temp(self.data['board_temp'])}",
+        ]
+        fans = self.data['fans']
+        if fans:
+            lines += [f"Fan {i}: {rpm} RPM" for i, rpm in enumerate(fans)]
+        else:
+            lines.append("Fan: Unknown")
+        self.label.set_text("\n".join(lines))
+
+    def on_mode_changed(self, combo):
+        mode = combo.get_active_id()
+        self.duty_scale.set_sensitive(mode == "fixed")
+        if mode in FAN_CURVES:
+            self._run_in_thread("fan.curve", {"name": mode}, lambda: self._follow_curve(mode))
+        elif mode == "fixed":
+            self._apply_duty(int(self.duty_scale.get_value()))
+        else:
+            self._run_in_thread("fan.auto", {}, lambda: write_fan_curve(None) and set_auto_fan())
+
+    def on_duty_changed(self, scale):
+        if self.mode_combo.get_active_id() != "fixed":
+            return
+        if self._debounce_id:
+            GLib.source_remove(self._debounce_id)
+        self._debounce_id = GLib.timeout_add(200, self._apply_duty, int(scale.get_value()))
+
+    def _apply_duty(self, value):
+        self._debounce_id = None
+        self._run_in_thread("fan.duty", {"value": value}, lambda: write_fan_curve(None) and set_fan_duty(value))
+        return False
+
+    def _follow_curve(self, name):
+        self._ensure_daemon()
+        return write_fan_curve(FAN_CURVES[name])
+
+    def _ensure_daemon(self):
+        '''Start the fan curve daemon as root if it, or the service running it, is not running.'''
+        try:
+            if run_query(["pgrep", "-f", "fan_curve_daemon.py|framework_service.py"]).stdout.strip():
+                return
+        except (OSError, subprocess.TimeoutExpired) as e:
+            print("Failed to check for fan curve daemon:", e)
+        try:
+            subprocess.Popen(["pkexec", "/usr/bin/python3", "-I", FAN_CURVE_DAEMON])
+            invalidate("pgrep")
+        except OSError as e:
+            print("Failed to start fan curve daemon:", e)
+
+    def _run_in_thread(self, method, params, local):
+        '''Run the framework-ctl method in the service, or local() here, in a thread.'''
+
+        def worker():
+            try:
+                if not call_hardware(method, params, local):
+                    print(f"Fan control command failed: {method} {params}")
+            except (OSError, ValueError) as e:
+                print("Error controlling fan:", e)
+        threading.Thread(target=worker, daemon=True).start()
+
+
+def format_temp(value):
+    '''Format a temperature in C for display.'''
+    return f"{value:.0f}°C" if value is not None else "Unknown"
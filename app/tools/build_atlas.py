@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+'''Build the asset atlas, assets/atlas.bin.
+Every PNG the app draws is scaled once with Pillow to the widths it is shown at, at 1x and
+2x, and stored as raw RGBA so the app never decodes or scales them while running. The OS
+logo overlays are rendered here too. Run by install.sh, and again after changing assets.
+Images that are not in the atlas still load from their PNG.
+'''
+
+import fnmatch
+import os
+import sys
+
+from PIL import Image
+
+# Allow running straight from the repository
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from app.atlas import ASSETS_DIR, ATLAS_PATH, write_atlas  # noqa: E402
+from app.providers import render_logo_overlay  # noqa: E402
+
+LAPTOP_WIDTH = 500
+# (pattern relative to assets/, widths the app requests it at)
+TARGETS = (
+    ("framework-laptop-*.png", (LAPTOP_WIDTH,)),
+    ("overlays/*.png", (LAPTOP_WIDTH,)),
+    ("expansion_card_*.png", (160,)),
+    ("framework.png", (200,)),
+    ("framework-logo.png", (200,)),
+)
+SCALES = (1, 2)
+LOGO_OVERLAY_SIZE = (500, 710)
+
+
+def scaled(image, width):
+    '''Scale down to width keeping the aspect ratio, like load_scaled_image. Never scales up.'''
+    if image.width <= width:
+        return image
+    height = int(image.height * width / image.width)
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def packed(name, requested, image, mtime_ns):
+    '''Return the write_atlas tuple for image with its transparent border cropped off.'''
+    box = image.getchannel("A").getbbox() or (0, 0, 1, 1)
+    cropped = image.crop(box)
+    return (name, requested, (box[0], box[1], cropped.width, cropped.height),
+            (image.width, image.height), cropped.tobytes(), mtime_ns)
+
+
+def collect_assets():
+    '''Return (name, widths) for every asset matching TARGETS.'''
+    assets = []
+    for root, _dirs, files in os.walk(ASSETS_DIR):
+        for filename in sorted(files):
+            name = os.path.relpath(os.path.join(root, filename), ASSETS_DIR).replace(os.sep, "/")
+            for pattern, widths in TARGETS:
+                if fnmatch.fnmatch(name, pattern):
+                    assets.append((name, widths))
+                    break
+    return assets
+
+
+def main():
+    images = []
+    assets = collect_assets()
+    names = {name for name, _widths in assets}
+    for name, widths in assets:
+        path = os.path.join(ASSETS_DIR, name)
+        image = Image.open(path).convert("RGBA")
+        mtime_ns = os.stat(path).st_mtime_ns
+        for width in widths:
+            for scale in SCALES:
+                images.append(packed(name, width * scale, scaled(image, width * scale), mtime_ns))
+        # The OS overlay the Stats tab shows, normally rendered on first run
+        logo = os.path.basename(name)
+        overlay_name = f"overlays/os-overlay-{logo}"
+        if name.startswith("overlays/os-") and not logo.startswith("os-overlay-") and overlay_name not in names:
+            overlay = render_logo_overlay(path, LOGO_OVERLAY_SIZE)
+            for scale in SCALES:
+                images.append(packed(overlay_name, LAPTOP_WIDTH * scale, scaled(overlay, LAPTOP_WIDTH * scale), None))
+    count = write_atlas(ATLAS_PATH, images)
+    size = os.path.getsize(ATLAS_PATH)
+    print(f"Wrote {count} images ({size / 1e6:.1f} MB) to {ATLAS_PATH}")
+
+
+if __name__ == "__main__":
+    main()
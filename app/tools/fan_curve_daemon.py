@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+'''Daemon to drive the fan from a temperature curve.
+This daemon reads the curve from the root-owned /run/framework-app/fan_curve.json and evaluates
+it at a fixed rate, setting the fan duty with ectool. Without a valid curve, or on any error,
+the EC controls the fan. The framework-app service (app/service.py) runs it in a thread instead
+of as a process of its own, and writes the file for its clients. Without the service, the app
+runs `fan_curve_daemon.py --write-curve JSON` through pkexec to write it.
+'''
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+# Allow running straight from the repository as root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from app.thermals import (FAN_CURVE_FILE, evaluate_curve, get_thermal_monitor, read_fan_curve,  # noqa: E402
+                          write_fan_curve)
+
+INTERVAL = 2  # seconds between curve evaluations
+HYSTERESIS = 3  # only change the duty when it moves by at least this many percent
+
+
+class FanCurveDaemon:
+    '''Daemon to apply a fan curve.'''
+
+    def __init__(self, handle_signals=True):
+        self.running = True
+        self.curve = None
+        self.duty = None
+        self._curve_mtime = None
+        self.monitor = get_thermal_monitor()
+        if handle_signals:
+            signal.signal(signal.SIGTERM, self.handle_exit)
+            signal.signal(signal.SIGINT, self.handle_exit)
+
+    def stop(self):
+        '''Stop evaluating the curve and give fan control back to the EC.'''
+        self.running = False
+        if self.curve:
+            self.set_auto()
+
+    def handle_exit(self, _signum, _frame):
+        '''Give fan control back to the EC and exit.'''
+
+        print('Fan curve daemon stopping...')
+        self.running = False
+        self.set_auto()
+        sys.exit(0)
+
+    def read_curve(self):
+        '''Reload the curve file if it changed since the last read.'''
+        try:
+            mtime = os.stat(FAN_CURVE_FILE).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self._curve_mtime:
+            return
+        self._curve_mtime = mtime
+        try:
+            curve = read_fan_curve() if mtime is not None else None
+        except ValueError as e:
+            print(f"Ignoring fan curve: {e}")
+            curve = None
+        if curve != self.curve:
+            print(f"Fan curve changed to: {curve}")
+            self.curve = curve
+            if not self.curve:
+                self.set_auto()
+
+    def run(self):
+        '''Evaluate the curve every INTERVAL seconds.'''
+        while self.running:
+            try:
+                self.read_curve()
+                if self.curve:
+                    sample = self.monitor.sample()
+                    temp = sample["cpu_temp"] if sample["cpu_temp"] is not None else sample["board_temp"]
+                    duty = evaluate_curve(self.curve, temp)
+                    if self.duty is None or abs(duty - self.duty) >= HYSTERESIS or (duty in (0, 100) and duty != self.duty):
+                        self.set_duty(duty)
+            except Exception as e:
+                # Never leave a fixed duty behind, the EC takes over until the curve changes
+                print(f"Fan curve failed, returning the fan to the EC: {e}")
+                self.curve = None
+                self.set_auto()
+            time.sleep(INTERVAL)
+
+    def set_duty(self, duty):
+        '''Set a fixed fan duty in percent.'''
+        try:
+            subprocess.run(["/usr/bin/ectool", "fanduty", str(duty)], check=True, capture_output=True)
+            self.duty = duty
+        except (subprocess.CalledProcessError, OSError) as e:
+            print(f"Failed to set fan duty: {e}")
+
+    def set_auto(self):
+        '''Return the fan to EC control.'''
+        try:
+            subprocess.run(["/usr/bin/ectool", "autofanctrl"], check=True, capture_output=True)
+        except (subprocess.CalledProcessError, OSError) as e:
+            print(f"Failed to enable automatic fan control: {e}")
+        self.duty = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--write-curve", metavar="JSON", help="write the curve to follow (null for none) and exit")
+    args = parser.parse_args()
+    if args.write_curve is not None:
+        try:
+            return 0 if write_fan_curve(json.loads(args.write_curve)) else 1
+        except ValueError as e:
+            print(f"Invalid fan curve: {e}", file=sys.stderr)
+            return 1
+    daemon = FanCurveDaemon()
+    print('Fan curve daemon started.')
+    daemon.run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+
+'''Run the framework-app service, the root daemon that polls the hardware for the app and
+framework-ctl and applies their changes. Started by framework-app.service, see app/service.py,
+from the root-owned copy install.sh makes in /usr/lib/framework-app.
+'''
+
+import os
+import sys
+
+# Import the app package this script is installed with
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from app.service import run  # noqa: E402
+
+if __name__ == '__main__':
+    sys.exit(run())
@@ -3,14 +3,21 @@
 '''Daemon to control keyboard backlight patterns based on user input and system events.
 This daemon listens for mode changes and applies the corresponding keyboard backlight pattern.
 It supports multiple modes including breathe, auto, manual, and responsive.
+The framework-app service (app/service.py) runs it in a thread instead of as a process of
+its own, and passes it the lighting scenes clients request over D-Bus (see request_scene).
+The mode's pattern pauses while a scene drives the keyboard backlight.
 '''
 
+import os
 import time
 import signal
 import sys
 import threading
 import subprocess
-from evdev import InputDevice, categorize, ecodes, list_devices
+
+# Import the app package this script is installed with, see install.sh
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from app.scenes import EcOutput, play_scene  # noqa: E402
 
 class KeyboardBacklightDaemon:
     '''Daemon to manage keyboard backlight patterns.
@@ -18,14 +25,26 @@ class KeyboardBacklightDaemon:
     Monitors keyboard input and adjusts backlight accordingly.
     '''
 
-    def __init__(self):
+    def __init__(self, handle_signals=True):
         self.running = True
         self.mode = 'auto'  # Modes: breathe, auto, manual, responsive
         self.thread = threading.Thread(target=self.run, daemon=True)
         self.pattern_thread = None
         self.stop_pattern = False
-        signal.signal(signal.SIGTERM, self.handle_exit)
-        signal.signal(signal.SIGINT, self.handle_exit)
+        self.scene = None
+        self.scene_thread = None
+        self.stop_scene = threading.Event()
+        self._scene_lock = threading.Lock()
+        self._scene_request = None  # (CompiledScene or None,) until the main loop takes it
+        if handle_signals:
+            signal.signal(signal.SIGTERM, self.handle_exit)
+            signal.signal(signal.SIGINT, self.handle_exit)
+
+    def stop(self):
+        '''Stop the pattern and scene threads and the main loop.'''
+        self.running = False
+        self.stop_pattern = True
+        self.stop_scene.set()
 
     def handle_exit(self, _signum, _frame):
         '''Handle exit signals to stop the daemon gracefully.'''
@@ -49,7 +68,13 @@ class KeyboardBacklightDaemon:
             except (FileNotFoundError, OSError) as e:
                 print(f"Error reading mode file: {e}")
 
-            if self.mode != last_mode:
+            if self.check_scene_request() and self.scene.uses("keyboard"):
+                last_mode = None  # Restart the mode's pattern once the scene is done
+            if self.scene_thread and self.scene_thread.is_alive() and self.scene.uses("keyboard"):
+                if self.pattern_thread and self.pattern_thread.is_alive():
+                    self.stop_pattern = True
+                    self.pattern_thread.join()
+            elif self.mode != last_mode:
                 # Stop previous pattern thread if running
                 if self.pattern_thread and self.pattern_thread.is_alive():
                     self.stop_pattern = True
@@ -67,6 +92,33 @@ class KeyboardBacklightDaemon:
                 last_mode = self.mode
             time.sleep(0.2)
 
+    def request_scene(self, scene):
+        '''Play a CompiledScene, replacing the one playing, or stop it with None. Called from
+        other threads, the main loop starts it.'''
+        with self._scene_lock:
+            self._scene_request = (scene,)
+
+    def check_scene_request(self):
+        '''Start or stop a scene if one was requested. Returns True if a scene was started.'''
+        with self._scene_lock:
+            request, self._scene_request = self._scene_request, None
+        if request is None:
+            return False
+        scene = request[0]
+        # One scene at a time, a new request replaces the one playing
+        if self.scene_thread and self.scene_thread.is_alive():
+            self.stop_scene.set()
+            self.scene_thread.join()
+        self.stop_scene.clear()
+        if scene is None:
+            print('Scene stopped.')
+            return False
+        print(f"Playing scene: {scene.name}")
+        self.scene = scene
+        self.scene_thread = threading.Thread(target=play_scene, args=(scene, EcOutput(), self.stop_scene), daemon=True)
+        self.scene_thread.start()
+        return True
+
     def breathe_pattern(self):
         '''Run the breathing pattern for keyboard backlight.'''
         print('Running breathe pattern...')
@@ -91,6 +143,12 @@ class KeyboardBacklightDaemon:
     def responsive_pattern(self):
         '''Run the responsive pattern based on keyboard input.'''
         print('Running responsive pattern...')
+        try:
+            # Only this mode needs evdev
+            from evdev import InputDevice, categorize, ecodes, list_devices
+        except ImportError:
+            print('Responsive mode needs the evdev module.')
+            return
         timeout = 5  # seconds
         brightness_on = 100
         brightness_off = 0
@@ -141,7 +199,8 @@ class KeyboardBacklightDaemon:
         '''Set the keyboard backlight brightness.'''
 
         try:
-            subprocess.run(["pkexec", "/usr/bin/ectool", "pwmsetkblight", str(value)], check=True)
+            # Already root, pkexec would only add a process per step of a pattern
+            subprocess.run(["/usr/bin/ectool", "pwmsetkblight", str(value)], check=True)
         except subprocess.CalledProcessError as e:
             print(f"Failed to set brightness: {e}")
 
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+'''Re-apply the saved Framework settings as root.
+Run from the root-owned copy in /usr/lib/framework-app, at boot by the framework-app-restore
+oneshot service or once through pkexec by `framework-ctl settings restore`, so every setting
+is applied in one privileged session instead of one pkexec prompt each. The values applied are written to /run/framework-app
+so the app shows them as the current state.
+'''
+
+import argparse
+import json
+import os
+import sys
+
+# Import the app package this script is installed with, see install.sh
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from app.settings import RESTORED_FILE, apply_plan, format_step, read_settings_files, restore_plan  # noqa: E402
+
+
+def write_restored(values, applied):
+    '''Record the applied values for the app, world readable.'''
+    restored = {key: values[key] for key in applied if key in values}
+    try:
+        os.makedirs(os.path.dirname(RESTORED_FILE), mode=0o755, exist_ok=True)
+        with open(f"{RESTORED_FILE}.tmp", "w", encoding="utf-8") as f:
+            json.dump(restored, f)
+        os.chmod(f"{RESTORED_FILE}.tmp", 0o644)
+        os.replace(f"{RESTORED_FILE}.tmp", RESTORED_FILE)
+    except OSError as e:
+        print(f"Failed to record restored settings: {e}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-apply saved Framework Laptop settings.")
+    parser.add_argument("--settings", required=True, action="append",
+                        help="settings.json to apply, repeat to merge several (the most recently written wins)")
+    parser.add_argument("--dry-run", action="store_true", help="print the steps without running them")
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    args = parser.parse_args()
+
+    values = read_settings_files(args.settings)
+    plan = restore_plan(values)
+    if args.dry_run:
+        for key, alternatives in plan:
+            print(f"{key}: {' || '.join(format_step(step) for step in alternatives)}")
+        return 0
+
+    applied, failed = apply_plan(plan)
+    write_restored(values, applied)
+    if args.json:
+        print(json.dumps({"applied": applied, "failed": failed}))
+    else:
+        for key in applied:
+            print(f"Restored {key}")
+        for key, error in failed.items():
+            print(f"Failed to restore {key}: {error}", file=sys.stderr)
+    return 1 if failed and not applied else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+'''Trace Overlay Module
+A label drawn over the window with the span timings from app.tracing.
+Showing it enables tracing, hiding it disables tracing again unless FRAMEWORK_TRACE turned it on.
+'''
+
+from gi.repository import Gtk, GLib
+from app import tracing
+from app.command_runner import get_counters
+
+REFRESH_MS = 1000
+
+
+class TraceOverlay(Gtk.Label):
+    '''Table of per-span count, p50, p95 and max times, refreshed every second while visible.'''
+
+    def __init__(self):
+        super().__init__(xalign=0, yalign=0)
+        self.set_halign(Gtk.Align.END)
+        self.set_valign(Gtk.Align.START)
+        self.get_style_context().add_class("trace-overlay")
+        # Keep show_all() on the window from showing it
+        self.set_no_show_all(True)
+        self._timer_id = None
+        self._enabled_here = False
+
+    def toggle(self):
+        if self.get_visible():
+            self.hide_overlay()
+        else:
+            self.show_overlay()
+
+    def show_overlay(self):
+        if not tracing.is_enabled():
+            tracing.enable()
+            self._enabled_here = True
+        self.refresh()
+        self.show()
+        self._timer_id = GLib.timeout_add(REFRESH_MS, self.refresh)
+
+    def hide_overlay(self):
+        if self._timer_id:
+            GLib.source_remove(self._timer_id)
+            self._timer_id = None
+        self.hide()
+        if self._enabled_here:
+            tracing.disable()
+            self._enabled_here = False
+
+    def refresh(self):
+        counters = get_counters()
+        commands = (f"commands: {counters['executed']} run, {counters['cache_hits']} cached, "
+                    f"{counters['coalesced']} joined, {counters['timeouts']} timed out")
+        text = f"{tracing.format_stats()}\n\n{commands}"
+        self.set_markup(f"<tt>{GLib.markup_escape_text(text)}</tt>")
+        return True
@@ -0,0 +1,271 @@
+'''Tracing Module
+Lightweight timing spans for finding out which widget, image or command makes the app slow.
+Each span keeps a count, the all-time maximum and a ring of its most recent durations
+for p50/p95. Nothing is recorded until tracing is enabled, the disabled path is a single
+flag check.
+
+Set FRAMEWORK_TRACE=/path/to/trace.json to trace from startup and write a Chrome trace
+(chrome://tracing or ui.perfetto.dev) on exit. FRAMEWORK_TRACE=1 writes trace.json to the
+data directory. In the app, F12 toggles an overlay with the span table.
+'''
+
+import atexit
+import functools
+import json
+import os
+import subprocess
+import threading
+import time
+from array import array
+
+from app.helpers import get_data_dir
+
+TRACE_ENV = "FRAMEWORK_TRACE"
+HISTOGRAM_SIZE = 512  # Recent samples kept per span for percentiles
+MAX_EVENTS = 200000  # Chrome trace events kept, about 20 MB of JSON
+
+_enabled = False
+_lock = threading.Lock()
+_stats = {}  # span name -> SpanStats
+_events = None  # (name, start, duration, thread id) while a Chrome trace is being recorded
+_thread_names = {}
+_trace_path = None
+_original_run = subprocess.run
+
+
+class SpanStats:
+    '''Durations of one span, in seconds.'''
+    __slots__ = ("count", "total", "max", "_samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._samples = array('d', bytes(8 * HISTOGRAM_SIZE))
+
+    def add(self, duration):
+        self._samples[self.count % HISTOGRAM_SIZE] = duration
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+    def percentile(self, p):
+        '''Return the p-th percentile of the recent samples, or None without samples.'''
+        n = min(self.count, HISTOGRAM_SIZE)
+        if not n:
+            return None
+        values = sorted(self._samples[:n])
+        return values[min(n - 1, int(p / 100 * n))]
+
+    def summary(self):
+        '''Return count, total and p50/p95/max in milliseconds.'''
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1000,
+            "p50_ms": self.percentile(50) * 1000,
+            "p95_ms": self.percentile(95) * 1000,
+            "max_ms": self.max * 1000,
+        }
+
+
+def _record(name, start, end):
+    duration = end - start
+    with _lock:
+        stats = _stats.get(name)
+        if stats is None:
+            stats = _stats[name] = SpanStats()
+        stats.add(duration)
+        if _events is not None and len(_events) < MAX_EVENTS:
+            tid = threading.get_ident()
+            if tid not in _thread_names:
+                _thread_names[tid] = threading.current_thread().name
+            _events.append((name, start, duration, tid))
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_exc):
+        _record(self.name, self.start, time.perf_counter())
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name):
+    '''Context manager timing the block under name. A shared no-op when tracing is disabled.'''
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def traced(name=None):
+    '''Decorator timing every call of the function, named after its qualname by default.'''
+    def decorator(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _record(label, start, time.perf_counter())
+        wrapper.__traced__ = True
+        return wrapper
+    return decorator
+
+
+def trace_methods(cls, *names):
+    '''Wrap the given methods defined directly on cls in spans named Class.method.'''
+    for method_name in names:
+        method = cls.__dict__.get(method_name)
+        if callable(method) and not getattr(method, "__traced__", False):
+            setattr(cls, method_name, traced(f"{cls.__name__}.{method_name}")(method))
+
+
+def command_span_name(args):
+    '''Name a subprocess span after the program and its subcommand, e.g. "exec ectool pwmgetfanrpm".'''
+    if isinstance(args, (str, bytes)):
+        args = os.fsdecode(args).split()
+    args = [os.fsdecode(a) for a in args]
+    if args and os.path.basename(args[0]) == "pkexec":
+        args = args[1:]
+    if not args:
+        return "exec"
+    program = os.path.basename(args[0])
+    if program.startswith("python"):
+        program = os.path.basename(args[1]) if len(args) > 1 else program
+        args = args[1:]
+    for arg in args[1:]:
+        if not arg.startswith("-"):
+            if program in ("sh", "bash"):
+                break
+            return f"exec {program} {arg}"
+    return f"exec {program}"
+
+
+def _traced_run(*popenargs, **kwargs):
+    if not _enabled:
+        return _original_run(*popenargs, **kwargs)
+    args = popenargs[0] if popenargs else kwargs.get("args", ())
+    start = time.perf_counter()
+    try:
+        return _original_run(*popenargs, **kwargs)
+    finally:
+        _record(command_span_name(args), start, time.perf_counter())
+
+
+def enable():
+    '''Start recording spans. Also times subprocess.run calls from then on.'''
+    global _enabled
+    # Modules call subprocess.run through the module, so this catches every ectool call
+    # without touching the call sites. It is only installed once tracing has been used.
+    subprocess.run = _traced_run
+    _enabled = True
+
+
+def disable():
+    '''Stop recording spans. Collected statistics are kept.'''
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    '''Forget all collected statistics.'''
+    with _lock:
+        _stats.clear()
+
+
+def get_stats():
+    '''Return {span name: summary} sorted by total time, slowest first.'''
+    with _lock:
+        items = [(name, stats.summary()) for name, stats in _stats.items()]
+    items.sort(key=lambda item: item[1]["total_ms"], reverse=True)
+    return dict(items)
+
+
+def format_stats(limit=25):
+    '''Return the span table as fixed-width text.'''
+    stats = get_stats()
+    if not stats:
+        return "No spans recorded yet."
+    width = min(max(len(name) for name in stats), 40)
+    lines = [f"{'span':<{width}} {'count':>6} {'p50':>8} {'p95':>8} {'max':>8}  ms"]
+    for name, s in list(stats.items())[:limit]:
+        lines.append(f"{name[:width]:<{width}} {s['count']:>6} {s['p50_ms']:>8.2f} {s['p95_ms']:>8.2f} {s['max_ms']:>8.2f}")
+    return "\n".join(lines)
+
+
+def start_trace(path):
+    '''Record Chrome trace events from now on and write them to path at exit.'''
+    global _events, _trace_path
+    with _lock:
+        _events = []
+        _trace_path = path
+    atexit.register(write_trace)
+    enable()
+
+
+def write_trace(path=None):
+    '''Write the recorded events in Chrome trace format. Returns the path, or None if not recording.'''
+    path = path or _trace_path
+    with _lock:
+        if _events is None or not path:
+            return None
+        events, thread_names = list(_events), dict(_thread_names)
+    pid = os.getpid()
+    trace_events = [
+        {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread_name}}
+        for tid, thread_name in thread_names.items()
+    ]
+    # Complete ("X") events, timestamps and durations in microseconds
+    trace_events.extend(
+        {"name": name, "cat": name.split(" ", 1)[0].split(".", 1)[0], "ph": "X",
+         "ts": start * 1e6, "dur": duration * 1e6, "pid": pid, "tid": tid}
+        for name, start, duration, tid in events
+    )
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
+    except OSError as e:
+        print(f"Failed to write trace to {path}: {e}")
+        return None
+    return path
+
+
+def _init_from_env():
+    value = os.environ.get(TRACE_ENV)
+    if not value or value == "0":
+        return
+    if value.lower() in ("1", "true", "yes"):
+        value = os.path.join(get_data_dir(), "trace.json")
+    start_trace(value)
+
+
+_init_from_env()
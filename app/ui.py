@@ -6,28 +6,48 @@
 
 # Standard library
 import concurrent.futures
+from collections.abc import Mapping
 
 # Third-party
 import gi
 gi.require_version('Gtk', '3.0')
-from gi.repository import Gtk, GLib
+from gi.repository import Gtk, Gdk, GLib
 
 # Local application imports
+from app import tracing
 from app.framework_model import get_framework_model
 from app.helpers import get_asset_path
+from app.backlight import BacklightMonitor, opacity_for
+from app.history import HistoryStore, get_history_store
 from app.image_utils import load_scaled_image
+from app.image_worker import shutdown_image_worker
 from app.model_image import ModelImage
+from app.providers import draw_service_overlays, record_battery_history, record_thermal_history
+from app.service_client import ServiceError, get_service_client
+from app.privacy import get_privacy_monitor
+from app.usb_pd import get_uevent_monitor
+from app.widget import freeze
 from app.power_profiles_widget import PowerProfilesWidget
 from app.expansion_cards_widget import ExpansionCardsWidget
 from app.keyboard_backlight_widget import KeyboardBacklightWidget
 from app.sample_widget import SampleWidget
-from app.sleep_mode_widget import SleepModeWidget
 from app.led_widget import LedWidget
 from app.power_status_widget import PowerStatusWidget
 from app.system_stats_widget import SystemStatsWidget
+from app.thermals_widget import ThermalsWidget
+from app.trace_overlay import TraceOverlay
 
 UPDATE_INTERVAL_MS=5000
 LAPTOP_WIDTH=500
+SCREEN_OVERLAY = "os"  # The overlay drawn on the laptop's screen, dimmed with the backlight
+# Tabs whose data comes from the framework service when it runs, by its snapshot key
+SERVICE_KEYS = {
+    "Power": "power_profiles",
+    "Battery": "battery",
+    "Thermals": "thermals",
+    "Expansion": "expansion_cards",
+    "LEDs": "leds",
+}
 
 
 class FrameworkControlApp(Gtk.Window):
@@ -68,6 +88,22 @@ class FrameworkControlApp(Gtk.Window):
             border-radius: 6px;
             box-shadow: 0 2px 8px rgba(0,0,0,0.08);
         }
+        .port-badge {
+            background: rgba(0, 0, 0, 0.7);
+            color: #ffffff;
+            padding: 2px 6px;
+            border-radius: 4px;
+            font-size: 0.85em;
+        }
+        .port-badge.charging {
+            background: rgba(0, 140, 60, 0.9);
+        }
+        .trace-overlay {
+            background: rgba(0, 0, 0, 0.75);
+            color: #ffffff;
+            padding: 8px;
+            border-radius: 6px;
+        }
         """
         style_provider = Gtk.CssProvider()
         style_provider.load_from_data(css)
@@ -79,18 +115,37 @@ class FrameworkControlApp(Gtk.Window):
 
         # Figure out the laptop stuff
         self.model = get_framework_model()
-        self.model.overlays = []
         self.overlay_widgets = []
         self.model_img_widget = None
         self.model_img_parent = None
         self.current_widget = None
         self._last_overlays = None  # Cache for overlays
+        self._overlay_opacity = {}  # Kept across ModelImage rebuilds
+        # When the service runs it polls the hardware for every client and records the
+        # history, the app follows its snapshots and only keeps the history in memory
+        self.service = get_service_client()
+        service_snapshots = {}
+        if self.service is not None:
+            try:
+                service_snapshots = self.service.get_snapshots()
+            except ServiceError as e:
+                print(f"Framework service unavailable, polling directly: {e}")
+                self.service = None
+        self.history = HistoryStore(persist=False) if self.service else get_history_store()
+        self.connect("destroy", self._on_destroy)
 
 
 
         # Create a horizontal box to split sidebar (tabs) and main content (image)
         tab_and_content_container = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=20)
-        self.add(tab_and_content_container)
+
+        # Timing overlay on top of everything, toggled with F12
+        window_overlay = Gtk.Overlay()
+        window_overlay.add(tab_and_content_container)
+        self.trace_overlay = TraceOverlay()
+        window_overlay.add_overlay(self.trace_overlay)
+        self.add(window_overlay)
+        self.connect("key-press-event", self._on_key_press)
 
         # Sidebar: vertical box for tab buttons with icons only, grey background
         tab_sidebar = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=10)
@@ -105,9 +160,11 @@ class FrameworkControlApp(Gtk.Window):
         tab_items = [
             ("Stats", "system-run-symbolic", SystemStatsWidget(model=self.model)),
             ("Power", "battery-full-symbolic", PowerProfilesWidget()),
-            ("Battery", "battery-good-symbolic", PowerStatusWidget()),
-            ("Expansion", "media-flash-symbolic", ExpansionCardsWidget()),
-            ("LEDs", "dialog-information-symbolic", LedWidget()),
+            ("Battery", "battery-good-symbolic", PowerStatusWidget(history=self.history)),
+            ("Thermals", "sensors-temperature-symbolic", ThermalsWidget(history=self.history)),
+            ("Expansion", "media-flash-symbolic", ExpansionCardsWidget(self.model.port_sides or None, self.model.usb_ports,
+                                                                           self.model.typec_ports)),
+            ("LEDs", "dialog-information-symbolic", LedWidget(model=self.model)),
             ("Keyboard", "keyboard-brightness-symbolic", KeyboardBacklightWidget()),
             ("Sample", "applications-system-symbolic", SampleWidget(self.model.name, (LAPTOP_WIDTH, 710))), # TODO this is hard coded? TODO Model is not used right now...
         ]
@@ -127,11 +184,11 @@ class FrameworkControlApp(Gtk.Window):
         # Main content:
         main_content_container = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=10)
 
-        # Framework logo image
-        framework_image_path = get_asset_path("framework.png")
-        logo_img = load_scaled_image(framework_image_path, 200)
-        if logo_img:
-            main_content_container.pack_start(logo_img, False, False, 0)
+        # Framework logo image, reloaded at device resolution when the scale factor changes
+        self.logo_box = Gtk.Box(halign=Gtk.Align.CENTER)
+        self._load_logo()
+        self.connect("notify::scale-factor", lambda *_args: self._load_logo())
+        main_content_container.pack_start(self.logo_box, False, False, 0)
 
         # Model Name (ex. Framework Laptop 13 i5 11th Gen)
         model_label = Gtk.Label(label=self.model.name, xalign=0.5)
@@ -185,6 +242,22 @@ class FrameworkControlApp(Gtk.Window):
         # Thread pool for async updates
         self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
 
+        if self.service is not None:
+            self.service.subscribe(self._on_service_snapshots)
+            self._on_service_snapshots(service_snapshots)
+        else:
+            # Show USB-C plugs and the camera and microphone turning on right away, instead of
+            # at the next tick, by polling the expansion cards alone
+            if get_uevent_monitor() is not None:
+                get_uevent_monitor().add_listener(lambda: GLib.idle_add(self.update_loop, ("Expansion",)))
+            get_privacy_monitor().add_listener(lambda: GLib.idle_add(self.update_loop, ("Expansion",)))
+
+        # The screen overlay follows the display brightness
+        self.backlight = BacklightMonitor()
+        if self.backlight.start():
+            self._on_brightness_changed(self.backlight.fraction())
+            self.backlight.add_listener(lambda fraction: GLib.idle_add(self._on_brightness_changed, fraction))
+
         # Update at init
         GLib.idle_add(self.update_loop)
 
@@ -194,33 +267,69 @@ class FrameworkControlApp(Gtk.Window):
 
     def _periodic_update(self):
         # Run update_loop in a background thread
-        self._executor.submit(self._background_update_loop)
+        self.update_loop()
         return True
 
-    def _background_update_loop(self):
-        # Run the heavy update logic in a thread, then schedule UI update on main thread
-        visible_name = self.widget_stack.get_visible_child_name()
+    def _background_update_loop(self, visible_name, names=None):
+        # Poll the providers in a thread, then schedule the UI update on the main thread.
+        # Only providers run here, widgets and GTK are only touched from the main thread.
+        # names limits the poll to some widgets, for hardware events between ticks.
         widgets_data = {}
         update_errors = {}
-        for name, widget in self.widgets.items():
-            try:
-                # Update the widget data
-                widget.update()
-                widgets_data[name] = getattr(widget, 'data', None)
-            except NotImplementedError as e:
-                update_errors[name] = f"NotImplementedError: {e}"
-                widgets_data[name] = None
-            except (AttributeError, RuntimeError) as e:
-                update_errors[name] = f"Error: {e}"
-                widgets_data[name] = None
+        with tracing.span("update_loop.poll"):
+            for name, widget in self.widgets.items():
+                if self.service is not None and name in SERVICE_KEYS:
+                    continue
+                if names is not None and name not in names:
+                    continue
+                try:
+                    # Get a snapshot of the widget data
+                    widgets_data[name] = widget.provider.poll()
+                except NotImplementedError as e:
+                    update_errors[name] = f"NotImplementedError: {e}"
+                    widgets_data[name] = None
+                except (AttributeError, RuntimeError) as e:
+                    update_errors[name] = f"Error: {e}"
+                    widgets_data[name] = None
+
+            # Partial polls between ticks don't add history samples
+            if names is None:
+                if self.service is not None:
+                    # The service recorded these readings, keep the same samples for the graphs
+                    battery, thermals = self.widgets_data.get("Battery"), self.widgets_data.get("Thermals")
+                    if battery:
+                        record_battery_history(self.history, battery)
+                    if thermals:
+                        record_thermal_history(self.history, thermals)
+                # Store one history sample per tick from the values providers set
+                self.history.commit()
 
         # Schedule UI update on main thread
         GLib.idle_add(self._finish_update_loop, widgets_data, visible_name)
 
+    def _on_brightness_changed(self, fraction):
+        if fraction is not None:
+            self._overlay_opacity[SCREEN_OVERLAY] = opacity_for(fraction)
+            if self.model_img_widget:
+                self.model_img_widget.set_overlay_opacity(SCREEN_OVERLAY, self._overlay_opacity[SCREEN_OVERLAY])
+        return False
+
+    def _on_service_snapshots(self, snapshots):
+        '''Show the snapshots sent by the service, only the ones that changed.'''
+        draw_service_overlays(snapshots)
+        widgets_data = {name: freeze(snapshots[key]) for name, key in SERVICE_KEYS.items()
+                        if key in snapshots and name in self.widgets}
+        if widgets_data:
+            self._finish_update_loop(widgets_data, self.widget_stack.get_visible_child_name())
+
+    @tracing.traced("update_loop.finish")
     def _finish_update_loop(self, widgets_data, visible_name):
-        # Update widgets_data and call update_visual for visible widget
-        self.widgets_data = widgets_data
-        if visible_name in self.widgets:
+        # Update widgets_data and call update_visual for visible widget. With the service
+        # running, the local polls and the service signals each bring part of the widgets
+        self.widgets_data.update(widgets_data)
+        for name, data in widgets_data.items():
+            self.widgets[name].data = data
+        if visible_name in widgets_data:
             try:
                 self.widgets[visible_name].update_visual()
             except Exception as e:
@@ -235,16 +344,38 @@ class FrameworkControlApp(Gtk.Window):
                 if self.model_img_widget:
                     self.model_img_parent.remove(self.model_img_widget)
                 # Create new ModelImage with overlays
-                self.model_img_widget = ModelImage(self.model.image, image_size=LAPTOP_WIDTH, overlays=overlays, overlay_id=self.model.overlay_id)
+                self.model_img_widget = ModelImage(self.model.image, image_size=LAPTOP_WIDTH, overlays=overlays,
+                                                   overlay_id=self.model.overlay_id, overlay_opacity=self._overlay_opacity)
                 self.model_img_parent.pack_start(self.model_img_widget, False, False, 0)
                 self.model_img_parent.show_all()
         return False  # Only run once per call
 
+    def _load_logo(self):
+        for child in self.logo_box.get_children():
+            self.logo_box.remove(child)
+        logo_img = load_scaled_image(get_asset_path("framework.png"), 200, self.get_scale_factor())
+        if logo_img:
+            self.logo_box.pack_start(logo_img, False, False, 0)
+            logo_img.show()
+
+    def _on_key_press(self, _window, event):
+        if event.keyval == Gdk.KEY_F12:
+            self.trace_overlay.toggle()
+            return True
+        return False
+
+    def _on_destroy(self, _window):
+        self.backlight.stop()
+        shutdown_image_worker()
+        # Write out history that has not been flushed yet
+        self.history.close()
+
     # Update loop function
-    def update_loop(self):
-        '''A single update loop that gets all the info'''
-        # For backward compatibility, run the background update loop
-        self._executor.submit(self._background_update_loop)
+    def update_loop(self, names=None):
+        '''A single update loop that gets all the info, or only the named widgets'''
+        # The visible tab is read here as GTK may only be used from the main thread
+        visible_name = self.widget_stack.get_visible_child_name()
+        self._executor.submit(self._background_update_loop, visible_name, names)
 
     # Sidebar tab button function
     def on_tab_clicked(self, _btn, idx, name):
@@ -274,7 +405,7 @@ class FrameworkControlApp(Gtk.Window):
         """
         overlays = []
         for _name, data in self.widgets_data.items():
-            if data and isinstance(data, dict) and 'overlays' in data and data['overlays']:
+            if data and isinstance(data, Mapping) and 'overlays' in data and data['overlays']:
                 overlays.extend(data['overlays'])
 
         return overlays
\ No newline at end of file
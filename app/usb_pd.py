@@ -0,0 +1,294 @@
+'''USB Power Delivery Module
+Role and power contract of each USB-C port, for the expansion card bays: whether something
+is connected, which way power flows, the negotiated voltage and current, and which port
+charges the laptop. Ports are read from the typec class (/sys/class/typec/portN and its
+portN-partner), the negotiated contract from the UCSI power supplies and the charger's
+offer from /sys/class/usb_power_delivery. When the EC does not expose the ports through
+typec, `ectool usbpdpower` reports every port in one call instead.
+
+The sysfs readings are kept until a kernel uevent for the typec, usb_power_delivery or
+power_supply subsystems says something changed. Of the power supplies only chargers count,
+the battery sends an event for every change of its charge. UeventMonitor listens on the kobject uevent
+netlink socket in a thread and waits for a plug's burst of events to settle before telling
+its listeners. Without it (no netlink, or not Linux) the ports are re-read on every poll.
+This module does not use GTK.
+'''
+
+import os
+import re
+import socket
+import subprocess
+import sys
+import threading
+
+from app.command_runner import run_query
+from app.helpers import get_sysfs_path
+from app.power_supply import discover_power_supplies
+
+TYPEC_ROOT = get_sysfs_path("class", "typec")
+UEVENT_SUBSYSTEMS = ("typec", "usb_power_delivery", "power_supply")
+PLUG_SUPPLY_TYPES = ("USB", "Mains")  # POWER_SUPPLY_TYPE of the supplies whose events are plugs
+SETTLE_TIME = 0.25  # seconds without events before a plug is considered done
+UEVENT_BUFFER = 16384
+NETLINK_KOBJECT_UEVENT = 15
+UEVENT_KERNEL_GROUP = 1
+
+# UCSI names its power supplies after the connector, which counts from 1
+UCSI_SUPPLY_RE = re.compile(r"^ucsi-source-psy-.*?(\d+)$")
+ECTOOL_PORT_RE = re.compile(r"^Port (\d+): (.*)$")
+ECTOOL_POWER_RE = re.compile(r"(\d+)mV / (\d+)mA, max (\d+)mV / (\d+)mA(?: / (\d+)mW)?")
+
+
+def empty_port(port):
+    '''Return the reading of a port with nothing connected.'''
+    return {
+        "port": port,
+        "connected": False,
+        "power_role": None,  # "source" or "sink"
+        "data_role": None,  # "host" or "device"
+        "voltage": None,  # V
+        "current": None,  # A
+        "power": None,  # W
+        "max_power": None,  # W offered by the charger
+        "charging": False,
+    }
+
+
+def _read(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def parse_selected(text):
+    '''Return the bracketed choice of a sysfs role file such as "[source] sink".'''
+    if not text:
+        return None
+    match = re.search(r"\[(\w+)\]", text)
+    return match.group(1) if match else text.split()[0]
+
+
+def _millis(text):
+    '''Return "5000mV" or "3000mA" as volts or amps.'''
+    match = re.match(r"(\d+)", text or "")
+    return int(match.group(1)) / 1000 if match else None
+
+
+def read_max_power(pd_path):
+    '''Return the most power in W offered by the source capabilities under a
+    usb_power_delivery device, or None if it advertises none.'''
+    capabilities = os.path.join(pd_path, "source-capabilities")
+    try:
+        pdos = os.listdir(capabilities)
+    except OSError:
+        return None
+    best = None
+    for pdo in pdos:
+        path = os.path.join(capabilities, pdo)
+        power = _millis(_read(os.path.join(path, "maximum_power")))
+        if power is None:
+            voltage = _millis(_read(os.path.join(path, "voltage")) or _read(os.path.join(path, "maximum_voltage")))
+            current = _millis(_read(os.path.join(path, "maximum_current")))
+            power = voltage * current if voltage is not None and current is not None else None
+        if power is not None and (best is None or power > best):
+            best = power
+    return best
+
+
+def ucsi_supplies(refresh=False):
+    '''Return {port: PowerSupply} for the UCSI supplies carrying the negotiated contract.
+    They come and go with the partners, pass refresh=True after a plug.'''
+    supplies = {}
+    for supply in discover_power_supplies(refresh=refresh):
+        match = UCSI_SUPPLY_RE.match(supply.name)
+        if supply.kind == "usb_pd" and match:
+            supplies[int(match.group(1)) - 1] = supply
+    return supplies
+
+
+def read_typec_ports(root=TYPEC_ROOT, refresh=False):
+    '''Return the readings of the ports in the typec class, or None if it has none.'''
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return None
+    numbers = sorted(int(name[4:]) for name in names if re.fullmatch(r"port\d+", name))
+    if not numbers:
+        return None
+    supplies = ucsi_supplies(refresh)
+    ports = []
+    for number in numbers:
+        port = empty_port(number)
+        path = os.path.join(root, f"port{number}")
+        partner = os.path.join(root, f"port{number}-partner")
+        port["connected"] = os.path.isdir(partner)
+        if port["connected"]:
+            port["power_role"] = parse_selected(_read(os.path.join(path, "power_role")))
+            port["data_role"] = parse_selected(_read(os.path.join(path, "data_role")))
+            port["max_power"] = read_max_power(os.path.join(partner, "usb_power_delivery"))
+        supply = supplies.get(number)
+        if supply is not None and supply.is_online():
+            port["voltage"] = supply.read_number("voltage_now", 1e-6)
+            port["current"] = supply.read_number("current_now", 1e-6)
+            if port["voltage"] is not None and port["current"] is not None:
+                port["power"] = port["voltage"] * port["current"]
+        port["charging"] = port["connected"] and port["power_role"] == "sink"
+        ports.append(port)
+    return ports
+
+
+def parse_usbpdpower(output):
+    '''Return the port readings from `ectool usbpdpower` output.'''
+    ports = []
+    for line in output.splitlines():
+        match = ECTOOL_PORT_RE.match(line.strip())
+        if not match:
+            continue
+        port = empty_port(int(match.group(1)))
+        state = match.group(2)
+        if state.startswith("SRC"):
+            port.update(connected=True, power_role="source")
+        elif state.startswith("SNK"):
+            port.update(connected=True, power_role="sink", charging="not charging" not in state)
+        power = ECTOOL_POWER_RE.search(state)
+        if power:
+            voltage, current, max_voltage, max_current, max_power = power.groups()
+            port["voltage"] = int(voltage) / 1000
+            port["current"] = int(current) / 1000
+            port["power"] = port["voltage"] * port["current"]
+            port["max_power"] = (int(max_power) / 1000 if max_power
+                                 else int(max_voltage) * int(max_current) / 1e6)
+        ports.append(port)
+    return ports
+
+
+def read_ectool_ports():
+    '''Return the port readings from the EC, [] if ectool fails.'''
+    try:
+        result = run_query(["pkexec", "/usr/bin/ectool", "usbpdpower"], check=True)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError) as e:
+        print(f"Error reading USB-PD ports with ectool: {e}", file=sys.stderr)
+        return []
+    return parse_usbpdpower(result.stdout)
+
+
+class UsbPdReader:
+    '''Port readings, re-read from sysfs only after a uevent when a UeventMonitor runs.
+    The ectool fallback is cached by the command runner instead.'''
+
+    def __init__(self, root=TYPEC_ROOT, monitor=None):
+        self.root = root
+        self.monitor = monitor if monitor is not None else get_uevent_monitor()
+        self._lock = threading.Lock()
+        self._ports = None
+        self._stale = True
+        if self.monitor is not None:
+            self.monitor.add_listener(self.mark_stale)
+
+    def mark_stale(self):
+        with self._lock:
+            self._stale = True
+
+    def read(self):
+        '''Return a list of port readings, ordered by port number.'''
+        with self._lock:
+            if not self._stale and self._ports is not None and self.monitor is not None:
+                return self._ports
+            self._stale = False
+            previous = self._ports
+        ports = read_typec_ports(self.root, refresh=previous is not None and self.monitor is not None)
+        if ports is None:
+            return read_ectool_ports()
+        if self.monitor is None and previous is not None and _connected(ports) != _connected(previous):
+            # No uevent told us, rescan the supplies when a partner comes or goes
+            ports = read_typec_ports(self.root, refresh=True)
+        with self._lock:
+            self._ports = ports
+        return ports
+
+
+def _connected(ports):
+    return [port["connected"] for port in ports]
+
+
+def parse_uevent(data):
+    '''Return the KEY=value fields of a kernel uevent message as a dict.'''
+    fields = {}
+    for part in data.split(b"\0")[1:]:
+        key, sep, value = part.partition(b"=")
+        if sep:
+            fields[key.decode("ascii", "replace")] = value.decode("utf-8", "replace")
+    return fields
+
+
+class UeventMonitor:
+    '''Calls its listeners from a thread after kernel uevents for one of the subsystems.'''
+
+    def __init__(self, subsystems=UEVENT_SUBSYSTEMS, settle=SETTLE_TIME):
+        self.subsystems = frozenset(subsystems)
+        self.settle = settle
+        self._listeners = []
+        self._sock = None
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def start(self):
+        '''Open the netlink socket and start the thread. Returns False if uevents are unavailable.'''
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+            sock.bind((0, UEVENT_KERNEL_GROUP))
+        except (AttributeError, OSError) as e:
+            print(f"Hardware uevents unavailable, polling USB-C ports: {e}", file=sys.stderr)
+            return False
+        self._sock = sock
+        threading.Thread(target=self._run, name="uevent-monitor", daemon=True).start()
+        return True
+
+    def _matches(self, data):
+        event = parse_uevent(data)
+        subsystem = event.get("SUBSYSTEM")
+        if subsystem == "power_supply" and event.get("POWER_SUPPLY_TYPE") not in PLUG_SUPPLY_TYPES:
+            return False  # The battery's charge and capacity changes
+        return subsystem in self.subsystems
+
+    def _run(self):
+        while True:
+            try:
+                if not self._matches(self._sock.recv(UEVENT_BUFFER)):
+                    continue
+                # A plug is a burst of events (port, partner, PD objects, supplies), report it once
+                self._sock.settimeout(self.settle)
+                try:
+                    while True:
+                        self._sock.recv(UEVENT_BUFFER)
+                except socket.timeout:
+                    pass
+                self._sock.settimeout(None)
+            except OSError as e:
+                print(f"Hardware uevent monitor stopped: {e}", file=sys.stderr)
+                return
+            for listener in list(self._listeners):
+                listener()
+
+
+_monitor = None
+_monitor_checked = False
+_monitor_lock = threading.Lock()
+
+def get_uevent_monitor():
+    '''Return the shared running UeventMonitor, or None if uevents are unavailable.'''
+    global _monitor, _monitor_checked
+    with _monitor_lock:
+        if not _monitor_checked:
+            _monitor_checked = True
+            monitor = UeventMonitor()
+            if monitor.start():
+                _monitor = monitor
+        return _monitor
@@ -1,19 +1,62 @@
+'''Base classes shared by the widgets.
+Each widget is split into a DataProvider, which gathers data without touching GTK and can
+run on any thread, and a view (the widget itself) which only renders the provider's snapshots.
+'''
+
+from types import MappingProxyType
+
+from app.tracing import trace_methods
+
+
+def freeze(value):
+    '''Return an immutable copy of value: dicts become read-only mappings, lists become tuples.'''
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+class DataProvider:
+    '''Gathers the data for one widget. Must not import or call GTK.'''
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Time every provider's poll when tracing is enabled
+        trace_methods(cls, "poll")
+
+    def poll(self):
+        """
+        Called by ui.py from a background thread to run CLI commands or read files.
+        Returns an immutable snapshot (see freeze()), or None if there is no data.
+        """
+        raise NotImplementedError("Each provider must implement its own poll method.")
 
 
 class WidgetTemplate:
-    def __init__(self):
-        # Data generated by update(), accessible by ui.py and the widget
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Time every widget's update and render when tracing is enabled
+        trace_methods(cls, "update", "update_visual")
+
+    def __init__(self, provider=None):
+        # Source of data for this widget, safe to poll off the main thread
+        self.provider = provider
+        # Latest snapshot from the provider, accessible by ui.py and the widget
         self.data = None
 
     def update(self):
         """
-        Called by ui.py to run CLI commands or gather data.
-        Should set self.data to the latest data for this widget.
+        Poll the provider and store the snapshot in self.data.
+        ui.py polls providers directly from its worker thread, widgets call this
+        from the main thread when they need fresh data right away.
         """
-        raise NotImplementedError("Each widget must implement its own update method.")
+        if self.provider is None:
+            raise NotImplementedError("Each widget must have a provider or implement its own update method.")
+        self.data = self.provider.poll()
 
     def update_visual(self):
         """
-        Called by ui.py to update the GUI for this widget.
+        Called by ui.py on the main thread to update the GUI for this widget from self.data.
         """
-        raise NotImplementedError("Each widget must implement its own update_visual method.")
\ No newline at end of file
+        raise NotImplementedError("Each widget must implement its own update_visual method.")
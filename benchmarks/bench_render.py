@@ -0,0 +1,90 @@
+'''Benchmarks for the render side: image loading, colorizing and rebuilding the laptop image.'''
+
+import pytest
+
+from app.helpers import get_asset_path
+
+LAPTOP_WIDTH = 500
+BASE_IMAGE = "framework-laptop-13-top.png"
+OVERLAY_IMAGES = ["overlays/framework-power-status.png", "overlays/framework-system-stats.png", "overlays/os-linux.png"]
+
+
+def overlays(count):
+    return [
+        {"name": f"overlay{i}", "path": OVERLAY_IMAGES[i % len(OVERLAY_IMAGES)],
+         "color": (255, 191, 0, 255) if i % 2 else None}
+        for i in range(count)
+    ]
+
+
+@pytest.mark.parametrize("scale", [1, 2])
+def test_load_scaled_image(benchmark, gtk, scale):
+    from app.image_utils import clear_image_cache, load_scaled_image
+    image = benchmark.pedantic(load_scaled_image, args=(get_asset_path(BASE_IMAGE), LAPTOP_WIDTH, scale),
+                               setup=clear_image_cache, rounds=20)
+    assert image is not None
+
+
+def test_load_scaled_image_cached(benchmark, gtk):
+    from app.image_utils import load_scaled_image
+    path = get_asset_path(BASE_IMAGE)
+    load_scaled_image(path, LAPTOP_WIDTH)
+    image = benchmark(load_scaled_image, path, LAPTOP_WIDTH)
+    assert image is not None
+
+
+def test_colorize_image(benchmark, gtk):
+    from app.image_utils import clear_image_cache, colorize_image
+    path = get_asset_path(OVERLAY_IMAGES[0])
+    image = benchmark.pedantic(colorize_image, args=(path, LAPTOP_WIDTH, (255, 191, 0, 255)),
+                               setup=clear_image_cache, rounds=5)
+    assert image is not None
+
+
+@pytest.mark.parametrize("count", [0, 1, 3, 6])
+def test_model_image(benchmark, gtk, offscreen_window, count):
+    '''ModelImage construction with N overlays, as done by ui.py whenever the overlays change.'''
+    from conftest import drain_events
+    from app.model_image import ModelImage
+
+    def build():
+        widget = ModelImage(BASE_IMAGE, image_size=LAPTOP_WIDTH, overlays=overlays(count))
+        offscreen_window.add(widget)
+        drain_events(gtk)
+        offscreen_window.remove(widget)
+    benchmark.pedantic(build, rounds=5 if count else 20)
+
+
+@pytest.fixture(scope="module")
+def image_worker():
+    from app.image_worker import ImageWorker
+    worker = ImageWorker(1)
+    yield worker
+    worker.shutdown()
+
+
+def test_image_worker_render(benchmark, image_worker):
+    '''Tinting an overlay in the image worker, up to the pixels being readable in this process.'''
+    pytest.importorskip("PIL")
+    from app.image_worker import read_shared, release_shared
+    path = get_asset_path(OVERLAY_IMAGES[0])
+
+    def render():
+        image = image_worker.render_image(path, LAPTOP_WIDTH, (255, 191, 0, 255))
+        try:
+            return len(read_shared(image))
+        finally:
+            release_shared(image)
+    render()  # Start the worker process outside the timing
+    assert benchmark(render) > 0
+
+
+def test_colorize_image_worker(benchmark, gtk, image_worker, monkeypatch):
+    pytest.importorskip("PIL")
+    from app import image_utils
+    from app.image_utils import clear_image_cache, colorize_image
+    monkeypatch.setattr(image_utils, "get_image_worker", lambda: image_worker)
+    path = get_asset_path(OVERLAY_IMAGES[0])
+    image = benchmark.pedantic(colorize_image, args=(path, LAPTOP_WIDTH, (255, 191, 0, 255)),
+                               setup=clear_image_cache, rounds=5)
+    assert image is not None
@@ -0,0 +1,155 @@
+'''Benchmarks for the data side of the update loop: providers, parsing and the full background tick.'''
+
+import os
+import subprocess
+import threading
+
+import pytest
+
+from app.backlight import ALPHA_RAMP, BacklightMonitor, opacity_for
+from app.command_runner import invalidate
+from app.graphics import get_gpus
+from app.history import HistoryStore
+from app.notifications import HardwareEventWatcher, scan_usb_devices
+from app.power_supply import discover_power_supplies, get_battery
+from app.privacy import PrivacyMonitor
+from app.scenes import compile_scene, dry_run, load_scene
+from app.system_monitor import SystemMonitor
+from app.thermals import ThermalMonitor, read_ectool_thermals
+from app.usb_pd import parse_usbpdpower, read_typec_ports
+
+
+def test_battery_stats(benchmark):
+    discover_power_supplies(refresh=True)
+    battery = get_battery()
+    stats = benchmark(battery.stats)
+    assert stats["percentage"] == 67
+
+
+def test_thermal_sample(benchmark):
+    monitor = ThermalMonitor(max_age=0)
+    sample = benchmark(monitor.sample)
+    assert sample["fan_rpm"] == 2341
+
+
+def test_system_sample(benchmark):
+    monitor = SystemMonitor(max_age=0)
+    monitor.sample()
+    sample = benchmark(monitor.sample)
+    assert sample["freq_mhz"] == 1950 and len(sample["core_freqs"]) == 12
+
+
+def test_ectool_thermals(benchmark):
+    # Drop the command runner cache so every round runs ectool
+    fans, temps = benchmark.pedantic(read_ectool_thermals, setup=invalidate, rounds=50)
+    assert fans == [2341] and temps
+
+
+def test_ectool_thermals_cached(benchmark):
+    read_ectool_thermals()
+    fans, temps = benchmark(read_ectool_thermals)
+    assert fans == [2341] and temps
+
+
+def test_history_commit(benchmark, tmp_path):
+    store = HistoryStore(str(tmp_path / "history.bin"), flush_interval=3600)
+
+    def tick():
+        store.set(capacity=67, status="Charging", power_now=18.7, cpu_temp=52.0, fan_rpm=2341)
+        store.commit()
+    benchmark(tick)
+    store.close()
+
+
+def test_gpu_detection(benchmark):
+    gpus = benchmark(get_gpus, refresh=True)
+    assert [gpu["name"] for gpu in gpus] == ["Intel Iris Xe Graphics"]
+
+
+def test_parse_lsusb(benchmark):
+    providers = pytest.importorskip("app.providers")
+    output = subprocess.run(["lsusb"], capture_output=True, text=True, check=True).stdout
+    camera_found, cards = benchmark(providers.parse_lsusb, output, 4)
+    assert camera_found and len(cards) == 4
+
+
+def test_expansion_cards_poll(benchmark):
+    providers = pytest.importorskip("app.providers")
+    data = benchmark(providers.ExpansionCardsProvider(4).poll)
+    assert "overlays" not in data
+
+
+def test_hardware_event_poll(benchmark):
+    assert scan_usb_devices() == {"3-1": "HDMI Expansion Card"}
+    watcher = HardwareEventWatcher()
+    watcher.poll()
+    events = benchmark(watcher.poll)
+    assert events == []
+
+
+def test_usb_pd_ports(benchmark):
+    ports = benchmark(read_typec_ports)
+    assert [port["connected"] for port in ports] == [True, False]
+    assert ports[0]["charging"] and ports[0]["power"] == pytest.approx(45.0) and ports[0]["max_power"] == 65.0
+    output = subprocess.run(["ectool", "usbpdpower"], capture_output=True, text=True, check=True).stdout
+    ec_ports = parse_usbpdpower(output)
+    assert [port["power_role"] for port in ec_ports] == ["sink", "source", None, None]
+    assert ec_ports[0]["max_power"] == 65.0
+
+
+def test_privacy_state(benchmark):
+    monitor = PrivacyMonitor()
+    changed = threading.Event()
+    monitor.add_listener(changed.set)
+    assert monitor.start()
+    # Read on every tick, the devices themselves are watched by inotify
+    assert benchmark(monitor.state) == {"camera": False, "microphone": False}
+    with open(os.path.join(os.environ["FRAMEWORK_DEVFS_ROOT"], "video0"), "rb"):
+        assert changed.wait(1)
+        assert monitor.state()["camera"]
+
+
+def test_backlight_change(benchmark):
+    # Plain files never signal POLLPRI, the fallback re-read picks the change up
+    monitor = BacklightMonitor(fallback_interval=0.05)
+    assert monitor.start() and monitor.fraction() == 0.5
+    # A brightness change costs one lookup in the precomputed ramp
+    assert benchmark(opacity_for, 0.5) == ALPHA_RAMP[50]
+    changed = threading.Event()
+    monitor.add_listener(lambda _fraction: changed.set())
+    path = os.path.join(monitor.path, "actual_brightness")
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("24000\n")
+        assert changed.wait(1) and monitor.fraction() == 0.25
+    finally:
+        monitor.stop()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("48000\n")
+
+
+def test_scene_dry_run(benchmark):
+    scene = compile_scene(load_scene("battery-low"))
+    fake = benchmark(dry_run, scene, max_passes=10)
+    # The fades are expanded at compile time, playback only applies the prepared steps
+    assert len(fake.log) == 10 * len(scene) + 1
+    assert fake.state == {"power": "auto", "keyboard": 0}
+
+
+def test_led_provider_poll(benchmark):
+    providers = pytest.importorskip("app.providers")
+    provider = providers.LedProvider()
+    provider.poll()  # Queries the LED colours once
+    data = benchmark(provider.poll)
+    assert "blue" not in data["colors"]["power"]
+
+
+def test_background_update_tick(benchmark, gtk):
+    '''One full _background_update_loop: every provider polled plus the history commit.'''
+    from conftest import drain_events
+    from app.ui import FrameworkControlApp
+    app = FrameworkControlApp()
+    visible_name = app.widget_stack.get_visible_child_name()
+    benchmark(app._background_update_loop, visible_name)
+    drain_events(gtk)
+    app.destroy()
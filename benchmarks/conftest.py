@@ -0,0 +1,184 @@
+'''Fake hardware for the benchmarks.
+A Framework Laptop 13 sysfs, procfs and /dev tree is written to a temporary directory and
+used through FRAMEWORK_SYSFS_ROOT, FRAMEWORK_PROCFS_ROOT and FRAMEWORK_DEVFS_ROOT, and fakebin/ (ectool, pkexec, lsusb, tuned-adm, systemctl)
+is put first on PATH. This has to happen before any app module is imported, since the
+sysfs roots are read at import time.
+'''
+
+import atexit
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import pytest
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+FAKEBIN = os.path.join(BENCH_DIR, "fakebin")
+
+# path relative to the sysfs root -> contents
+FAKE_SYSFS = {
+    "class/dmi/id/board_name": "FRANBMCP03",
+    "class/dmi/id/sys_vendor": "Framework",
+    "class/dmi/id/product_name": "Laptop",
+    "power/mem_sleep": "s2idle [deep]",
+    "class/power_supply/ACAD/type": "Mains",
+    "class/power_supply/ACAD/online": "1",
+    "class/power_supply/BAT1/type": "Battery",
+    "class/power_supply/BAT1/status": "Charging",
+    "class/power_supply/BAT1/capacity": "67",
+    "class/power_supply/BAT1/charge_full": "3572000",
+    "class/power_supply/BAT1/charge_full_design": "3915000",
+    "class/power_supply/BAT1/charge_now": "2393000",
+    "class/power_supply/BAT1/current_now": "1123000",
+    "class/power_supply/BAT1/voltage_now": "16712000",
+    "class/power_supply/BAT1/charge_control_end_threshold": "80",
+    "class/drm/card1/device/vendor": "0x8086",
+    "class/drm/card1/device/device": "0x9a49",
+    "class/drm/card1/device/boot_vga": "1",
+    "class/drm/card1-eDP-1/status": "connected",
+    "class/hwmon/hwmon0/name": "acpitz",
+    "class/hwmon/hwmon0/temp1_input": "41000",
+    "class/hwmon/hwmon1/name": "coretemp",
+    "class/hwmon/hwmon1/temp1_label": "Package id 0",
+    "class/hwmon/hwmon1/temp1_input": "52000",
+    "class/hwmon/hwmon1/temp2_label": "Core 0",
+    "class/hwmon/hwmon1/temp2_input": "50000",
+    "class/hwmon/hwmon2/name": "cros_ec",
+    "class/hwmon/hwmon2/temp1_label": "local_f75303@4d",
+    "class/hwmon/hwmon2/temp1_input": "40000",
+    "class/hwmon/hwmon2/fan1_input": "2341",
+    "bus/usb/devices/usb3/bDeviceClass": "09",
+    "bus/usb/devices/usb3/idVendor": "1d6b",
+    "bus/usb/devices/3-1/bDeviceClass": "00",
+    "bus/usb/devices/3-1/idVendor": "32ac",
+    "bus/usb/devices/3-1/idProduct": "0002",
+    "bus/usb/devices/3-1/product": "HDMI Expansion Card",
+    "bus/usb/devices/3-1:1.0/bInterfaceClass": "01",
+    "class/backlight/intel_backlight/type": "raw",
+    "class/backlight/intel_backlight/max_brightness": "96000",
+    "class/backlight/intel_backlight/brightness": "48000",
+    "class/backlight/intel_backlight/actual_brightness": "48000",
+    "class/typec/port0/power_role": "source [sink]",
+    "class/typec/port0/data_role": "host [device]",
+    "class/typec/port0-partner/usb_power_delivery/source-capabilities/1:fixed_supply/voltage": "5000mV",
+    "class/typec/port0-partner/usb_power_delivery/source-capabilities/1:fixed_supply/maximum_current": "3000mA",
+    "class/typec/port0-partner/usb_power_delivery/source-capabilities/2:fixed_supply/voltage": "20000mV",
+    "class/typec/port0-partner/usb_power_delivery/source-capabilities/2:fixed_supply/maximum_current": "3250mA",
+    "class/typec/port1/power_role": "[source] sink",
+    "class/typec/port1/data_role": "[host] device",
+    "class/power_supply/ucsi-source-psy-USBC000:001/type": "USB",
+    "class/power_supply/ucsi-source-psy-USBC000:001/online": "1",
+    "class/power_supply/ucsi-source-psy-USBC000:001/voltage_now": "20000000",
+    "class/power_supply/ucsi-source-psy-USBC000:001/current_now": "2250000",
+    "class/power_supply/ucsi-source-psy-USBC000:002/type": "USB",
+    "class/power_supply/ucsi-source-psy-USBC000:002/online": "0",
+}
+FAKE_SYSFS.update({f"devices/system/cpu/cpu{i}/cpufreq/scaling_cur_freq": str(1400000 + i * 100000) for i in range(12)})
+
+# path relative to the procfs root -> contents
+FAKE_PROCFS = {
+    "stat": "cpu  1029384 2034 284712 19283746 12873 0 8273 0 0 0\n"
+            + "".join(f"cpu{i} 85782 169 23726 1606978 1072 0 689 0 0 0\n" for i in range(12))
+            + "intr 123456789 0 0\nctxt 987654321\nbtime 1700000000\nprocesses 123456",
+    "meminfo": "MemTotal:       32510340 kB\nMemFree:        20154108 kB\nMemAvailable:   26128764 kB\nBuffers:          412356 kB",
+    "pressure/cpu": "some avg10=1.20 avg60=0.84 avg300=0.51 total=45784993\nfull avg10=0.00 avg60=0.00 avg300=0.00 total=0",
+    "pressure/memory": "some avg10=0.00 avg60=0.00 avg300=0.00 total=1234\nfull avg10=0.00 avg60=0.00 avg300=0.00 total=1001",
+    "pressure/io": "some avg10=0.31 avg60=0.12 avg300=0.05 total=2734412\nfull avg10=0.20 avg60=0.08 avg300=0.03 total=2104577",
+    "asound/card0/pcm0c/sub0/status": "closed",
+}
+
+# path relative to the /dev root -> contents, plain files stand in for the devices
+FAKE_DEVFS = {
+    "video0": "",
+    "snd/pcmC0D0c": "",
+}
+
+
+def make_fake_tree(root, files):
+    for rel_path, contents in files.items():
+        path = os.path.join(root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(contents + "\n")
+
+
+_tmp = tempfile.mkdtemp(prefix="framework-bench-")
+atexit.register(shutil.rmtree, _tmp, True)
+make_fake_tree(os.path.join(_tmp, "sys"), FAKE_SYSFS)
+make_fake_tree(os.path.join(_tmp, "proc"), FAKE_PROCFS)
+make_fake_tree(os.path.join(_tmp, "dev"), FAKE_DEVFS)
+os.environ["FRAMEWORK_SYSFS_ROOT"] = os.path.join(_tmp, "sys")
+os.environ["FRAMEWORK_PROCFS_ROOT"] = os.path.join(_tmp, "proc")
+os.environ["FRAMEWORK_DEVFS_ROOT"] = os.path.join(_tmp, "dev")
+os.environ["PATH"] = FAKEBIN + os.pathsep + os.environ.get("PATH", "")
+# Keep the history store and settings out of the real home directory
+for var in ("XDG_DATA_HOME", "XDG_CONFIG_HOME", "XDG_RUNTIME_DIR"):
+    os.environ[var] = os.path.join(_tmp, var.lower())
+    os.makedirs(os.environ[var], exist_ok=True)
+# The app runs as the desktop user and reaches ectool through pkexec, also when the
+# benchmarks run as root
+if os.geteuid() == 0:
+    os.geteuid = lambda: 1000
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def _start_xvfb():
+    '''Start a private Xvfb display when there is none. Returns the process or None.'''
+    xvfb = shutil.which("Xvfb")
+    if not xvfb:
+        return None
+    read_fd, write_fd = os.pipe()
+    # -displayfd makes Xvfb pick a free display and write its number once ready
+    proc = subprocess.Popen([xvfb, "-displayfd", str(write_fd), "-screen", "0", "1280x1024x24", "-nolisten", "tcp"],
+                            pass_fds=(write_fd,), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        display = f.readline().strip()
+    if not display:
+        proc.kill()
+        return None
+    os.environ["DISPLAY"] = f":{display}"
+    return proc
+
+
+@pytest.fixture(scope="session")
+def gtk():
+    '''The Gtk module on an offscreen (Xvfb) display. Skips when PyGObject or a display is missing.'''
+    gi = pytest.importorskip("gi")
+    gi.require_version("Gtk", "3.0")
+    xvfb = None
+    if not os.environ.get("DISPLAY") and not os.environ.get("WAYLAND_DISPLAY"):
+        os.environ["GDK_BACKEND"] = "x11"
+        xvfb = _start_xvfb()
+    from gi.repository import Gtk
+    if not Gtk.init_check(sys.argv)[0]:
+        pytest.skip("GTK could not open a display, install Xvfb")
+    yield Gtk
+    if xvfb is not None:
+        xvfb.terminate()
+        xvfb.wait(timeout=5)
+
+
+@pytest.fixture
+def offscreen_window(gtk):
+    '''A realized Gtk.OffscreenWindow to render widgets into.'''
+    window = gtk.OffscreenWindow()
+    window.show()
+    yield window
+    window.destroy()
+
+
+def drain_events(gtk, timeout=0.0):
+    '''Run pending GTK events, e.g. idle callbacks queued by the update loop.'''
+    deadline = time.monotonic() + timeout
+    while True:
+        while gtk.events_pending():
+            gtk.main_iteration_do(False)
+        if time.monotonic() >= deadline:
+            return
+        time.sleep(0.01)
@@ -10,6 +10,10 @@ if [ "$(id -u)" -eq 0 ]; then
     exit 1
 fi
 
+# Pre-scale the images into the asset atlas so the app doesn't decode and scale them at runtime
+echo "Building the asset atlas..."
+python3 ./app/tools/build_atlas.py || echo "Warning: Could not build the asset atlas (needs Pillow), images will load from the PNGs."
+
 DEST_DIR="/usr/bin"
 # Install ectool
 SRC_ECTOOL="$(realpath ./app/tools/ectool)"
@@ -19,15 +23,17 @@ sudo cp "$SRC_ECTOOL" "$DEST_ECTOOL"
 sudo chmod 755 "$DEST_ECTOOL"
 echo "ectool installed to $DEST_ECTOOL."
 
-# Install keyboard_backlight_daemon.py
-SRC_DAEMON="$(realpath ./app/tools/keyboard_backlight_daemon.py)"
-DEST_DAEMON="$DEST_DIR/keyboard_backlight_daemon.py"
-echo "Copying $SRC_DAEMON to $DEST_DAEMON..."
-sudo cp "$SRC_DAEMON" "$DEST_DAEMON"
-sudo chmod 755 "$DEST_DAEMON"
-echo "keyboard_backlight_daemon.py installed to $DEST_DAEMON."
-
-
+# Code run as root is installed root-owned, the checkout can be changed without root. The
+# keyboard backlight and fan curve daemons run from here through pkexec and import the app package
+INSTALL_DIR="/usr/lib/framework-app"
+echo "Installing the app modules to $INSTALL_DIR..."
+sudo rm -rf "$INSTALL_DIR"
+sudo install -d -o root -g root -m 755 "$INSTALL_DIR"
+sudo cp -r ./app "$INSTALL_DIR/app"
+sudo find "$INSTALL_DIR" -name __pycache__ -prune -exec rm -rf {} +
+sudo chown -R root:root "$INSTALL_DIR"
+sudo chmod -R u=rwX,go=rX "$INSTALL_DIR"
+echo "App modules installed to $INSTALL_DIR, run install.sh again after updating the app."
 
 # Create ectool group if it doesn't exist
 if ! getent group ectool > /dev/null; then
@@ -60,5 +66,81 @@ polkit.addRule(function(action, subject) {
 EOF
 
 echo "PolicyKit rule installed at $RULE_FILE for /usr/bin/ectool."
+
+# Oneshot service that re-applies the saved settings at boot in one root session
+SERVICE_FILE="/etc/systemd/system/framework-app-restore.service"
+RESTORE_TOOL="$INSTALL_DIR/app/tools/restore_settings.py"
+SETTINGS_FILE="${XDG_CONFIG_HOME:-$HOME/.config}/framework-app/settings.json"
+# Changes made through framework-app.service are saved by root in /var/lib, not in the user's home
+SERVICE_SETTINGS_FILE="/var/lib/framework-app/settings.json"
+sudo bash -c "cat > $SERVICE_FILE" <<EOF
+[Unit]
+Description=Restore Framework Laptop settings
+After=tuned.service power-profiles-daemon.service
+
+[Service]
+Type=oneshot
+ExecStart=/usr/bin/python3 -I $RESTORE_TOOL --settings $SETTINGS_FILE --settings $SERVICE_SETTINGS_FILE
+
+[Install]
+WantedBy=multi-user.target
+EOF
+sudo systemctl daemon-reload
+sudo systemctl enable framework-app-restore.service
+echo "framework-app-restore.service installed, settings from $SETTINGS_FILE and $SERVICE_SETTINGS_FILE are re-applied at boot."
+
+# Resident service polling the hardware for the app and framework-ctl, on the system bus
+DBUS_POLICY="/etc/dbus-1/system.d/org.frameworkapp.Control1.conf"
+sudo bash -c "cat > $DBUS_POLICY" <<EOF
+<!DOCTYPE busconfig PUBLIC "-//freedesktop//DTD D-BUS Bus Configuration 1.0//EN"
+ "http://www.freedesktop.org/standards/dbus/1.0/busconfig.dtd">
+<busconfig>
+  <policy user="root">
+    <allow own="org.frameworkapp.Control1"/>
+  </policy>
+  <policy group="ectool">
+    <allow send_destination="org.frameworkapp.Control1"/>
+  </policy>
+</busconfig>
+EOF
+SERVICE_FILE="/etc/systemd/system/framework-app.service"
+FRAMEWORK_SERVICE="$INSTALL_DIR/app/tools/framework_service.py"
+sudo bash -c "cat > $SERVICE_FILE" <<EOF
+[Unit]
+Description=Framework Laptop hardware service
+After=framework-app-restore.service tuned.service power-profiles-daemon.service
+
+[Service]
+Type=dbus
+BusName=org.frameworkapp.Control1
+ExecStart=/usr/bin/python3 -I $FRAMEWORK_SERVICE
+# Settings, history and LED state of the service, root does not write into users' homes
+StateDirectory=framework-app
+Restart=on-failure
+
+[Install]
+WantedBy=multi-user.target
+EOF
+sudo systemctl daemon-reload
+sudo systemctl enable --now framework-app.service || echo "Warning: Could not start framework-app.service, the app will poll the hardware itself."
+echo "framework-app.service installed, the app and framework-ctl use it when it is running."
+
+# User service sending hardware notifications while logged in, with or without the app open
+USER_UNIT_DIR="${XDG_CONFIG_HOME:-$HOME/.config}/systemd/user"
+mkdir -p "$USER_UNIT_DIR"
+cat > "$USER_UNIT_DIR/framework-app-monitor.service" <<EOF
+[Unit]
+Description=Framework Laptop hardware notifications
+PartOf=graphical-session.target
+
+[Service]
+ExecStart=$(realpath ./framework-ctl) monitor
+Restart=on-failure
+
+[Install]
+WantedBy=graphical-session.target
+EOF
+systemctl --user daemon-reload || true
+systemctl --user enable --now framework-app-monitor.service || echo "Warning: Could not enable framework-app-monitor.service, run it with ./framework-ctl monitor."
 echo "All users in the 'ectool' group can now run ectool via pkexec without a password prompt."
 echo "You may need to log out and back in for the group change to take effect."
@@ -3,11 +3,12 @@ This application provides control features for Framework Laptops.
 It displays the laptop model and allows for various controls.
 '''
 
-from app.ui import FrameworkControlApp
-from gi.repository import Gtk
-
 
 if __name__ == "__main__":
+    # Imported here, image worker processes import this module and must not load GTK
+    from app.ui import FrameworkControlApp
+    from gi.repository import Gtk
+
     win = FrameworkControlApp()
     win.connect("destroy", Gtk.main_quit)
     win.show_all()